@@ -8,6 +8,8 @@ from constants import JSON
 
 
 class JsonObject(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def toJson(self) -> JSON:
         """Parse python object(JsojObject's subclasses) into json data"""
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from batch import CATEGORY_CODES, BatchGradeCalculator
+from formula import CATEGORY_NAMES
+from models import Student, SubjectCategory
+
+__all__ = (
+    "UniversityFormula",
+    "Ranking",
+    "AdmissionsScorer",
+    "load_university_formulas"
+)
+
+
+class UniversityFormula:
+    """
+    Reflection formula (반영 방법) of a university.
+
+    Score is Σ weight × (units-weighted mean of points) over category groups, where each subject's points
+    are looked up from its 석차등급 in the points table. Only relative (상대평가) subjects are reflected.
+    """
+    __slots__ = ('name', 'groups', 'weights', 'points')
+
+    def __init__(
+            self,
+            name: str,
+            groups: Sequence[Tuple[SubjectCategory, ...]],
+            weights: Sequence[float],
+            points: Sequence[float]
+    ) -> None:
+        """
+        Args:
+            name (str): university (or admission track) name.
+            groups (Sequence[Tuple[SubjectCategory, ...]]): category groups reflected.
+            weights (Sequence[float]): weight of each group.
+            points (Sequence[float]): points of 1 ~ 9등급.
+        """
+        if len(groups) != len(weights):
+            raise ValueError(f'{name} : {len(groups)} groups but {len(weights)} weights')
+        if len(points) != 9:
+            raise ValueError(f'{name} : points table needs 9 entries (1 ~ 9등급), not {len(points)}')
+        self.name: str = name
+        self.groups: Tuple[Tuple[SubjectCategory, ...], ...] = tuple(groups)
+        self.weights: Tuple[float, ...] = tuple(weights)
+        self.points: Tuple[float, ...] = tuple(points)
+
+    @classmethod
+    def fromJson(cls, name: str, data: Mapping[str, object]) -> UniversityFormula:
+        """
+        Parse a formula from json : {"weights": {"국어": 0.3, "수학|과학": 0.4, ...}, "points": [1등급, ..., 9등급]}.
+        Category names are the same as in formula.py (value, member name, 사회, 기타).
+
+        Args:
+            name (str): university name.
+            data (Mapping[str, object]): formula json.
+        """
+        groups: List[Tuple[SubjectCategory, ...]] = []
+        weights: List[float] = []
+        for group, weight in data['weights'].items():
+            try:
+                groups.append(tuple(CATEGORY_NAMES[category.strip()] for category in group.split('|')))
+            except KeyError as e:
+                raise ValueError(f'{name} : unknown category {e}')
+            weights.append(float(weight))
+        return cls(name, groups, weights, data['points'])
+
+    def toJson(self) -> Dict[str, object]:
+        return {
+            'weights': {'|'.join(category.value for category in group): weight for group, weight in zip(self.groups, self.weights)},
+            'points': list(self.points)
+        }
+
+    def __repr__(self) -> str:
+        return f"UniversityFormula<name={self.name},groups={len(self.groups)}>"
+
+
+class Ranking:
+    """Students ranked by a university formula. Students the formula can't score are left out."""
+    __slots__ = ('name', 'students', 'scores', 'positions')
+
+    def __init__(self, name: str, students: Tuple[Student, ...], scores: np.ndarray, positions: np.ndarray) -> None:
+        self.name: str = name
+        self.students: Tuple[Student, ...] = students    # best first
+        self.scores: np.ndarray = scores                  # aligned with students
+        self.positions: np.ndarray = positions            # 1-based, ties share the best position
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def rows(self) -> List[Tuple[int, str, int, float]]:
+        """(position, name, grade, score) of every ranked student."""
+        return [
+            (position, student.name, student.grade, score)
+            for position, student, score in zip(self.positions.tolist(), self.students, self.scores.tolist())
+        ]
+
+    def __repr__(self) -> str:
+        return f"Ranking<name={self.name},students={len(self)}>"
+
+
+class AdmissionsScorer:
+    """
+    Scores a cohort against many university formulas at once.
+
+    Each student is reduced once to a feature vector : units of relative subjects per (category, 석차등급).
+    Every group of every formula becomes a column of two matrices over those features, holding the group's
+    points lookup and units indicator. Scores of all students × formulas are then
+        (features @ points) / (features @ units) @ weights
+    """
+
+    def __init__(self, formulas: Sequence[UniversityFormula]) -> None:
+        """
+        Args:
+            formulas (Sequence[UniversityFormula]): formulas to score with.
+        """
+        self._formulas: Tuple[UniversityFormula, ...] = tuple(formulas)
+        groups: int = sum(len(formula.groups) for formula in self._formulas)
+        features: int = len(CATEGORY_CODES) * 9
+        self._points: np.ndarray = np.zeros((features, groups))
+        self._units: np.ndarray = np.zeros((features, groups))
+        self._weights: np.ndarray = np.zeros((groups, len(self._formulas)))
+        column: int = 0
+        for index, formula in enumerate(self._formulas):
+            points: np.ndarray = np.asarray(formula.points, dtype=np.float64)
+            for group, weight in zip(formula.groups, formula.weights):
+                for category in group:
+                    rows: slice = slice(CATEGORY_CODES[category.value] * 9, CATEGORY_CODES[category.value] * 9 + 9)
+                    self._points[rows, column] = points
+                    self._units[rows, column] = 1
+                self._weights[column, index] = weight
+                column += 1
+        self._used: np.ndarray = (self._weights != 0).astype(np.float64)
+
+    @property
+    def formulas(self) -> Tuple[UniversityFormula, ...]:
+        return self._formulas
+
+    @staticmethod
+    def features(batch: BatchGradeCalculator) -> np.ndarray:
+        """Units per (category, 석차등급) of every student, shaped (students, categories × 9)."""
+        return batch.rank_units().reshape(len(batch), -1)
+
+    def scores(self, batch: BatchGradeCalculator) -> np.ndarray:
+        """
+        Score of every student by every formula, shaped (students, formulas). nan if a weighted group has no subjects.
+
+        Args:
+            batch (BatchGradeCalculator): cohort to score.
+        """
+        features: np.ndarray = self.features(batch)
+        points: np.ndarray = features @ self._points
+        units: np.ndarray = features @ self._units
+        defined: np.ndarray = units > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means: np.ndarray = np.where(defined, points / units, 0.0)
+        scores: np.ndarray = means @ self._weights
+        scores[((~defined).astype(np.float64) @ self._used) > 0] = np.nan
+        return scores
+
+    def rankings(self, batch: BatchGradeCalculator) -> Dict[str, Ranking]:
+        """
+        Ranked table of the cohort for every formula, best (highest score) first.
+
+        Args:
+            batch (BatchGradeCalculator): cohort to rank.
+        """
+        scores: np.ndarray = self.scores(batch)
+        rankings: Dict[str, Ranking] = {}
+        for index, formula in enumerate(self._formulas):
+            column: np.ndarray = scores[:, index]
+            scored: np.ndarray = np.flatnonzero(~np.isnan(column))
+            order: np.ndarray = scored[np.argsort(-column[scored], kind='stable')]
+            ordered: np.ndarray = column[order]
+            # Position of the first student with the same score, so ties share the best position.
+            positions: np.ndarray = np.searchsorted(-ordered, -ordered, side='left') + 1
+            rankings[formula.name] = Ranking(
+                formula.name,
+                tuple(batch.students[student_id] for student_id in order.tolist()),
+                ordered,
+                positions
+            )
+        return rankings
+
+
+def load_university_formulas(path: str) -> List[UniversityFormula]:
+    """
+    Load university formulas from a json file of {name: formula json}. (see UniversityFormula.fromJson)
+
+    Args:
+        path (str): json file to load.
+    """
+    with open(path, mode='rt', encoding='utf-8') as f:
+        return [UniversityFormula.fromJson(name, data) for name, data in json.load(f).items()]
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from loader import list_data_files, read_files
+
+    parser = argparse.ArgumentParser(description='내신 산출 도구 - 대학별 환산 점수')
+    parser.add_argument('directory', help='directory of transcript json files')
+    parser.add_argument('formulas', help='json file of university formulas')
+    parser.add_argument('--top', type=int, default=10, help='students shown per university')
+    args = parser.parse_args()
+
+    data = [datum for _, datum, error in read_files(list_data_files(args.directory)) if error is None]
+    rankings: Dict[str, Ranking] = AdmissionsScorer(load_university_formulas(args.formulas)).rankings(
+        BatchGradeCalculator.fromJson(data)
+    )
+    lines: List[str] = []
+    for name, ranking in rankings.items():
+        lines.append(f'[ {name} ] ({len(ranking)} 명)')
+        lines.extend(f'{position:>5} | {student} | {grade} | {score:.3f}' for position, student, grade, score in ranking.rows()[:args.top])
+    sys.stdout.write('\n'.join(lines) + '\n')
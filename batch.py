@@ -0,0 +1,517 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator, covers_transcript
+from constants import JSON, SemesterKeys, StudentKeys, SubjectKeys
+from instrumentation import timed
+from models import DetailedSubject, Student, SubjectAchievementLevels, SubjectCategory, SubjectType
+
+__all__ = (
+    "CATEGORY_CODES",
+    "CATEGORY_SLOTS",
+    "TYPE_CODES",
+    "RELATIVE_CODE",
+    "SEMESTERS_PER_GRADE",
+    "semester_code",
+    "normal_cdf",
+    "BatchGradeCalculator",
+    "SubjectStatistics"
+)
+
+# Integer codes of enum members used in columnar arrays. Unknown values are coded as -1.
+CATEGORY_CODES: Dict[str, int] = {category.value: code for code, category in enumerate(SubjectCategory)}
+# Category slots of summed cubes : one per category, then a last one for unknown categories. (code -1 indexes it)
+CATEGORY_SLOTS: int = len(CATEGORY_CODES) + 1
+TYPE_CODES: Dict[str, int] = {subject_type.value: code for code, subject_type in enumerate(SubjectType)}
+RELATIVE_CODE: int = TYPE_CODES[SubjectType.RELATIVE.value]
+# Achievement levels accepted by SubjectAchievementLevels.parse : member names and values.
+_ACHIEVEMENTS: frozenset = frozenset(SubjectAchievementLevels.__members__) | frozenset(
+    achievement.value for achievement in SubjectAchievementLevels
+)
+SEMESTERS_PER_GRADE: int = 2
+
+
+def semester_code(grade: int, semester: int) -> int:
+    """
+    Flatten (학년, 학기) into a zero-based semester index.
+
+    Args:
+        grade (int): grade of the semester (1 ~ 3).
+        semester (int): semester of the grade (1 ~ 2).
+    """
+    return (grade - 1) * SEMESTERS_PER_GRADE + (semester - 1)
+
+
+# Standard normal CDF sampled on a uniform grid, interpolated linearly by normal_cdf. (error below 1e-7)
+_CDF_LIMIT: float = 8.0
+_CDF_STEP: float = 1e-3
+_CDF_TABLE: np.ndarray = np.array([
+    0.5 * math.erfc(-z / math.sqrt(2))
+    for z in np.linspace(-_CDF_LIMIT, _CDF_LIMIT, int(round(2 * _CDF_LIMIT / _CDF_STEP)) + 1).tolist()
+])
+
+
+def _category_slots(categories: Iterable[SubjectCategory]) -> List[int]:
+    """Category slots of a combination. One holding every category also takes the unknown slot. (see covers_transcript)"""
+    categories = tuple(categories)
+    slots: List[int] = [CATEGORY_CODES[category.value] for category in categories]
+    if covers_transcript(categories):
+        slots.append(-1)
+    return slots
+
+
+def normal_cdf(z: np.ndarray) -> np.ndarray:
+    """
+    Standard normal CDF of every element, from a cached lookup table. nan stays nan.
+
+    Args:
+        z (np.ndarray): z-scores.
+    """
+    position: np.ndarray = (np.clip(z, -_CDF_LIMIT, _CDF_LIMIT) + _CDF_LIMIT) / _CDF_STEP
+    lower: np.ndarray = np.minimum(np.floor(np.nan_to_num(position)), _CDF_TABLE.size - 2).astype(np.int64)
+    fraction: np.ndarray = position - lower
+    return _CDF_TABLE[lower] + fraction * (_CDF_TABLE[lower + 1] - _CDF_TABLE[lower])
+
+
+class BatchGradeCalculator:
+    """
+    Columnar grade calculator over a whole cohort.
+
+    Every subject of every student is stored as one row of flat arrays
+    (student, semester, category, type, units, rank), and weighted ranks are computed
+    with vectorized reductions instead of walking Subject objects one at a time.
+    """
+
+    @classmethod
+    def fromJson(cls, data: Iterable[JSON]) -> BatchGradeCalculator:
+        """
+        Load raw transcripts (same schema as SingleGradeCalculator) without building model objects.
+
+        Args:
+            data (Iterable[JSON]): transcripts to load.
+
+        Raises:
+            ValueError: if a subject has an unknown achievement level, or is relative without a rank.
+        """
+        students: List[Student] = []
+        student_ids: List[int] = []
+        semesters: List[int] = []
+        categories: List[int] = []
+        types: List[int] = []
+        units: List[int] = []
+        ranks: List[int] = []
+        for student_id, datum in enumerate(data):
+            students.append(Student.fromJson(datum[StudentKeys.key]))
+            for raw_semester in datum[SemesterKeys.key]:
+                code: int = semester_code(raw_semester[SemesterKeys.GRADE], raw_semester[SemesterKeys.SEMESTER])
+                for raw_subject in raw_semester[SemesterKeys.SUBJECT_SCORES]:
+                    # Rows are validated as the model parser would, so both paths reject the same transcripts.
+                    if raw_subject[SubjectKeys.ACHIEVEMENT_LEVEL] not in _ACHIEVEMENTS:
+                        raise ValueError(f'unknown achievement level : {raw_subject[SubjectKeys.ACHIEVEMENT_LEVEL]}')
+                    subject_type: int = TYPE_CODES.get(raw_subject[SubjectKeys.TYPE], -1)
+                    rank: Optional[int] = raw_subject[SubjectKeys.RANK]
+                    if rank is None and subject_type == RELATIVE_CODE:
+                        raise ValueError(f'relative subject {raw_subject[SubjectKeys.NAME]} has no rank')
+                    student_ids.append(student_id)
+                    semesters.append(code)
+                    categories.append(CATEGORY_CODES.get(raw_subject[SubjectKeys.CATEGORY], -1))
+                    types.append(subject_type)
+                    units.append(raw_subject[SubjectKeys.UNITS])
+                    ranks.append(rank or 0)
+        return cls(students, student_ids, semesters, categories, types, units, ranks)
+
+    @classmethod
+    def fromCalculators(cls, calculators: Iterable[SingleGradeCalculator]) -> BatchGradeCalculator:
+        """
+        Load already parsed calculators.
+
+        Args:
+            calculators (Iterable[SingleGradeCalculator]): calculators to load.
+
+        Raises:
+            ValueError: if a subject is relative without a rank.
+        """
+        students: List[Student] = []
+        student_ids: List[int] = []
+        semesters: List[int] = []
+        categories: List[int] = []
+        types: List[int] = []
+        units: List[int] = []
+        ranks: List[int] = []
+        for student_id, calculator in enumerate(calculators):
+            students.append(calculator.student)
+            for semester in calculator.semesters:
+                code: int = semester_code(semester.grade, semester.semester)
+                for subject in semester.subjects:
+                    if subject.rank is None and subject.type == SubjectType.RELATIVE:
+                        raise ValueError(f'relative subject {subject.name} has no rank')
+                    student_ids.append(student_id)
+                    semesters.append(code)
+                    categories.append(CATEGORY_CODES.get(subject.category.value, -1) if subject.category else -1)
+                    types.append(TYPE_CODES.get(subject.type.value, -1) if subject.type else -1)
+                    units.append(subject.units)
+                    ranks.append(subject.rank or 0)
+        return cls(students, student_ids, semesters, categories, types, units, ranks)
+
+    def __init__(
+            self,
+            students: Sequence[Student],
+            student_ids: Sequence[int],
+            semesters: Sequence[int],
+            categories: Sequence[int],
+            types: Sequence[int],
+            units: Sequence[int],
+            ranks: Sequence[int]
+    ) -> None:
+        """
+        Initialize BatchGradeCalculator from subject columns.
+
+        Args:
+            students (Sequence[Student]): students, indexed by student id.
+            student_ids (Sequence[int]): student id of each subject row.
+            semesters (Sequence[int]): semester code of each subject row. (see semester_code)
+            categories (Sequence[int]): category code of each subject row. (see CATEGORY_CODES)
+            types (Sequence[int]): type code of each subject row. (see TYPE_CODES)
+            units (Sequence[int]): units (단위수) of each subject row.
+            ranks (Sequence[int]): rank (석차등급) of each subject row. 0 if subject has no rank.
+        """
+        self._students: Tuple[Student, ...] = tuple(students)
+        self._student_ids: np.ndarray = np.asarray(student_ids, dtype=np.int64)
+        self._semesters: np.ndarray = np.asarray(semesters, dtype=np.int64)
+        self._categories: np.ndarray = np.asarray(categories, dtype=np.int64)
+        self._types: np.ndarray = np.asarray(types, dtype=np.int64)
+        self._units: np.ndarray = np.asarray(units, dtype=np.int64)
+        self._ranks: np.ndarray = np.asarray(ranks, dtype=np.int64)
+        self._semester_count: int = int(self._semesters.max()) + 1 if self._semesters.size else 0
+        # Category column of summed cubes : unknown categories go to the last slot.
+        self._slots: np.ndarray = np.where(self._categories < 0, CATEGORY_SLOTS - 1, self._categories)
+        self._totals, self._unit_sums = self._reduce()
+        self._cells: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _reduce(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reduce subject rows into (students, semesters, category slots) sums of rank×units and units.
+        Only relative (상대평가) subjects are counted, as in SingleGradeCalculator.get_rank.
+        """
+        shape: Tuple[int, int, int] = (len(self._students), self._semester_count, CATEGORY_SLOTS)
+        size: int = shape[0] * shape[1] * shape[2]
+        mask: np.ndarray = self._types == RELATIVE_CODE
+        keys: np.ndarray = np.ravel_multi_index(
+            (self._student_ids[mask], self._semesters[mask], self._slots[mask]),
+            shape
+        )
+        units: np.ndarray = self._units[mask]
+        # Weighted sums of integers below 2**53 are exact in float64, so results match get_rank exactly.
+        totals: np.ndarray = np.bincount(keys, weights=self._ranks[mask] * units, minlength=size).reshape(shape)
+        unit_sums: np.ndarray = np.bincount(keys, weights=units, minlength=size).reshape(shape)
+        return totals, unit_sums
+
+    def _ranked(self) -> np.ndarray:
+        """Rows counted in weighted ranks : every relative subject, and other subjects only if they have a rank."""
+        return (self._types >= 0) & ((self._types == RELATIVE_CODE) | (self._ranks > 0))
+
+    def cells(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sums of rank×units and units of ranked subjects of every type, shaped (students, semesters, category slots, types).
+        Relative cells equal totals / unit_sums. Computed on first call and cached.
+        """
+        if self._cells is None:
+            shape: Tuple[int, int, int, int] = (
+                len(self._students), self._semester_count, CATEGORY_SLOTS, len(TYPE_CODES)
+            )
+            size: int = shape[0] * shape[1] * shape[2] * shape[3]
+            mask: np.ndarray = self._ranked()
+            keys: np.ndarray = np.ravel_multi_index(
+                (self._student_ids[mask], self._semesters[mask], self._slots[mask], self._types[mask]),
+                shape
+            )
+            units: np.ndarray = self._units[mask]
+            self._cells = (
+                np.bincount(keys, weights=self._ranks[mask] * units, minlength=size).reshape(shape),
+                np.bincount(keys, weights=units, minlength=size).reshape(shape)
+            )
+        return self._cells
+
+    def rank_units(self) -> np.ndarray:
+        """
+        Units of relative subjects per 석차등급, shaped (students, categories, 9). [..., g - 1] holds units ranked g등급.
+        Subjects ranked outside 1 ~ 9 are left out.
+        """
+        mask: np.ndarray = (self._types == RELATIVE_CODE) & (self._categories >= 0) & (self._ranks >= 1) & (self._ranks <= 9)
+        shape: Tuple[int, int, int] = (len(self._students), len(CATEGORY_CODES), 9)
+        keys: np.ndarray = np.ravel_multi_index(
+            (self._student_ids[mask], self._categories[mask], self._ranks[mask] - 1),
+            shape
+        )
+        return np.bincount(keys, weights=self._units[mask], minlength=shape[0] * shape[1] * shape[2]).reshape(shape)
+
+    def best_sums(
+            self,
+            count: int,
+            semesters: Optional[Iterable[int]] = None,
+            categories: Optional[Iterable[int]] = None,
+            types: Optional[Iterable[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sums of rank×units and units over the best (lowest rank) count subjects of every student.
+
+        Args:
+            count (int): number of subjects counted per student.
+            semesters (Optional[Iterable[int]]): semester codes to select from. All if None.
+            categories (Optional[Iterable[int]]): category codes (-1 : unknown) to select from. All if None.
+            types (Optional[Iterable[int]]): type codes to select from. Relative only if None.
+        """
+        mask: np.ndarray = self._ranked()
+        mask &= np.isin(self._types, [RELATIVE_CODE] if types is None else list(types))
+        if semesters is not None:
+            mask &= np.isin(self._semesters, list(semesters))
+        if categories is not None:
+            mask &= np.isin(self._categories, list(categories))
+        student_ids: np.ndarray = self._student_ids[mask]
+        ranks: np.ndarray = self._ranks[mask]
+        units: np.ndarray = self._units[mask]
+        order: np.ndarray = np.lexsort((ranks, student_ids))
+        student_ids, ranks, units = student_ids[order], ranks[order], units[order]
+        # Position of each row inside its student's group, in rank order.
+        positions: np.ndarray = np.arange(student_ids.size) - np.searchsorted(student_ids, student_ids)
+        keep: np.ndarray = positions < count
+        return (
+            np.bincount(student_ids[keep], weights=ranks[keep] * units[keep], minlength=len(self._students)),
+            np.bincount(student_ids[keep], weights=units[keep], minlength=len(self._students))
+        )
+
+    @staticmethod
+    def _divide(totals: np.ndarray, units: np.ndarray) -> np.ndarray:
+        """Divide totals by units, yielding nan where there are no units (get_rank raises ZeroDivisionError)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return totals / units
+
+    @property
+    def students(self) -> Tuple[Student, ...]:
+        """Students loaded in this calculator, indexed by student id."""
+        return self._students
+
+    @property
+    def totals(self) -> np.ndarray:
+        """Sum of rank×units of relative subjects, shaped (students, semesters, category slots)."""
+        return self._totals
+
+    @property
+    def unit_sums(self) -> np.ndarray:
+        """Sum of units of relative subjects, shaped (students, semesters, category slots)."""
+        return self._unit_sums
+
+    @property
+    def semester_count(self) -> int:
+        """Number of semester codes spanned by loaded subjects."""
+        return self._semester_count
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+    def get_rank(self, categories: Iterable[SubjectCategory], semesters: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Calculate weighted rank of given categories for every student.
+        With every category, subjects of unknown category count too, as in SingleGradeCalculator.rank.
+
+        Args:
+            categories (Iterable[SubjectCategory]): categories to combine.
+            semesters (Optional[Iterable[int]]): semester codes to combine. All semesters if None.
+        """
+        category_index: List[int] = _category_slots(categories)
+        totals: np.ndarray = self._totals[:, :, category_index]
+        units: np.ndarray = self._unit_sums[:, :, category_index]
+        if semesters is not None:
+            semester_index: List[int] = list(semesters)
+            totals = totals[:, semester_index]
+            units = units[:, semester_index]
+        return self._divide(totals.sum(axis=(1, 2)), units.sum(axis=(1, 2)))
+
+    @timed('aggregate')
+    def ranks(self, combinations: Dict[str, Tuple[SubjectCategory, ...]]) -> Dict[str, np.ndarray]:
+        """
+        Weighted rank of many category combinations for every student in one pass.
+        Per-category subtotals are computed once and shared by every combination
+        through a (category slots × combinations) selection matrix.
+
+        Args:
+            combinations (Dict[str, Tuple[SubjectCategory, ...]]): combinations to compute, by name.
+        """
+        selection: np.ndarray = np.zeros((CATEGORY_SLOTS, len(combinations)))
+        for column, categories in enumerate(combinations.values()):
+            selection[_category_slots(categories), column] = 1
+        ranks: np.ndarray = self._divide(
+            self._totals.sum(axis=1) @ selection,
+            self._unit_sums.sum(axis=1) @ selection
+        )
+        return {combination: ranks[:, column] for column, combination in enumerate(combinations)}
+
+    def combination_ranks(self) -> Dict[str, np.ndarray]:
+        """Weighted rank of every combination in CATEGORY_COMBINATIONS, for every student."""
+        return self.ranks(CATEGORY_COMBINATIONS)
+
+    def category_ranks(self) -> Dict[str, np.ndarray]:
+        """Weighted rank of each single category (영역 내신 총점), for every student."""
+        totals: np.ndarray = self._totals.sum(axis=1)
+        units: np.ndarray = self._unit_sums.sum(axis=1)
+        ranks: np.ndarray = self._divide(totals, units)
+        return {category.value: ranks[:, code] for code, category in enumerate(SubjectCategory)}
+
+    def semester_ranks(self) -> np.ndarray:
+        """Weighted rank of each category in each semester, shaped (students, semesters, category slots)."""
+        return self._divide(self._totals, self._unit_sums)
+
+
+class SubjectStatistics:
+    """
+    Standardized score, percentile and implied position of every subject of a cohort, as arrays.
+
+    Subjects are rows in transcript order, grouped by student. Statistics come from DetailedSubject's
+    원점수 / 과목평균 / 표준편차 / 수강자수; they are nan for plain Subjects. With zero standard deviation,
+    a score equal to the average is z = 0 and any other score is nan.
+    """
+
+    @classmethod
+    def fromJson(cls, data: Iterable[JSON]) -> SubjectStatistics:
+        """
+        Load raw transcripts without building model objects.
+
+        Args:
+            data (Iterable[JSON]): transcripts to load.
+        """
+        students: List[Student] = []
+        student_ids: List[int] = []
+        semesters: List[int] = []
+        categories: List[int] = []
+        statistics: List[Tuple[float, float, float, float]] = []
+        missing: Tuple[float, float, float, float] = (math.nan,) * 4
+        for student_id, datum in enumerate(data):
+            students.append(Student.fromJson(datum[StudentKeys.key]))
+            for raw_semester in datum[SemesterKeys.key]:
+                code: int = semester_code(raw_semester[SemesterKeys.GRADE], raw_semester[SemesterKeys.SEMESTER])
+                for raw_subject in raw_semester[SemesterKeys.SUBJECT_SCORES]:
+                    student_ids.append(student_id)
+                    semesters.append(code)
+                    categories.append(CATEGORY_CODES.get(raw_subject[SubjectKeys.CATEGORY], -1))
+                    statistics.append((
+                        raw_subject[SubjectKeys.SCORE],
+                        raw_subject[SubjectKeys.AVERAGE],
+                        raw_subject[SubjectKeys.STANDARD_DEVIATION],
+                        raw_subject[SubjectKeys.PARTICIPANTS]
+                    ) if SubjectKeys.SCORE in raw_subject else missing)
+        return cls(students, student_ids, semesters, categories, statistics)
+
+    @classmethod
+    def fromCalculators(cls, calculators: Iterable[SingleGradeCalculator]) -> SubjectStatistics:
+        """
+        Load already parsed calculators.
+
+        Args:
+            calculators (Iterable[SingleGradeCalculator]): calculators to load.
+        """
+        students: List[Student] = []
+        student_ids: List[int] = []
+        semesters: List[int] = []
+        categories: List[int] = []
+        statistics: List[Tuple[float, float, float, float]] = []
+        missing: Tuple[float, float, float, float] = (math.nan,) * 4
+        for student_id, calculator in enumerate(calculators):
+            students.append(calculator.student)
+            for semester in calculator.semesters:
+                code: int = semester_code(semester.grade, semester.semester)
+                for subject in semester.subjects:
+                    student_ids.append(student_id)
+                    semesters.append(code)
+                    categories.append(CATEGORY_CODES.get(subject.category.value, -1) if subject.category else -1)
+                    statistics.append((
+                        subject.score,
+                        subject.average,
+                        subject.standard_deviation,
+                        subject.participants
+                    ) if isinstance(subject, DetailedSubject) else missing)
+        return cls(students, student_ids, semesters, categories, statistics)
+
+    def __init__(
+            self,
+            students: Sequence[Student],
+            student_ids: Sequence[int],
+            semesters: Sequence[int],
+            categories: Sequence[int],
+            statistics: Sequence[Tuple[float, float, float, float]]
+    ) -> None:
+        """
+        Initialize SubjectStatistics from subject columns.
+
+        Args:
+            students (Sequence[Student]): students, indexed by student id.
+            student_ids (Sequence[int]): student id of each subject row.
+            semesters (Sequence[int]): semester code of each subject row. (see semester_code)
+            categories (Sequence[int]): category code of each subject row. (see CATEGORY_CODES)
+            statistics (Sequence[Tuple[float, float, float, float]]): (score, average, standard deviation, participants)
+                of each subject row. nan if subject has no statistics.
+        """
+        self._students: Tuple[Student, ...] = tuple(students)
+        self._student_ids: np.ndarray = np.asarray(student_ids, dtype=np.int64)
+        self._semesters: np.ndarray = np.asarray(semesters, dtype=np.int64)
+        self._categories: np.ndarray = np.asarray(categories, dtype=np.int64)
+        columns: np.ndarray = np.asarray(statistics, dtype=np.float64).reshape(-1, 4)
+        self._scores, self._averages, self._deviations, self._participants = columns.T
+        # Rows of student i are offsets[i]:offsets[i + 1].
+        self._offsets: np.ndarray = np.searchsorted(self._student_ids, np.arange(len(self._students) + 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z: np.ndarray = (self._scores - self._averages) / self._deviations
+        z[(self._deviations == 0) & (self._scores == self._averages)] = 0.0
+        z[~np.isfinite(z)] = np.nan
+        self._z: np.ndarray = z
+        self._percentiles: np.ndarray = 100 * normal_cdf(z)
+
+    @property
+    def students(self) -> Tuple[Student, ...]:
+        return self._students
+
+    @property
+    def student_ids(self) -> np.ndarray:
+        """Student id of each subject row."""
+        return self._student_ids
+
+    @property
+    def semesters(self) -> np.ndarray:
+        """Semester code of each subject row."""
+        return self._semesters
+
+    @property
+    def categories(self) -> np.ndarray:
+        """Category code of each subject row. -1 if unknown."""
+        return self._categories
+
+    @property
+    def z_scores(self) -> np.ndarray:
+        """Standardized score, (원점수 - 과목평균) / 표준편차, of each subject row."""
+        return self._z
+
+    @property
+    def percentiles(self) -> np.ndarray:
+        """Estimated percent of participants scoring below, assuming normally distributed scores."""
+        return self._percentiles
+
+    @property
+    def top_percents(self) -> np.ndarray:
+        """Estimated top percent (상위 %), 100 - percentile."""
+        return 100 - self._percentiles
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Implied position (석차) among 수강자수, 1 being the best. nan without statistics."""
+        positions: np.ndarray = np.ceil((1 - self._percentiles / 100) * self._participants)
+        return np.clip(positions, 1, np.fmax(self._participants, 1))
+
+    def rows(self, student_id: int) -> slice:
+        """Subject rows of a student."""
+        return slice(int(self._offsets[student_id]), int(self._offsets[student_id + 1]))
+
+    def __len__(self) -> int:
+        return len(self._students)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from batch import BatchGradeCalculator
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator
+from constants import JSON, SemesterKeys
+from extend_builtins import PyOptional
+from generator import generate_transcripts, write_transcripts
+from loader import read_json
+from models import Semester, Subject
+from report import REPORT_FORMATS, ReportRenderer
+from transcript_parser import parse_transcript
+
+__all__ = (
+    "count_subjects",
+    "measure",
+    "peak_memory",
+    "Phase",
+    "phases",
+    "run_suite",
+    "compare"
+)
+
+Results = Dict[str, Dict[str, Dict[str, float]]]    # size -> phase -> {seconds, throughput, peak_bytes}
+
+
+def count_subjects(data: List[JSON]) -> int:
+    return sum(
+        len(semester[SemesterKeys.SUBJECT_SCORES])
+        for datum in data
+        for semester in datum[SemesterKeys.key]
+    )
+
+
+def measure(func: Callable[[], object], repeat: int = 5) -> float:
+    """
+    Run func several times and return the best wall time in seconds.
+
+    Args:
+        func (Callable[[], object]): function to measure.
+        repeat (int): number of runs.
+    """
+    best: float = float('inf')
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """Peak bytes allocated while running func once. Measured separately from timing, since tracing slows it down."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Phase:
+    """A benchmarked phase : function to run, and how many items (files, subjects, students) it processes."""
+    __slots__ = ('name', 'func', 'items', 'unit')
+
+    def __init__(self, name: str, func: Callable[[], object], items: int, unit: str) -> None:
+        self.name: str = name
+        self.func: Callable[[], object] = func
+        self.items: int = items
+        self.unit: str = unit
+
+
+def _clear_map(calculators: List[SingleGradeCalculator]) -> None:
+    for calculator in calculators:
+        calculator.__dict__.pop('__subjects_map__', None)
+
+
+def _category_grades(calculators: List[SingleGradeCalculator]) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        for calculator in calculators:
+            calculator.category_grades()
+
+
+def phases(paths: List[str], data: List[JSON]) -> List[Phase]:
+    """
+    Phases of a run over given transcripts.
+
+    Args:
+        paths (List[str]): json files of the transcripts.
+        data (List[JSON]): the same transcripts, already loaded.
+    """
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in data]
+    semesters: List[JSON] = [semester for datum in data for semester in datum[SemesterKeys.key]]
+    subjects: int = count_subjects(data)
+    students: int = len(data)
+    subject_models: List[Subject] = [subject for calculator in calculators for subject in calculator.subjects]
+    renderers: List[ReportRenderer] = [ReportRenderer(CATEGORY_COMBINATIONS, format) for format in REPORT_FORMATS]
+    return [
+        Phase('read_json', lambda: [read_json(path) for path in paths], len(paths), 'files'),
+        Phase('Semester.fromJson', lambda: [Semester.fromJson(semester) for semester in semesters], subjects, 'subjects'),
+        Phase('parse_transcript', lambda: [parse_transcript(datum) for datum in data], subjects, 'subjects'),
+        Phase('math_subjects', lambda: [SingleGradeCalculator(datum).math_subjects for datum in data], students, 'students'),
+        Phase('math_subjects (lazy)', lambda: [SingleGradeCalculator(datum, lazy=True).math_subjects for datum in data], students, 'students'),
+        Phase('get_rank', lambda: [calculator.get_rank(calculator.subjects) for calculator in calculators], students, 'students'),
+        Phase('map', lambda: (_clear_map(calculators), [calculator.map for calculator in calculators]), students, 'students'),
+        Phase('category_grades', lambda: (_clear_map(calculators), _category_grades(calculators)), students, 'students'),
+        *(
+            Phase(f'render_{renderer.format}', lambda renderer=renderer: renderer.write(calculators, io.StringIO()), students, 'students')
+            for renderer in renderers
+        ),
+        # Wrapping cost must not depend on the wrapped object : a calculator is far larger than a subject.
+        Phase('PyOptional (subject)', lambda: [PyOptional.ofNullable(subject) for subject in subject_models], subjects, 'subjects'),
+        Phase('PyOptional (calculator)', lambda: [PyOptional.ofNullable(calculator) for calculator in calculators], students, 'students'),
+        Phase('toJson', lambda: [calculator.toJson() for calculator in calculators], students, 'students'),
+        Phase('BatchGradeCalculator', lambda: BatchGradeCalculator.fromJson(data).combination_ranks(), students, 'students')
+    ]
+
+
+def run_suite(sizes: List[int], seed: int = 0, repeat: int = 3) -> Results:
+    """
+    Generate transcripts of each size and benchmark every phase.
+
+    Args:
+        sizes (List[int]): numbers of students.
+        seed (int): generator seed.
+        repeat (int): runs per phase. Best time is kept.
+    """
+    results: Results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths: List[str] = write_transcripts(directory, size, seed)
+            data: List[JSON] = list(generate_transcripts(size, seed))
+            results[str(size)] = {}
+            for phase in phases(paths, data):
+                seconds: float = measure(phase.func, repeat)
+                results[str(size)][phase.name] = {
+                    'seconds': seconds,
+                    'throughput': phase.items / seconds if seconds else float('inf'),
+                    'peak_bytes': peak_memory(phase.func)
+                }
+                print(
+                    f'[{size:>7}] {phase.name:<22}'
+                    f'{results[str(size)][phase.name]["throughput"]:>14,.0f} {phase.unit}/s'
+                    f'{results[str(size)][phase.name]["peak_bytes"] / 1024:>12,.0f} KiB peak'
+                )
+    return results
+
+
+def compare(results: Results, baseline: Results, tolerance: float = 0.2) -> List[str]:
+    """
+    Compare results with baseline. Returns regressions : phases slower or larger than tolerance allows.
+
+    Args:
+        results (Results): current results.
+        baseline (Results): stored results to compare with.
+        tolerance (float): allowed relative loss of throughput / growth of peak memory.
+    """
+    regressions: List[str] = []
+    for size, phase_results in results.items():
+        for name, result in phase_results.items():
+            try:
+                base: Dict[str, float] = baseline[size][name]
+            except KeyError:
+                continue
+            if result['throughput'] < base['throughput'] * (1 - tolerance):
+                regressions.append(
+                    f'[{size}] {name} : throughput {result["throughput"]:,.0f}/s < baseline {base["throughput"]:,.0f}/s'
+                )
+            if result['peak_bytes'] > base['peak_bytes'] * (1 + tolerance):
+                regressions.append(
+                    f'[{size}] {name} : peak memory {result["peak_bytes"]:,} B > baseline {base["peak_bytes"]:,} B'
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='내신 산출 도구 - 벤치마크')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000], help='numbers of students (up to 100000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=os.path.join(os.getcwd(), 'benchmark_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results: Results = run_suite(args.sizes, args.seed, args.repeat)
+    if args.save_baseline:
+        with open(args.baseline, mode='wt', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f'> baseline saved to {args.baseline}')
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, mode='rt', encoding='utf-8') as f:
+            regressions: List[str] = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'> REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('> no regression against baseline')
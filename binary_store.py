@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from batch import BatchGradeCalculator, CATEGORY_CODES, TYPE_CODES, semester_code
+from calc import SingleGradeCalculator
+from constants import JSON
+from loader import list_data_files, load_files
+from models import *
+
+__all__ = (
+    "pack",
+    "TranscriptStore"
+)
+
+# File layout (little endian):
+#   header    : magic, version, counts of students/semesters/subjects/strings, then section offsets.
+#   sections  : fixed-width columns, each aligned to 8 bytes, plus a string table for names.
+MAGIC: bytes = b'HGCB'
+VERSION: int = 1
+_HEADER: struct.Struct = struct.Struct('<4sIIIII')
+_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    # Student columns
+    ('student_names', 'I'),         # string id of 이름
+    ('student_grades', 'i'),        # 학년
+    ('student_semesters', 'I'),     # index of first semester
+    # Semester columns
+    ('semester_grades', 'i'),       # 학년
+    ('semester_semesters', 'i'),    # 학기
+    ('semester_subjects', 'I'),     # index of first subject
+    # Subject columns
+    ('types', 'b'),                 # index in SubjectType, -1 if unknown
+    ('categories', 'b'),            # index in SubjectCategory, -1 if unknown
+    ('achievements', 'b'),          # index in SubjectAchievementLevels
+    ('detailed', 'B'),              # 1 if DetailedSubject
+    ('names', 'I'),                 # string id of 교과명
+    ('units', 'i'),                 # 단위수
+    ('ranks', 'i'),                 # 석차등급, -1 if None
+    ('scores', 'd'),                # 원점수, nan if not detailed
+    ('averages', 'd'),              # 과목평균, nan if not detailed
+    ('standard_deviations', 'd'),   # 표준편차, nan if not detailed
+    ('participants', 'i'),          # 수강자수, -1 if not detailed
+    # String table
+    ('string_offsets', 'I'),        # n_strings + 1 offsets into string_data
+    ('string_data', 'B')            # utf-8 encoded strings
+)
+_OFFSETS: struct.Struct = struct.Struct('<' + 'Q' * len(_COLUMNS))
+_ALIGNMENT: int = 8
+_NONE: int = -1
+
+_TYPES: Tuple[SubjectType, ...] = tuple(SubjectType)
+_CATEGORIES: Tuple[SubjectCategory, ...] = tuple(SubjectCategory)
+_ACHIEVEMENTS: Tuple[SubjectAchievementLevels, ...] = tuple(SubjectAchievementLevels)
+_ACHIEVEMENT_CODES: Dict[str, int] = {achievement.value: code for code, achievement in enumerate(_ACHIEVEMENTS)}
+
+
+def _code(codes: Dict[str, int], member: Optional[Enum]) -> int:
+    return _NONE if member is None else codes.get(member.value, _NONE)
+
+
+def pack(path: str, calculators: Iterable[SingleGradeCalculator]) -> int:
+    """
+    Pack parsed transcripts into a binary store file.
+
+    Args:
+        path (str): path of the file to write.
+        calculators (Iterable[SingleGradeCalculator]): transcripts to pack.
+
+    Returns:
+        int: number of packed students.
+    """
+    columns: Dict[str, array] = {name: array(typecode) for name, typecode in _COLUMNS}
+    strings: Dict[str, int] = {}
+    nan: float = float('nan')
+
+    def string_id(value: str) -> int:
+        try:
+            return strings[value]
+        except KeyError:
+            strings[value] = len(strings)
+            return strings[value]
+
+    for calculator in calculators:
+        student: Student = calculator.student
+        columns['student_names'].append(string_id(student.name))
+        columns['student_grades'].append(student.grade)
+        columns['student_semesters'].append(len(columns['semester_grades']))
+        for semester in calculator.semesters:
+            columns['semester_grades'].append(semester.grade)
+            columns['semester_semesters'].append(semester.semester)
+            columns['semester_subjects'].append(len(columns['types']))
+            for subject in semester.subjects:
+                detailed: bool = isinstance(subject, DetailedSubject)
+                columns['types'].append(_code(TYPE_CODES, subject.type))
+                columns['categories'].append(_code(CATEGORY_CODES, subject.category))
+                columns['achievements'].append(_code(_ACHIEVEMENT_CODES, subject.achievement))
+                columns['detailed'].append(detailed)
+                columns['names'].append(string_id(subject.name))
+                columns['units'].append(subject.units)
+                columns['ranks'].append(_NONE if subject.rank is None else subject.rank)
+                columns['scores'].append(subject.score if detailed else nan)
+                columns['averages'].append(subject.average if detailed else nan)
+                columns['standard_deviations'].append(subject.standard_deviation if detailed else nan)
+                columns['participants'].append(subject.participants if detailed else _NONE)
+    # Sentinels, so that the range of the last student / semester can be read like any other.
+    columns['student_semesters'].append(len(columns['semester_grades']))
+    columns['semester_subjects'].append(len(columns['types']))
+
+    offset: int = 0
+    for value in strings:
+        columns['string_offsets'].append(offset)
+        encoded: bytes = value.encode('utf-8')
+        columns['string_data'].frombytes(encoded)
+        offset += len(encoded)
+    columns['string_offsets'].append(offset)
+
+    with open(path, mode='wb') as f:
+        f.write(_HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(columns['student_grades']),
+            len(columns['semester_grades']),
+            len(columns['types']),
+            len(strings)
+        ))
+        position: int = _HEADER.size + _OFFSETS.size
+        offsets: List[int] = []
+        for name, _ in _COLUMNS:
+            position += -position % _ALIGNMENT
+            offsets.append(position)
+            position += len(columns[name]) * columns[name].itemsize
+        f.write(_OFFSETS.pack(*offsets))
+        for (name, _), column_offset in zip(_COLUMNS, offsets):
+            f.write(b'\0' * (column_offset - f.tell()))
+            columns[name].tofile(f)
+    return len(columns['student_grades'])
+
+
+class TranscriptStore:
+    """
+    Read-only view of a binary store file created by pack().
+
+    The file is memory mapped, and numeric columns are exposed as memoryviews over the mapping,
+    so opening a store does not read or copy transcripts. Models are hydrated only on access.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, mode='rb')
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._columns: Dict[str, memoryview] = {}
+        self._string_data: Optional[memoryview] = None
+        self._strings: Dict[int, str] = {}
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, students, semesters, subjects, strings = _HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a transcript store!')
+            elif version != VERSION:
+                raise ValueError(f'{path} has unsupported store version {version}!')
+            self._student_count: int = students
+            lengths: Dict[str, int] = {
+                'student_semesters': students + 1,
+                'semester_subjects': semesters + 1,
+                'string_offsets': strings + 1
+            }
+            for name in ('student_names', 'student_grades'):
+                lengths[name] = students
+            for name in ('semester_grades', 'semester_semesters'):
+                lengths[name] = semesters
+            for name in ('types', 'categories', 'achievements', 'detailed', 'names', 'units', 'ranks',
+                         'scores', 'averages', 'standard_deviations', 'participants'):
+                lengths[name] = subjects
+            offsets: Tuple[int, ...] = _OFFSETS.unpack_from(self._mmap, _HEADER.size)
+            self._view = memoryview(self._mmap)
+            for (name, typecode), offset in zip(_COLUMNS, offsets):
+                if name == 'string_data':
+                    continue
+                size: int = struct.calcsize(typecode)
+                self._columns[name] = self._view[offset:offset + lengths[name] * size].cast(typecode)
+            string_start: int = offsets[-1]
+            self._string_data = self._view[string_start:string_start + self._columns['string_offsets'][-1]]
+        except Exception:
+            # Empty, truncated or foreign file : release what was opened before raising.
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Release column views and unmap the file."""
+        for column in self._columns.values():
+            column.release()
+        self._columns.clear()
+        if self._string_data is not None:
+            self._string_data.release()
+        if self._view is not None:
+            self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> TranscriptStore:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._student_count
+
+    def column(self, name: str) -> memoryview:
+        """
+        Zero-copy view of a column in the store.
+
+        Args:
+            name (str): column name. (units, ranks, scores, averages, standard_deviations, participants, ...)
+        """
+        return self._columns[name]
+
+    def string(self, string_id: int) -> str:
+        """Decode string from the string table. Decoded strings are cached."""
+        try:
+            return self._strings[string_id]
+        except KeyError:
+            offsets: memoryview = self._columns['string_offsets']
+            value: str = str(self._string_data[offsets[string_id]:offsets[string_id + 1]], 'utf-8')
+            self._strings[string_id] = value
+            return value
+
+    def student(self, index: int) -> Student:
+        return Student(self.string(self._columns['student_names'][index]), self._columns['student_grades'][index])
+
+    def _subject(self, index: int, grade: int, semester: int) -> Subject:
+        c: Dict[str, memoryview] = self._columns
+        subject_type: Optional[SubjectType] = _TYPES[c['types'][index]] if c['types'][index] != _NONE else None
+        category: Optional[SubjectCategory] = _CATEGORIES[c['categories'][index]] if c['categories'][index] != _NONE else None
+        achievement: SubjectAchievementLevels = _ACHIEVEMENTS[c['achievements'][index]]
+        rank: Optional[int] = c['ranks'][index] if c['ranks'][index] != _NONE else None
+        name: str = self.string(c['names'][index])
+        if not c['detailed'][index]:
+            return Subject(subject_type, category, name, c['units'][index], rank, achievement, grade, semester)
+        return DetailedSubject(
+            subject_type,
+            category,
+            name,
+            c['units'][index],
+            rank,
+            achievement,
+            c['scores'][index],
+            c['averages'][index],
+            c['standard_deviations'][index],
+            c['participants'][index],
+            grade,
+            semester
+        )
+
+    def semesters(self, index: int) -> List[Semester]:
+        c: Dict[str, memoryview] = self._columns
+        semesters: List[Semester] = []
+        for semester_index in range(c['student_semesters'][index], c['student_semesters'][index + 1]):
+            grade: int = c['semester_grades'][semester_index]
+            semester: int = c['semester_semesters'][semester_index]
+            semesters.append(Semester(grade, semester, [
+                self._subject(subject_index, grade, semester)
+                for subject_index in range(c['semester_subjects'][semester_index], c['semester_subjects'][semester_index + 1])
+            ]))
+        return semesters
+
+    def calculator(self, index: int) -> SingleGradeCalculator:
+        """Hydrate calculator of a single student."""
+        return SingleGradeCalculator.fromModels(self.student(index), self.semesters(index))
+
+    def calculators(self) -> Iterator[SingleGradeCalculator]:
+        return map(self.calculator, range(len(self)))
+
+    def toJson(self, index: int) -> JSON:
+        """Transcript of a single student, in the same schema it was packed from."""
+        return self.calculator(index).toJson()
+
+    def toBatch(self) -> BatchGradeCalculator:
+        """Build BatchGradeCalculator straight from the numeric columns, without hydrating models."""
+        c: Dict[str, memoryview] = self._columns
+        semester_starts: np.ndarray = np.frombuffer(c['semester_subjects'], dtype=np.uint32).astype(np.int64)
+        student_starts: np.ndarray = np.frombuffer(c['student_semesters'], dtype=np.uint32).astype(np.int64)
+        subjects_per_semester: np.ndarray = np.diff(semester_starts)
+        semesters: np.ndarray = np.repeat(
+            semester_code(np.frombuffer(c['semester_grades'], dtype=np.int32).astype(np.int64),
+                          np.frombuffer(c['semester_semesters'], dtype=np.int32).astype(np.int64)),
+            subjects_per_semester
+        )
+        student_ids: np.ndarray = np.repeat(
+            np.repeat(np.arange(len(self)), np.diff(student_starts)),
+            subjects_per_semester
+        )
+        return BatchGradeCalculator(
+            [self.student(index) for index in range(len(self))],
+            student_ids,
+            semesters,
+            np.frombuffer(c['categories'], dtype=np.int8),
+            np.frombuffer(c['types'], dtype=np.int8),
+            np.frombuffer(c['units'], dtype=np.int32),
+            np.maximum(np.frombuffer(c['ranks'], dtype=np.int32), 0)
+        )
+
+
+if __name__ == "__main__":
+    # python binary_store.py <data directory> <store file>
+    def _calculators(directory: str) -> Iterator[SingleGradeCalculator]:
+        for result in load_files(list_data_files(directory)):
+            if result.ok:
+                yield result.calculator
+            else:
+                print(f'> {result.path} 을 읽지 못했습니다 : {result.error}', file=sys.stderr)
+
+    count: int = pack(sys.argv[2], _calculators(sys.argv[1]))
+    print(f'> {count} 명의 성적을 {sys.argv[2]} ({os.path.getsize(sys.argv[2]):,} bytes) 에 저장했습니다.')
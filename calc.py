@@ -1,26 +1,178 @@
+from __future__ import annotations
+
 import json
+from operator import attrgetter
 from pprint import pprint
-from typing import NoReturn, Tuple, List, Dict, Iterable
+from typing import NoReturn, Tuple, List, Dict, Iterable, Optional, TextIO
 from constants import StudentKeys, SemesterKeys, JSON
 from models import *
+from extend_builtins import Stream
+from transcript_parser import parse_transcript
+from instrumentation import metrics, timed
+from report import ReportRenderer
+
+
+# Category combinations reported by SingleGradeCalculator.category_grades, in report order.
+CATEGORY_COMBINATIONS: Dict[str, Tuple[SubjectCategory, ...]] = {
+    '종합 내신': tuple(SubjectCategory),
+    '국영수사과': (
+        SubjectCategory.KOREAN,
+        SubjectCategory.MATH,
+        SubjectCategory.ENGLISH,
+        SubjectCategory.SCIENCE,
+        SubjectCategory.SOCIOLOGY
+    ),
+    '국영수': (SubjectCategory.KOREAN, SubjectCategory.MATH, SubjectCategory.ENGLISH),
+    '국영수과': (SubjectCategory.KOREAN, SubjectCategory.MATH, SubjectCategory.ENGLISH, SubjectCategory.SCIENCE),
+    '국영수사': (SubjectCategory.KOREAN, SubjectCategory.MATH, SubjectCategory.ENGLISH, SubjectCategory.SOCIOLOGY),
+    '영수과': (SubjectCategory.MATH, SubjectCategory.ENGLISH, SubjectCategory.SCIENCE)
+}
+
+
+def category_key(category: Optional[SubjectCategory]) -> Optional[str]:
+    """Aggregate index key of a subject category : its value, None if the category was not recognised."""
+    return None if category is None else category.value
+
+
+def covers_transcript(categories: Iterable[SubjectCategory]) -> bool:
+    """
+    Whether a combination holds every category, and so stands for the whole transcript (ex: '종합 내신').
+    Such combinations also count subjects of unrecognised category, as get_rank over every subject does.
+    """
+    values = {category.value for category in categories}
+    return all(category.value in values for category in SubjectCategory)
+
+
+def category_keys(categories: Iterable[SubjectCategory]) -> List[Optional[str]]:
+    """
+    Aggregate index keys of a combination : value of each category, and None if it covers the transcript.
+
+    Args:
+        categories (Iterable[SubjectCategory]): categories to combine.
+    """
+    categories = tuple(categories)
+    keys: List[Optional[str]] = [category.value for category in categories]
+    if covers_transcript(categories):
+        keys.append(None)
+    return keys
+
+
+class SubjectAggregate:
+    """Partial sums of relative subjects' rank×units and units, with the subjects they were built from."""
+    __slots__ = ('total', 'units', 'subjects')
+
+    def __init__(self) -> None:
+        self.total: int = 0     # sum of rank×units (상대평가 과목만)
+        self.units: int = 0     # sum of units (상대평가 과목만)
+        self.subjects: List[Subject] = []
+
+    def add(self, subject: Subject) -> None:
+        self.subjects.append(subject)
+        if subject.type == SubjectType.RELATIVE:
+            self.total += subject.rank * subject.units
+            self.units += subject.units
+
+    def __repr__(self) -> str:
+        return f"SubjectAggregate<total={self.total},units={self.units},subjects={len(self.subjects)}>"
+
+
+class LazyIndex(dict):
+    """
+    Aggregate index built one category at a time, on first lookup of that category.
+    Categories are read with Semester.filter_category, so lazy semesters parse only the asked category.
+    """
+
+    def __init__(self, semesters: List[Semester]) -> None:
+        super().__init__()
+        self._semesters: List[Semester] = semesters
+
+    def __missing__(self, key: Optional[str]) -> Dict[str, SubjectAggregate]:
+        category: Optional[SubjectCategory] = None if key is None else SubjectCategory.parse(key)
+        category_index: Dict[str, SubjectAggregate] = {}
+        for semester in self._semesters:
+            subjects = semester.filter_category(category) if category is not None else (
+                subject for subject in semester.subjects if subject.category is None
+            )
+            for subject in subjects:
+                try:
+                    aggregate: SubjectAggregate = category_index[subject.semesterInfo]
+                except KeyError:
+                    aggregate = category_index[subject.semesterInfo] = SubjectAggregate()
+                aggregate.add(subject)
+        self[key] = category_index
+        return category_index
 
 
 class SingleGradeCalculator:
-    def __init__(self, data: JSON) -> NoReturn:
-        student, semesters = self.parse_data(data)
+    def __init__(self, data: JSON, lazy: bool = False) -> NoReturn:
+        """
+        Args:
+            data (JSON): transcript to calculate.
+            lazy (bool): parse subjects and index categories only when a query first needs them.
+        """
+        student, semesters = self.parse_data(data, lazy)
+        self._load(student, semesters, lazy)
+
+    @classmethod
+    def fromModels(cls, student: Student, semesters: List[Semester]) -> SingleGradeCalculator:
+        """
+        Create calculator from already parsed models, skipping json parse.
+
+        Args:
+            student (Student): student to describe.
+            semesters (List[Semester]): semesters of the student.
+        """
+        calculator: SingleGradeCalculator = cls.__new__(cls)
+        calculator._load(student, semesters)
+        return calculator
+
+    def _load(self, student: Student, semesters: List[Semester], lazy: bool = False) -> None:
         self._student: Student = student
         self._semesters: List[Semester] = semesters
+        self._index: Dict[Optional[str], Dict[str, SubjectAggregate]] = LazyIndex(semesters) if lazy else self.build_index(semesters)
+
+    def toJson(self) -> JSON:
+        """Convert calculator back into json data, in the same schema it was parsed from."""
+        return {
+            StudentKeys.key: self._student.toJson(),
+            SemesterKeys.key: [semester.toJson() for semester in self._semesters]
+        }
 
     @staticmethod
-    def parse_data(data: JSON) -> Tuple[Student, List[Semester]]:
+    @timed('parse')
+    def parse_data(data: JSON, lazy: bool = False) -> Tuple[Student, List[Semester]]:
         """Parse config data into Calculator"""
-        raw_student: JSON = data[StudentKeys.key]
-        student: Student = Student.fromJson(raw_student)
-        raw_semesters: List[JSON] = data[SemesterKeys.key]
-        semesters: List[Semester] = [Semester.fromJson(semester) for semester in raw_semesters]
-        return student, semesters
+        return parse_transcript(data, lazy)
+
+    @staticmethod
+    @timed('index')
+    def build_index(semesters: Iterable[Semester]) -> Dict[Optional[str], Dict[str, SubjectAggregate]]:
+        """
+        Build aggregate index of subjects, keyed by category value (None if not recognised) and semester info.
+        Subjects keep their semester order inside each aggregate.
+
+        Args:
+            semesters (Iterable[Semester]): semesters to index.
+        """
+        index: Dict[Optional[str], Dict[str, SubjectAggregate]] = {category.value: {} for category in SubjectCategory}
+        index[None] = {}
+        for semester in semesters:
+            for subject in semester.subjects:
+                category_index: Dict[str, SubjectAggregate] = index[category_key(subject.category)]
+                try:
+                    aggregate: SubjectAggregate = category_index[subject.semesterInfo]
+                except KeyError:
+                    aggregate = category_index[subject.semesterInfo] = SubjectAggregate()
+                aggregate.add(subject)
+        if metrics.enabled:
+            subjects: int = sum(len(semester.subjects) for semester in semesters)
+            metrics.count('students')
+            metrics.count('subjects', subjects)
+            metrics.observe('subjects_per_student', subjects, (10, 20, 30, 40, 50, 60, 80, 100, 150))
+        return index
 
     @staticmethod
+    @timed('aggregate')
     def get_rank(subjects: Iterable[Subject]) -> float:
         total: int = 0
         units: int = 0
@@ -30,6 +182,47 @@ class SingleGradeCalculator:
                 units += subject.units
         return total / units
 
+    @timed('aggregate')
+    def rank(self, categories: Iterable[SubjectCategory], semesters: Optional[Iterable[str]] = None) -> float:
+        """
+        Calculate weighted rank of given categories from the aggregate index, without walking subjects.
+        Same as get_rank over subjects of those categories; with every category, get_rank over every subject.
+
+        Args:
+            categories (Iterable[SubjectCategory]): categories to combine.
+            semesters (Optional[Iterable[str]]): semester infos (ex: '1학년 1학기') to combine. All semesters if None.
+        """
+        total: int = 0
+        units: int = 0
+        semesters = None if semesters is None else tuple(semesters)
+        for key in category_keys(categories):
+            category_index: Dict[str, SubjectAggregate] = self._index[key]
+            aggregates = category_index.values() if semesters is None else (
+                category_index[semester] for semester in semesters if semester in category_index
+            )
+            for aggregate in aggregates:
+                total += aggregate.total
+                units += aggregate.units
+        return total / units
+
+    @property
+    def student(self) -> Student:
+        """Student this calculator describes."""
+        return self._student
+
+    @property
+    def semesters(self) -> List[Semester]:
+        """Semesters of the student."""
+        return self._semesters
+
+    @property
+    def index(self) -> Dict[Optional[str], Dict[str, SubjectAggregate]]:
+        """
+        Aggregate index of subjects, keyed by category value (None if not recognised) and semester info.
+        In lazy mode, a category appears once it has been looked up.
+        """
+        return self._index
+
     @property
     def subjects(self) -> List[Subject]:
         subjects: List[Subject] = []
@@ -38,114 +231,97 @@ class SingleGradeCalculator:
                 subjects.append(subject)
         return subjects
 
+    def stream(self) -> Stream[Subject]:
+        """
+        Lazy stream of subjects in transcript order, for queries the aggregate index doesn't answer.
+        (ex: calculator.stream().filter(lambda subject: subject.rank == 1).take(3).toTuple())
+        Semesters are walked only as far as the query pulls.
+        """
+        return Stream(self._semesters).flat_map(attrgetter('subjects'))
+
+    def filter_category(self, category: SubjectCategory) -> Tuple[Subject, ...]:
+        subjects: List[Subject] = []
+        for aggregate in self._index[category.value].values():
+            subjects.extend(aggregate.subjects)
+        return tuple(subjects)
+
     @property
-    def korean_subjects(self) -> Tuple[Subject]:
-        korean_subjects: List[Subject] = []
-        for semester in self._semesters:
-            korean_subjects.extend(semester.korean_subjects)
-        return tuple(korean_subjects)
+    def korean_subjects(self) -> Tuple[Subject, ...]:
+        return self.filter_category(SubjectCategory.KOREAN)
 
     @property
-    def math_subjects(self) -> Tuple[Subject]:
-        math_subjects: List[Subject] = []
-        for semester in self._semesters:
-            math_subjects.extend(semester.math_subjects)
-        return tuple(math_subjects)
+    def math_subjects(self) -> Tuple[Subject, ...]:
+        return self.filter_category(SubjectCategory.MATH)
 
     @property
-    def english_subjects(self) -> Tuple[Subject]:
-        english_subjects: List[Subject] = []
-        for semester in self._semesters:
-            english_subjects.extend(semester.english_subjects)
-        return tuple(english_subjects)
+    def english_subjects(self) -> Tuple[Subject, ...]:
+        return self.filter_category(SubjectCategory.ENGLISH)
 
     @property
-    def science_subjects(self) -> Tuple[Subject]:
-        science_subjects: List[Subject] = []
-        for semester in self._semesters:
-            science_subjects.extend(semester.science_subjects)
-        return tuple(science_subjects)
+    def science_subjects(self) -> Tuple[Subject, ...]:
+        return self.filter_category(SubjectCategory.SCIENCE)
 
     @property
-    def sociology_subjects(self) -> Tuple[Subject]:
-        sociology_subjects: List[Subject] = []
-        for semester in self._semesters:
-            sociology_subjects.extend(semester.sociology_subjects)
-        return tuple(sociology_subjects)
+    def sociology_subjects(self) -> Tuple[Subject, ...]:
+        return self.filter_category(SubjectCategory.SOCIOLOGY)
 
     @property
-    def etc_subjects(self) -> Tuple[Subject]:
-        etc_subjects: List[Subject] = []
-        for semester in self._semesters:
-            etc_subjects.extend(semester.etc_subjects)
-        return tuple(etc_subjects)
+    def etc_subjects(self) -> Tuple[Subject, ...]:
+        return self.filter_category(SubjectCategory.ETC)
+
+    def combination_subjects(self, categories: Iterable[SubjectCategory]) -> Tuple[Subject, ...]:
+        """
+        Collect subjects of several categories.
+
+        Args:
+            categories (Iterable[SubjectCategory]): categories to collect subjects from.
+        """
+        subjects: List[Subject] = []
+        for category in categories:
+            subjects.extend(self.filter_category(category))
+        return tuple(subjects)
+
+    def combination_ranks(self) -> Dict[str, Optional[float]]:
+        """Weighted rank of every combination in CATEGORY_COMBINATIONS. None if combination has no relative subjects."""
+        ranks: Dict[str, Optional[float]] = {}
+        for combination, categories in CATEGORY_COMBINATIONS.items():
+            try:
+                ranks[combination] = self.rank(categories)
+            except ZeroDivisionError:
+                ranks[combination] = None
+        return ranks
+
+    def category_ranks(self) -> Dict[str, Optional[float]]:
+        """Weighted rank of each single category (영역 내신 총점). None if category has no relative subjects."""
+        ranks: Dict[str, Optional[float]] = {}
+        for category in SubjectCategory:
+            try:
+                ranks[category.value] = self.rank((category,))
+            except ZeroDivisionError:
+                ranks[category.value] = None
+        return ranks
 
     @property
     def map(self) -> Dict[str, Dict[str, List[Subject]]]:
         # Use caching.
-        data = getattr(self, '__subjects__map__', False)
+        data = getattr(self, '__subjects_map__', False)
         if data: return data
         # If not cached.
-        data = {}
-        for subjectName in SubjectCategory.__members__.values():
-            subjectsProperty: property = getattr(self, f'{subjectName.name.lower()}_subjects', None)
-            subjects = subjectsProperty.__get__() if isinstance(subjectsProperty, property) else subjectsProperty  # make sure value of the property is stored.
-            subjectData = {}
-            for subject in subjects:
-                try:
-                    subjectData[subject.semesterInfo]
-                except KeyError:
-                    subjectData[subject.semesterInfo] = []
-                subjectData[subject.semesterInfo].append(subject)
-            data[subjectName.value] = subjectData
+        data = {
+            category.value: {
+                semesterInfo: aggregate.subjects for semesterInfo, aggregate in self._index[category.value].items()
+            }
+            for category in SubjectCategory
+        }
         setattr(self, '__subjects_map__', data)
         return data
 
-    def category_grades(self):
+    def category_grades(self, file: Optional[TextIO] = None) -> None:
         """
-        Calculate total subject grade (내신) of certain subject category
+        Print total subject grade (내신) of every combination and category, with subjects of each category.
+        The report is rendered into one buffer and written with a single call.
 
         Args:
-            category (SubjectCategory): subject's category
-        """
-        print('> 종합 내신 총점 : {}'.format(self.get_rank(
-            self.subjects
-        )))
-        print('> 국영수사과 총점 : {}'.format(self.get_rank(
-            self.korean_subjects +
-            self.math_subjects +
-            self.english_subjects +
-            self.science_subjects +
-            self.sociology_subjects
-        )))
-        print('> 국영수 총점 : {}'.format(self.get_rank(
-            self.korean_subjects +
-            self.math_subjects +
-            self.english_subjects
-        )))
-        print('> 국영수과 총점 : {}'.format(self.get_rank(
-            self.korean_subjects +
-            self.math_subjects +
-            self.english_subjects +
-            self.science_subjects
-        )))
-        print('> 국영수사 총점 : {}'.format(self.get_rank(
-            self.korean_subjects +
-            self.math_subjects +
-            self.english_subjects +
-            self.sociology_subjects
-        )))
-        print('> 영수과 총점 : {}'.format(self.get_rank(
-            self.math_subjects +
-            self.english_subjects +
-            self.science_subjects
-        )))
-
-        for subjectName, subjects in self.map.items():
-            print('='*10)
-            print(f'[ {subjectName} 영역 ]')
-            for semesterInfo, subjects in subjects.items():
-                print(f'{semesterInfo}:')
-                for subject in subjects:
-                    print(subject.pretty())
-            print(f'> {subjectName} 영역 내신 총점 : {self.get_rank(subjects)}')
+            file (Optional[TextIO]): file-like target. sys.stdout if None.
+        """
+        ReportRenderer(CATEGORY_COMBINATIONS).write((self,), file)
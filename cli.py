@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import io
+import json
+import math
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from batch import BatchGradeCalculator
+from calc import CATEGORY_COMBINATIONS
+from formula import FormulaError, FormulaSet, compile_formula, load_formulas
+from instrumentation import configure_from_env
+from loader import list_data_files, load_files, read_files
+from main import MENU_COMBINATIONS, menu_combinations
+from models import SubjectCategory
+from parse_cache import ParseCache
+
+__all__ = (
+    "COMBINATIONS",
+    "expand_inputs",
+    "write_results",
+    "run"
+)
+
+# Every combination selectable by name : report combinations and viewer menu combinations.
+COMBINATIONS: Dict[str, Tuple[SubjectCategory, ...]] = dict(CATEGORY_COMBINATIONS)
+for _menu in MENU_COMBINATIONS.values():
+    COMBINATIONS.update(_menu)
+
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """
+    Expand files, directories and glob patterns into json file paths, keeping argument order.
+
+    Args:
+        inputs (List[str]): command line inputs.
+    """
+    paths: List[str] = []
+    for value in inputs:
+        if os.path.isdir(value):
+            paths.extend(list_data_files(value))
+        elif os.path.isfile(value):
+            paths.append(value)
+        else:
+            matches: List[str] = sorted(glob.glob(value, recursive=True))
+            if not matches:
+                print(f'> {value} 와 일치하는 파일이 없습니다.', file=sys.stderr)
+            for match in matches:
+                paths.extend(list_data_files(match) if os.path.isdir(match) else [match])
+    return paths
+
+
+def _chunks(results: Iterator, size: int) -> Iterator[List]:
+    chunk: List = []
+    for result in results:
+        chunk.append(result)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _batch(paths: List[str], loaded: List, raw: bool) -> Tuple[BatchGradeCalculator, List[str], List[Tuple[str, str]]]:
+    """
+    Build BatchGradeCalculator of a chunk, from json data (raw) or calculators.
+    If a transcript is malformed, it is rejected alone instead of failing the chunk.
+
+    Returns:
+        Tuple[BatchGradeCalculator, List[str], List[Tuple[str, str]]]: calculator, accepted paths, and rejected (path, error).
+    """
+    build = BatchGradeCalculator.fromJson if raw else BatchGradeCalculator.fromCalculators
+    try:
+        return build(loaded), paths, []
+    except Exception:
+        accepted: List = []
+        accepted_paths: List[str] = []
+        rejected: List[Tuple[str, str]] = []
+        for path, item in zip(paths, loaded):
+            try:
+                build([item])
+            except Exception as e:
+                rejected.append((path, f'{type(e).__name__}: {e}'))
+                continue
+            accepted.append(item)
+            accepted_paths.append(path)
+        return build(accepted), accepted_paths, rejected
+
+
+def write_results(
+        paths: List[str],
+        combinations: Dict[str, Tuple[SubjectCategory, ...]],
+        output: TextIO,
+        format: str = 'csv',
+        chunk_size: int = 4096,
+        workers: Optional[int] = None,
+        cache: Optional[ParseCache] = None,
+        formulas: Optional[FormulaSet] = None
+) -> Tuple[int, int]:
+    """
+    Compute combinations of every transcript and write them to output.
+    Transcripts are computed chunk by chunk with BatchGradeCalculator, and each chunk is rendered
+    into a buffer and written with a single call.
+
+    Args:
+        paths (List[str]): json files to compute.
+        combinations (Dict[str, Tuple[SubjectCategory, ...]]): combinations to compute, by name.
+        output (TextIO): stream to write results.
+        format (str): 'csv' or 'jsonl'.
+        chunk_size (int): number of transcripts computed and written at once.
+        workers (Optional[int]): worker processes used to load files.
+        cache (Optional[ParseCache]): parse cache to load files through.
+        formulas (Optional[FormulaSet]): user formulas, written after combinations.
+
+    Returns:
+        Tuple[int, int]: number of written rows and number of failed files.
+    """
+    written: int = 0
+    failed: int = 0
+    header: List[str] = ['file', '이름', '학년'] + list(combinations) + (list(formulas.formulas) if formulas else [])
+    if format == 'csv':
+        csv.writer(output, lineterminator='\n').writerow(header)
+    if cache is None:
+        # Columns are built straight from json; no model objects are needed.
+        results = read_files(paths, workers=workers)
+    else:
+        results = (
+            (result.path, result.calculator, result.error)
+            for result in load_files(paths, workers=workers, cache=cache)
+        )
+    for chunk in _chunks(results, chunk_size):
+        paths_loaded: List[str] = []
+        loaded: List = []
+        for path, data, error in chunk:
+            if error is None:
+                paths_loaded.append(path)
+                loaded.append(data)
+            else:
+                failed += 1
+                print(f'> {path} 을 읽지 못했습니다 : {error}', file=sys.stderr)
+        if not loaded:
+            continue
+        batch, paths_loaded, rejected = _batch(paths_loaded, loaded, cache is None)
+        for path, error in rejected:
+            failed += 1
+            print(f'> {path} 을 읽지 못했습니다 : {error}', file=sys.stderr)
+        if not paths_loaded:
+            continue
+        ranks = batch.ranks(combinations)
+        if formulas:
+            ranks.update(formulas.evaluate(batch))
+        columns: List[List[Optional[float]]] = [
+            [None if math.isnan(rank) else rank for rank in column.tolist()]
+            for column in ranks.values()
+        ]
+        buffer: io.StringIO = io.StringIO()
+        if format == 'csv':
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerows(
+                [path, student.name, student.grade] + ['' if column[index] is None else column[index] for column in columns]
+                for index, (path, student) in enumerate(zip(paths_loaded, batch.students))
+            )
+        else:
+            for index, (path, student) in enumerate(zip(paths_loaded, batch.students)):
+                buffer.write(json.dumps(
+                    dict(zip(header, [path, student.name, student.grade] + [column[index] for column in columns])),
+                    ensure_ascii=False
+                ))
+                buffer.write('\n')
+        output.write(buffer.getvalue())
+        written += len(paths_loaded)
+    output.flush()
+    return written, failed
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    """Run non-interactive batch mode. Returns process exit code."""
+    parser = argparse.ArgumentParser(description='내신 산출 도구 - 일괄 처리 모드')
+    parser.add_argument('inputs', nargs='+', help='json files, directories or glob patterns')
+    parser.add_argument('-m', '--menu', choices=sorted(set(MENU_COMBINATIONS) | {'1'}, key=int),
+                        help='viewer menu number to compute (default: 1, every combination)')
+    parser.add_argument('-c', '--combination', action='append', choices=list(COMBINATIONS),
+                        help='combination to compute. Can be repeated; overrides --menu')
+    parser.add_argument('--formula', action='append', metavar='NAME=FORMULA',
+                        help='user formula to compute (see formula.Formula). Can be repeated')
+    parser.add_argument('--formulas', metavar='FILE', help='json file of user formulas, {name: formula}')
+    parser.add_argument('-f', '--format', choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='transcripts computed and written at once')
+    parser.add_argument('--workers', type=int, help='worker processes used to load files (default: cpu count)')
+    parser.add_argument('--cache', help='parse cache directory')
+    args = parser.parse_args(argv)
+
+    configure_from_env()
+    combinations: Dict[str, Tuple[SubjectCategory, ...]] = (
+        {name: COMBINATIONS[name] for name in args.combination} if args.combination else menu_combinations(args.menu or '1')
+    )
+    user_formulas: Dict[str, object] = load_formulas(args.formulas) if args.formulas else {}
+    for definition in args.formula or ():
+        name, separator, source = definition.partition('=')
+        if not separator:
+            parser.error(f'--formula must be NAME=FORMULA : {definition}')
+        try:
+            user_formulas[name.strip()] = compile_formula(source.strip())
+        except FormulaError as e:
+            parser.error(str(e))
+    if user_formulas and not args.combination and not args.menu:
+        combinations = {}
+    if set(user_formulas) & set(combinations):
+        parser.error(f'formula names must differ from combinations : {", ".join(set(user_formulas) & set(combinations))}')
+    formulas: Optional[FormulaSet] = FormulaSet(user_formulas) if user_formulas else None
+    paths: List[str] = expand_inputs(args.inputs)
+    cache: Optional[ParseCache] = ParseCache(args.cache) if args.cache else None
+    output: TextIO = open(args.output, mode='wt', encoding='utf-8', newline='', buffering=1 << 20) if args.output else sys.stdout
+    try:
+        written, failed = write_results(
+            paths, combinations, output, args.format, args.chunk_size, args.workers, cache, formulas
+        )
+    finally:
+        if args.output:
+            output.close()
+        if cache is not None:
+            cache.save()
+    print(f'> {written} 명 처리, {failed} 개 파일 실패', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
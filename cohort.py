@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator
+from models import SubjectCategory
+
+__all__ = (
+    "COHORT_COMBINATIONS",
+    "Standing",
+    "Cohort"
+)
+
+# Category combinations indexed by Cohort : every report combination, and each single category.
+COHORT_COMBINATIONS: Dict[str, Tuple[SubjectCategory, ...]] = dict(CATEGORY_COMBINATIONS)
+COHORT_COMBINATIONS.update({category.value: (category,) for category in SubjectCategory})
+
+
+class Standing:
+    """Where a rank stands among a cohort on a category combination."""
+    __slots__ = ('rank', 'position', 'total')
+
+    def __init__(self, rank: float, position: int, total: int) -> None:
+        self.rank: float = rank             # weighted rank (내신 등급)
+        self.position: int = position       # 1-based position (석차). Ties share the best position.
+        self.total: int = total             # number of students ranked on the combination
+
+    @property
+    def percentile(self) -> float:
+        """Top percentile (상위 %) : position as a share of ranked students."""
+        return 100 * self.position / self.total if self.total else 0.0
+
+    def __repr__(self) -> str:
+        return f"Standing<rank={self.rank},position={self.position}/{self.total},percentile={self.percentile:.2f}>"
+
+
+class Cohort:
+    """
+    Group of students, keeping a sorted index of weighted ranks per category combination.
+
+    Students are inserted with bisect, so adding a student costs O(log n) comparisons (plus a list insert)
+    instead of re-sorting, and rank / percentile lookups are O(log n). Replacing or removing a student
+    touches only its own entries. Removed students leave their id unused, so other ids never move.
+    """
+
+    def __init__(self, calculators: Iterable[SingleGradeCalculator] = ()) -> None:
+        self._calculators: List[Optional[SingleGradeCalculator]] = []
+        self._count: int = 0
+        # Per combination : sorted ranks, and student ids aligned with them.
+        self._ranks: Dict[str, List[float]] = {combination: [] for combination in COHORT_COMBINATIONS}
+        self._members: Dict[str, List[int]] = {combination: [] for combination in COHORT_COMBINATIONS}
+        for calculator in calculators:
+            self.add(calculator)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def _rank(calculator: SingleGradeCalculator, categories: Iterable[SubjectCategory]) -> Optional[float]:
+        try:
+            return calculator.rank(categories)
+        except ZeroDivisionError:
+            return None
+
+    def _insert(self, student_id: int, calculator: SingleGradeCalculator) -> Dict[str, Optional[float]]:
+        ranks_by_combination: Dict[str, Optional[float]] = {}
+        for combination, categories in COHORT_COMBINATIONS.items():
+            rank: Optional[float] = self._rank(calculator, categories)
+            ranks_by_combination[combination] = rank
+            if rank is None:
+                continue
+            ranks: List[float] = self._ranks[combination]
+            index: int = bisect_right(ranks, rank)
+            ranks.insert(index, rank)
+            self._members[combination].insert(index, student_id)
+        return ranks_by_combination
+
+    def _discard(self, student_id: int, calculator: SingleGradeCalculator) -> Dict[str, Optional[float]]:
+        ranks_by_combination: Dict[str, Optional[float]] = {}
+        for combination, categories in COHORT_COMBINATIONS.items():
+            rank: Optional[float] = self._rank(calculator, categories)
+            ranks_by_combination[combination] = rank
+            if rank is None:
+                continue
+            ranks: List[float] = self._ranks[combination]
+            members: List[int] = self._members[combination]
+            index: int = members.index(student_id, bisect_left(ranks, rank), bisect_right(ranks, rank))
+            del ranks[index]
+            del members[index]
+        return ranks_by_combination
+
+    def _moved(self, student_id: int, old: Dict[str, Optional[float]], new: Dict[str, Optional[float]]) -> Set[int]:
+        """Students whose position changed because a student's ranks went from old to new (None : not ranked)."""
+        moved: Set[int] = set()
+        for combination in COHORT_COMBINATIONS:
+            old_rank: Optional[float] = old.get(combination)
+            new_rank: Optional[float] = new.get(combination)
+            if old_rank == new_rank:
+                continue
+            ranks: List[float] = self._ranks[combination]
+            defined: List[float] = [rank for rank in (old_rank, new_rank) if rank is not None]
+            # Position counts ranks strictly better, so only ranks in (low, high] see a different count.
+            start: int = bisect_right(ranks, min(defined))
+            end: int = bisect_right(ranks, max(defined)) if len(defined) == 2 else len(ranks)
+            moved.update(self._members[combination][start:end])
+        moved.discard(student_id)
+        return moved
+
+    def add(self, calculator: SingleGradeCalculator) -> int:
+        """
+        Add student to cohort.
+
+        Args:
+            calculator (SingleGradeCalculator): calculator of the student to add.
+
+        Returns:
+            int: student id in this cohort.
+        """
+        student_id: int = len(self._calculators)
+        self._calculators.append(calculator)
+        self._count += 1
+        self._insert(student_id, calculator)
+        return student_id
+
+    def replace(self, student_id: int, calculator: SingleGradeCalculator) -> Set[int]:
+        """
+        Replace transcript of a student (ex: an updated file), keeping its id.
+
+        Args:
+            student_id (int): student id in this cohort.
+            calculator (SingleGradeCalculator): new calculator of the student.
+
+        Returns:
+            Set[int]: other students whose position changed on some combination.
+        """
+        old: Dict[str, Optional[float]] = self._discard(student_id, self.calculator(student_id))
+        self._calculators[student_id] = calculator
+        return self._moved(student_id, old, self._insert(student_id, calculator))
+
+    def remove(self, student_id: int) -> Set[int]:
+        """
+        Remove a student from cohort.
+
+        Args:
+            student_id (int): student id in this cohort.
+
+        Returns:
+            Set[int]: other students whose position changed on some combination.
+        """
+        old: Dict[str, Optional[float]] = self._discard(student_id, self.calculator(student_id))
+        self._calculators[student_id] = None
+        self._count -= 1
+        return self._moved(student_id, old, {})
+
+    def behind(self, student_id: int) -> Set[int]:
+        """Students ranked strictly behind a student on some combination : positions shifted by its add or removal."""
+        calculator: SingleGradeCalculator = self.calculator(student_id)
+        return self._moved(student_id, {}, {
+            combination: self._rank(calculator, categories) for combination, categories in COHORT_COMBINATIONS.items()
+        })
+
+    def calculator(self, student_id: int) -> SingleGradeCalculator:
+        calculator: Optional[SingleGradeCalculator] = self._calculators[student_id]
+        if calculator is None:
+            raise KeyError(f'student {student_id} was removed from cohort')
+        return calculator
+
+    def locate(self, rank: float, combination: str) -> Standing:
+        """
+        Where a (possibly hypothetical) rank would stand on a combination.
+
+        Args:
+            rank (float): weighted rank to locate.
+            combination (str): combination name. (key of COHORT_COMBINATIONS)
+        """
+        ranks: List[float] = self._ranks[combination]
+        return Standing(rank, bisect_left(ranks, rank) + 1, len(ranks))
+
+    def standing(self, student_id: int, combination: str) -> Optional[Standing]:
+        """
+        Where a student stands on a combination. None if the student has no relative subjects on it.
+
+        Args:
+            student_id (int): student id in this cohort.
+            combination (str): combination name. (key of COHORT_COMBINATIONS)
+        """
+        rank: Optional[float] = self._rank(self.calculator(student_id), COHORT_COMBINATIONS[combination])
+        return None if rank is None else self.locate(rank, combination)
+
+    def top(self, combination: str, k: int) -> List[Tuple[SingleGradeCalculator, float]]:
+        """
+        Top k students on an indexed combination, best (lowest rank) first.
+
+        Args:
+            combination (str): combination name. (key of COHORT_COMBINATIONS)
+            k (int): number of students.
+        """
+        return [
+            (self._calculators[student_id], rank)
+            for rank, student_id in zip(self._ranks[combination][:k], self._members[combination][:k])
+        ]
+
+    def top_by(self, categories: Iterable[SubjectCategory], k: int) -> List[Tuple[SingleGradeCalculator, float]]:
+        """
+        Top k students on any category combination, including ones not indexed, using heap selection.
+
+        Args:
+            categories (Iterable[SubjectCategory]): categories to combine.
+            k (int): number of students.
+        """
+        categories = tuple(categories)
+        ranked = (
+            (rank, student_id)
+            for student_id, rank in enumerate(
+                None if calculator is None else self._rank(calculator, categories) for calculator in self._calculators
+            )
+            if rank is not None
+        )
+        return [(self._calculators[student_id], rank) for rank, student_id in heapq.nsmallest(k, ranked)]
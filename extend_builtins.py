@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import inspect
-from functools import wraps
-from typing import Iterable, Callable, Any, List, TypeVar, Generic, Optional
+from functools import reduce
+from itertools import chain, islice
+from types import MethodType
+from typing import Iterable, Iterator, Callable, Any, Dict, List, MutableMapping, TypeVar, Generic, Optional
+from weakref import WeakKeyDictionary
 
 __all__ = (
     'Function',
     'Consumer',
     'T',
     'Filter',
+    'Stream',
     'Compute',
     'NoneValueException',
     'NoSuchElementException',
@@ -29,15 +33,15 @@ class Filter(filter):
     """Extend filter object to support several utility methods"""
 
     def find_first(self) -> Optional[Any]:
-        """Find first element in filter object."""
-        try:
-            return tuple(self)[0]
-        except IndexError:
-            return None
+        """Find first element in filter object. Stops at the first match."""
+        return next(self, None)
 
     def length(self) -> int:
-        """Macro function of len(tuple(self)). Maybe find some implementation in CPython implementation of 'filter'"""
-        return len(tuple(self))
+        """Count elements without materializing them."""
+        count: int = 0
+        for _ in self:
+            count += 1
+        return count
 
     def toList(self) -> list:
         """Macro function of list(self)."""
@@ -47,6 +51,95 @@ class Filter(filter):
         return tuple(self)
 
 
+_MISSING = object()
+
+
+class Stream(Generic[T]):
+    """
+    Lazy pipeline over an iterable, like Java's Stream<T>.
+
+    Stages (map / flat_map / filter / take) wrap the pipeline in builtin lazy iterators as they are added, and run
+    nothing. A terminal operation (find_first, count, reduce, group_by, ...) then pulls elements through every stage
+    in a single pass : no stage builds an intermediate collection, and take / find_first / any_match stop pulling
+    from the source as soon as they are satisfied. Terminal operations other than toList / toTuple / group_by use
+    constant memory. As in Java, a stream is consumed once : stages return the same stream.
+    """
+    __slots__ = ('_iterator',)
+
+    def __init__(self, source: Iterable[T]) -> None:
+        self._iterator: Iterator = iter(source)
+
+    def __iter__(self) -> Iterator:
+        return self._iterator
+
+    # Stages
+
+    def map(self, function: Function) -> Stream[Any]:
+        self._iterator = map(function, self._iterator)
+        return self
+
+    def flat_map(self, function: Callable[[T], Iterable[Any]]) -> Stream[Any]:
+        """Replace each element by the elements of function(element)."""
+        self._iterator = chain.from_iterable(map(function, self._iterator))
+        return self
+
+    def filter(self, predicate: Callable[[T], bool]) -> Stream[T]:
+        self._iterator = filter(predicate, self._iterator)
+        return self
+
+    def take(self, count: int) -> Stream[T]:
+        """Keep the first count elements. Upstream stages stop running once they are taken."""
+        self._iterator = islice(self._iterator, count)
+        return self
+
+    # Terminal operations
+
+    def find_first(self) -> Optional[T]:
+        """First element, or None. Only elements up to the first one are pulled."""
+        return next(self._iterator, None)
+
+    def any_match(self, predicate: Callable[[T], bool]) -> bool:
+        return any(map(predicate, self._iterator))
+
+    def all_match(self, predicate: Callable[[T], bool]) -> bool:
+        return all(map(predicate, self._iterator))
+
+    def count(self) -> int:
+        count: int = 0
+        for _ in self._iterator:
+            count += 1
+        return count
+
+    length = count  # Alias, as in Filter
+
+    def reduce(self, function: Callable[[Any, T], Any], initial: Any = _MISSING) -> Any:
+        """Fold elements with function, from initial if given. Raises TypeError on an empty stream without initial."""
+        if initial is _MISSING:
+            return reduce(function, self._iterator)
+        return reduce(function, self._iterator, initial)
+
+    def group_by(self, key: Function) -> Dict[Any, List[T]]:
+        """Collect elements into lists by key(element), keys in first-seen order."""
+        groups: Dict[Any, List[T]] = {}
+        for item in self._iterator:
+            k = key(item)
+            try:
+                groups[k].append(item)
+            except KeyError:
+                groups[k] = [item]
+        return groups
+
+    def for_each(self, consumer: Consumer) -> None:
+        for item in self._iterator:
+            consumer(item)
+
+    def toList(self) -> list:
+        return list(self._iterator)
+
+    def toTuple(self) -> tuple:
+        return tuple(self._iterator)
+
+
 # Optional<T> port
 
 class _PyOptionalException(Exception):
@@ -60,8 +153,11 @@ class _PyOptionalException(Exception):
         return 'PyOptional[T] raised exception!'
 
 
-class NoneValueException(_PyOptionalException):
-    """Exception class used in PyOptional. Indicates PyOptional[T].of(value) got None value."""
+class NoneValueException(_PyOptionalException, AttributeError):
+    """
+    Exception class used in PyOptional. Indicates an attribute was read through a PyOptional holding None.
+    Also an AttributeError, so hasattr / getattr(..., default) treat it as a missing attribute.
+    """
 
     def __str__(self) -> str:
         return 'PyOptional[T].of(value) should accept not-None value!'
@@ -74,17 +170,47 @@ class NoSuchElementException(_PyOptionalException):
         return 'PyOptional[T] contains None value!'
 
 
+def _method_table(cls: type) -> Dict[str, Callable[..., Any]]:
+    """
+    Plain functions defined on a type and its bases, by name, built once per type.
+    Names shadowed by a non-function attribute in a subclass are left out, so normal lookup handles them.
+    """
+    try:
+        return _METHOD_TABLES[cls]
+    except KeyError:
+        table: Dict[str, Callable[..., Any]] = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                if inspect.isfunction(attr):
+                    table[name] = attr
+                else:
+                    table.pop(name, None)
+        _METHOD_TABLES[cls] = table
+        return table
+
+
+_METHOD_TABLES: MutableMapping[type, Dict[str, Callable[..., Any]]] = WeakKeyDictionary()
+
+
 class PyOptional(Generic[T]):
-    """Optional<T> implementation in Python."""
+    """
+    Optional<T> implementation in Python.
+
+    Attributes of the wrapped item are reached through the optional by delegation : nothing is copied on construction,
+    so wrapping costs the same whatever the item. Methods are looked up in a per-type method table and bound on access.
+    Accessing an attribute of an empty optional raises NoneValueException, an AttributeError.
+    """
+    __slots__ = ('_item',)
 
     @classmethod
     def empty(cls) -> PyOptional[T]:
         """None 을 담고 있는, 한 마디로 비어있는 PyOptional[T] 객체를 가져옵니다. 이 비어있는 객체는 내부적으로 미리 생성해둔 싱글톤 객체입니다."""
         try:
-            return getattr(cls, 'pyopt_instance')
-        except AttributeError:
-            instance = cls(None)
-            setattr(cls, 'pyopt_instance', instance)
+            return cls.__dict__['_empty_instance']
+        except KeyError:
+            instance = object.__new__(cls)
+            instance._item = None
+            setattr(cls, '_empty_instance', instance)
             return instance
 
     @classmethod
@@ -99,30 +225,25 @@ class PyOptional(Generic[T]):
     @classmethod
     def ofNullable(cls, value: Optional[T]) -> PyOptional[T]:
         """None 인지 아닌지 확신할 수 없는 객체를 담고 있는 Optional 객체를 생성합니다."""
-        return cls(value)
+        return cls.empty() if value is None else cls(value)
 
     def __init__(self, item: Optional[T]) -> None:
         self._item: Optional[T] = item
-        try:
-            attrsToPatch = {
-                key: attr
-                for key, attr
-                in item.__dict__.items()
-                if not key.startswith('__')
-            }
-            attrsToPatch.update({
-                attr: getattr(item, attr)
-                for attr
-                in item.__slots__
-                if not attr.startswith('__')
-            })
-        except AttributeError:
-            attrsToPatch = {attrName: getattr(item, attrName) for attrName in dir(item) if not attrName.startswith('__')}
-        for attrName, attr in attrsToPatch.items():
-            if inspect.ismethod(attr):
-                setattr(self, attrName, self._WrapOptionalObjectMethod(attr))
-            else:
-                setattr(self, attrName, attr)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called when normal lookup fails, so PyOptional's own attributes are never shadowed.
+        if name.startswith('__'):
+            raise AttributeError(name)
+        item: Optional[T] = self._item
+        if item is None:
+            raise NoneValueException()
+        function: Optional[Callable[..., Any]] = _method_table(type(item)).get(name)
+        if function is not None and name not in getattr(item, '__dict__', ()):
+            return MethodType(function, item)
+        return getattr(item, name)
+
+    def __repr__(self) -> str:
+        return 'PyOptional.empty' if self._item is None else 'PyOptional[{!r}]'.format(self._item)
 
     # Access to value in PyOptional
 
@@ -150,30 +271,33 @@ class PyOptional(Generic[T]):
 
     isNull = isNone  # Alias
 
-    # Extend item's methods in PyOptional[T] : Experimental feature.
-    def _WrapOptionalObjectMethod(self, method: Function) -> Function:
-        @wraps(method)
-        def wrapper(*args, **kwargs):
-            if self.isNone:
-                raise NoneValueException()
-            else:
-                return method()
-
-        return wrapper
-
-    def _WrapOptionalObjectMethodWithName(self, methodName: str) -> Function:
-        try:
-            method = self._item.__dict__[methodName]
-
-            @wraps(method)
-            def wrapper(*args, **kwargs):
-                if self.isNone:
-                    raise NoneValueException()
-                else:
-                    return method()     # Since method already has bound 'self' attribute, we can use it by simply calling it.
-
-            return wrapper
-        except KeyError:
-            raise KeyError("PyOptional[T] cannot patch method in given object with name '{}'".format(methodName))
-
-    # TODO : Java의 Optional<T>를 구현. (Nullable한 값에 대한 functional한 처리)
+    # Functional handling of nullable values, as in Java's Optional<T>.
+
+    def map(self, function: Function) -> PyOptional[Any]:
+        """값이 있으면 function(값) 을 담은 PyOptional 을, 없거나 결과가 None 이면 빈 PyOptional 을 돌려줍니다."""
+        if self._item is None:
+            return self
+        return PyOptional.ofNullable(function(self._item))
+
+    def flat_map(self, function: Callable[[T], PyOptional[Any]]) -> PyOptional[Any]:
+        """map 과 같지만, function 이 직접 PyOptional 을 돌려줍니다."""
+        if self._item is None:
+            return self
+        result = function(self._item)
+        if not isinstance(result, PyOptional):
+            raise TypeError('PyOptional[T].flat_map(function) requires function returning PyOptional.')
+        return result
+
+    def filter(self, predicate: Callable[[T], bool]) -> PyOptional[T]:
+        """값이 있고 predicate 를 만족하면 자기 자신을, 아니면 빈 PyOptional 을 돌려줍니다."""
+        if self._item is None or predicate(self._item):
+            return self
+        return self.empty()
+
+    def if_present(self, consumer: Consumer) -> None:
+        """값이 있으면 consumer(값) 를 호출합니다."""
+        if self._item is not None:
+            consumer(self._item)
+
+    flatMap = flat_map  # Alias
+    ifPresent = if_present  # Alias
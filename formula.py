@@ -0,0 +1,414 @@
+from __future__ import annotations
+
+import json
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from batch import CATEGORY_CODES, CATEGORY_SLOTS, TYPE_CODES, SEMESTERS_PER_GRADE, BatchGradeCalculator, semester_code
+from models import SubjectCategory, SubjectType
+
+__all__ = (
+    "CATEGORY_NAMES",
+    "FormulaError",
+    "Selector",
+    "Term",
+    "Formula",
+    "FormulaSet",
+    "compile_formula",
+    "combination_formula",
+    "load_formulas"
+)
+
+# Names accepted for categories and types : member name, value, and short Korean names.
+CATEGORY_NAMES: Dict[str, SubjectCategory] = {}
+for _category in SubjectCategory:
+    CATEGORY_NAMES[_category.name] = CATEGORY_NAMES[_category.value] = _category
+CATEGORY_NAMES['사회'] = SubjectCategory.SOCIOLOGY
+CATEGORY_NAMES['기타'] = SubjectCategory.ETC
+
+_SYMBOLS: str = '(),|=*+-%'
+# Category names holding symbols (ex: 사회(역사/도덕포함)) are matched whole, before symbols split them.
+_SYMBOL_NAMES: List[str] = sorted((name for name in CATEGORY_NAMES if set(name) & set(_SYMBOLS)), key=len, reverse=True)
+_TOKEN: re.Pattern = re.compile(r'\s*(?:(\d+(?:\.\d+)?)|({})|([{}])|([^\s{}]+))'.format(
+    '|'.join(map(re.escape, _SYMBOL_NAMES)) or '(?!)', re.escape(_SYMBOLS), re.escape(_SYMBOLS)
+))
+_TYPE_NAMES: Dict[str, SubjectType] = {}
+for _type in SubjectType._member_map_.values():
+    _TYPE_NAMES[_type.name] = _TYPE_NAMES[_type.value] = _type
+_TYPE_NAMES.update({'상대': SubjectType.RELATIVE, '절대': SubjectType.ABSOLUTE})
+_GRADE_KEYS: Tuple[str, ...] = ('학년', 'grade')
+_SEMESTER_KEYS: Tuple[str, ...] = ('학기', 'semester')
+_TYPE_KEYS: Tuple[str, ...] = ('유형', 'type')
+_GRADES: int = 3
+
+
+class FormulaError(ValueError):
+    """Raised when a formula can't be parsed."""
+
+    def __init__(self, source: str, position: int, message: str) -> None:
+        super().__init__(f'{message} (position {position}) : {source}')
+        self.source: str = source
+        self.position: int = position
+
+
+class Selector:
+    """
+    Subjects selected by a term : category, type and semester codes. Immutable and hashable, so terms can be shared.
+    Selecting every category selects unknown categories (code -1) too, as SingleGradeCalculator.rank does.
+    """
+    __slots__ = ('categories', 'types', 'semesters')
+
+    def __init__(self, categories: Iterable[int], types: Iterable[int], semesters: Iterable[int]) -> None:
+        categories = set(categories)
+        if categories.issuperset(CATEGORY_CODES.values()):
+            categories.add(-1)
+        self.categories: Tuple[int, ...] = tuple(sorted(categories))
+        self.types: Tuple[int, ...] = tuple(sorted(set(types)))
+        self.semesters: Tuple[int, ...] = tuple(sorted(set(semesters)))
+
+    def _key(self) -> Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]]:
+        return self.categories, self.types, self.semesters
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Selector) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def mask(self, semester_count: int) -> np.ndarray:
+        """Selected cells of a (semesters, category slots, types) cube, flattened."""
+        cells: np.ndarray = np.zeros((semester_count, CATEGORY_SLOTS, len(TYPE_CODES)), dtype=bool)
+        semesters: List[int] = [code for code in self.semesters if code < semester_count]
+        cells[np.ix_(semesters, self.categories, self.types)] = True
+        return cells.ravel()
+
+    def __repr__(self) -> str:
+        return f"Selector<categories={self.categories},types={self.types},semesters={self.semesters}>"
+
+
+class Term:
+    """Weighted aggregate of a formula."""
+    __slots__ = ('weight', 'selector', 'best')
+
+    def __init__(self, weight: float, selector: Selector, best: Optional[int] = None) -> None:
+        self.weight: float = weight
+        self.selector: Selector = selector
+        self.best: Optional[int] = best     # count of best subjects, or None for every selected subject
+
+    @property
+    def key(self) -> Tuple[Selector, Optional[int]]:
+        """Identity of the aggregate, regardless of weight."""
+        return self.selector, self.best
+
+    def __repr__(self) -> str:
+        return f"Term<weight={self.weight},selector={self.selector},best={self.best}>"
+
+
+class _Parser:
+    """Recursive descent parser of the formula language."""
+
+    def __init__(self, source: str) -> None:
+        self._source: str = source
+        self._tokens: List[Tuple[str, str, int]] = []  # (kind, text, position)
+        position: int = 0
+        source = source.rstrip()
+        while position < len(source):
+            match: Optional[re.Match] = _TOKEN.match(source, position)
+            if match is None:
+                raise FormulaError(self._source, position, 'unexpected character')
+            kind: str = 'number' if match.group(1) else 'symbol' if match.group(3) else 'name'
+            self._tokens.append((kind, match.group(match.lastindex), match.start(match.lastindex)))
+            position = match.end()
+        self._index: int = 0
+
+    def _peek(self) -> Tuple[str, str, int]:
+        if self._index < len(self._tokens):
+            return self._tokens[self._index]
+        return 'end', '', len(self._source)
+
+    def _next(self) -> Tuple[str, str, int]:
+        token: Tuple[str, str, int] = self._peek()
+        self._index += 1
+        return token
+
+    def _expect(self, text: str) -> None:
+        kind, value, position = self._next()
+        if value != text or kind == 'end':
+            raise FormulaError(self._source, position, f"expected '{text}'")
+
+    def _accept(self, text: str) -> bool:
+        if self._peek()[1] == text and self._peek()[0] != 'end':
+            self._index += 1
+            return True
+        return False
+
+    def _number(self) -> float:
+        kind, value, position = self._next()
+        if kind != 'number':
+            raise FormulaError(self._source, position, 'expected a number')
+        return float(value)
+
+    def _names(self) -> List[Tuple[str, int]]:
+        names: List[Tuple[str, int]] = []
+        while True:
+            kind, value, position = self._next()
+            if kind not in ('name', 'number'):
+                raise FormulaError(self._source, position, 'expected a name')
+            names.append((value, position))
+            if not self._accept('|'):
+                return names
+
+    def parse(self) -> List[Term]:
+        terms: List[Term] = []
+        sign: float = 1.0
+        while True:
+            terms.append(self._term(sign))
+            if self._accept('+'):
+                sign = 1.0
+            elif self._accept('-'):
+                sign = -1.0
+            else:
+                break
+        kind, value, position = self._peek()
+        if kind != 'end':
+            raise FormulaError(self._source, position, f"unexpected '{value}'")
+        return terms
+
+    def _term(self, sign: float) -> Term:
+        weight: float = 1.0
+        if self._peek()[0] == 'number':
+            weight = self._number()
+            if self._accept('%'):
+                weight /= 100
+            self._expect('*')
+        kind, value, position = self._next()
+        if value not in ('avg', 'best'):
+            raise FormulaError(self._source, position, "expected 'avg' or 'best'")
+        self._expect('(')
+        best: Optional[int] = None
+        if value == 'best':
+            count_position: int = self._peek()[2]
+            count: float = self._number()
+            if count < 1 or count != int(count):
+                raise FormulaError(self._source, count_position, 'best count must be a positive integer')
+            best = int(count)
+            if self._peek()[1] != ')':
+                self._expect(',')
+        selector: Selector = self._filters()
+        self._expect(')')
+        return Term(sign * weight, selector, best)
+
+    def _filters(self) -> Selector:
+        categories: Optional[List[int]] = None
+        types: Optional[List[int]] = None
+        grades: Optional[List[int]] = None
+        semesters: Optional[List[int]] = None
+        if self._peek()[1] == ')':
+            return self._selector(categories, types, grades, semesters)
+        while True:
+            kind, value, position = self._peek()
+            if value in _GRADE_KEYS + _SEMESTER_KEYS + _TYPE_KEYS:
+                self._next()
+                self._expect('=')
+                names: List[Tuple[str, int]] = self._names()
+                if value in _TYPE_KEYS:
+                    types = (types or []) + [self._lookup(_TYPE_NAMES, name, at) for name, at in names]
+                else:
+                    limit: int = _GRADES if value in _GRADE_KEYS else SEMESTERS_PER_GRADE
+                    numbers: List[int] = [self._integer(name, at, limit) for name, at in names]
+                    if value in _GRADE_KEYS:
+                        grades = (grades or []) + numbers
+                    else:
+                        semesters = (semesters or []) + numbers
+            else:
+                categories = (categories or []) + [
+                    self._lookup(CATEGORY_NAMES, name, at) for name, at in self._names()
+                ]
+            if not self._accept(','):
+                return self._selector(categories, types, grades, semesters)
+
+    def _lookup(self, names: Mapping[str, object], name: str, position: int) -> int:
+        try:
+            member = names[name]
+        except KeyError:
+            raise FormulaError(self._source, position, f"unknown name '{name}'")
+        return (CATEGORY_CODES if isinstance(member, SubjectCategory) else TYPE_CODES)[member.value]
+
+    def _integer(self, value: str, position: int, limit: int) -> int:
+        if not value.isdigit() or not 1 <= int(value) <= limit:
+            raise FormulaError(self._source, position, f"expected an integer in 1 ~ {limit}, not '{value}'")
+        return int(value)
+
+    @staticmethod
+    def _selector(
+            categories: Optional[List[int]],
+            types: Optional[List[int]],
+            grades: Optional[List[int]],
+            semesters: Optional[List[int]]
+    ) -> Selector:
+        return Selector(
+            range(len(CATEGORY_CODES)) if categories is None else categories,
+            [TYPE_CODES[SubjectType.RELATIVE.value]] if types is None else types,
+            [
+                semester_code(grade, semester)
+                for grade in (grades or range(1, _GRADES + 1))
+                for semester in (semesters or range(1, SEMESTERS_PER_GRADE + 1))
+            ]
+        )
+
+
+class Formula:
+    """
+    Compiled formula : weighted terms. Use compile_formula to share compiled formulas.
+
+    Formula language:
+        formula   := term (('+' | '-') term)*
+        term      := [weight '*'] aggregate
+        weight    := number ['%']
+        aggregate := 'avg' '(' [filters] ')'            # 석차등급 × 단위수 / 단위수 of selected subjects
+                   | 'best' '(' count [',' filters] ')'  # same, over the best (lowest rank) count subjects only
+        filters   := filter (',' filter)*
+        filter    := names                              # categories, ex: 국어|수학|영어, 사회(역사/도덕포함)
+                   | ('학년' | 'grade') '=' numbers       # 1 ~ 3, ex: 학년=2|3
+                   | ('학기' | 'semester') '=' numbers    # 1 ~ 2, ex: 학기=1
+                   | ('유형' | 'type') '=' names          # ex: 유형=상대평가|절대평가 (default: 상대평가)
+
+    Examples:
+        20% * avg(학년=1) + 40% * avg(학년=2) + 40% * avg(학년=3)
+        0.3 * avg(국어) + 0.4 * avg(수학) + 0.3 * avg(영어)
+        best(10, 국어|수학|영어|과학)
+
+    A formula is undefined (nan) for a student if any of its terms selects no ranked subject.
+    """
+    __slots__ = ('_source', '_terms')
+
+    def __init__(self, source: str) -> None:
+        """
+        Args:
+            source (str): formula text. (see module docstring)
+        """
+        self._source: str = source
+        self._terms: Tuple[Term, ...] = tuple(_Parser(source).parse())
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    @property
+    def terms(self) -> Tuple[Term, ...]:
+        return self._terms
+
+    def evaluate(self, batch: BatchGradeCalculator) -> np.ndarray:
+        """Value of the formula for every student of batch. nan where undefined."""
+        return FormulaSet({self._source: self}).evaluate(batch)[self._source]
+
+    def __repr__(self) -> str:
+        return f"Formula<{self._source}>"
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(source: str) -> Formula:
+    """
+    Compile formula text, caching compiled formulas by text.
+
+    Args:
+        source (str): formula text.
+    """
+    return Formula(source)
+
+
+def combination_formula(categories: Iterable[SubjectCategory]) -> str:
+    """Formula text equal to SingleGradeCalculator.rank of a category combination."""
+    return f'avg({"|".join(category.name for category in categories)})'
+
+
+class FormulaSet:
+    """
+    Many formulas evaluated together.
+
+    Distinct aggregates of every formula are shared, and evaluated for a whole cohort at once :
+    cube sums @ (cells × aggregates) selection matrix, then aggregates @ (aggregates × formulas) weight matrix.
+    """
+
+    def __init__(self, formulas: Mapping[str, object]) -> None:
+        """
+        Args:
+            formulas (Mapping[str, object]): formulas by name, either text or compiled Formula.
+        """
+        self._formulas: Dict[str, Formula] = {
+            name: formula if isinstance(formula, Formula) else compile_formula(formula)
+            for name, formula in formulas.items()
+        }
+        keys: Dict[Tuple[Selector, Optional[int]], int] = {}
+        for formula in self._formulas.values():
+            for term in formula.terms:
+                keys.setdefault(term.key, len(keys))
+        self._keys: Tuple[Tuple[Selector, Optional[int]], ...] = tuple(keys)
+        self._weights: np.ndarray = np.zeros((len(keys), len(self._formulas)))
+        for column, formula in enumerate(self._formulas.values()):
+            for term in formula.terms:
+                self._weights[keys[term.key], column] += term.weight
+        self._used: np.ndarray = (self._weights != 0).astype(np.float64)
+        self._averages: List[int] = [row for row, (_, best) in enumerate(self._keys) if best is None]
+        self._bests: List[int] = [row for row, (_, best) in enumerate(self._keys) if best is not None]
+        self._selections: Dict[int, np.ndarray] = {}    # semester count -> (cells × averages) selection matrix
+
+    @property
+    def formulas(self) -> Dict[str, Formula]:
+        return self._formulas
+
+    def __len__(self) -> int:
+        return len(self._formulas)
+
+    def _selection(self, semester_count: int) -> np.ndarray:
+        try:
+            return self._selections[semester_count]
+        except KeyError:
+            selection: np.ndarray = np.column_stack(
+                [self._keys[row][0].mask(semester_count) for row in self._averages]
+            ).astype(np.float64) if self._averages else np.zeros((semester_count * CATEGORY_SLOTS * len(TYPE_CODES), 0))
+            self._selections[semester_count] = selection
+            return selection
+
+    def aggregates(self, batch: BatchGradeCalculator) -> Tuple[np.ndarray, np.ndarray]:
+        """Sums of rank×units and units of every distinct aggregate, shaped (students, aggregates)."""
+        totals: np.ndarray = np.zeros((len(batch), len(self._keys)))
+        units: np.ndarray = np.zeros((len(batch), len(self._keys)))
+        if self._averages:
+            cell_totals, cell_units = batch.cells()
+            selection: np.ndarray = self._selection(batch.semester_count)
+            totals[:, self._averages] = cell_totals.reshape(len(batch), -1) @ selection
+            units[:, self._averages] = cell_units.reshape(len(batch), -1) @ selection
+        for row in self._bests:
+            selector, best = self._keys[row]
+            totals[:, row], units[:, row] = batch.best_sums(best, selector.semesters, selector.categories, selector.types)
+        return totals, units
+
+    def evaluate(self, batch: BatchGradeCalculator) -> Dict[str, np.ndarray]:
+        """
+        Value of every formula for every student of batch. nan where undefined.
+
+        Args:
+            batch (BatchGradeCalculator): cohort to evaluate.
+        """
+        totals, units = self.aggregates(batch)
+        defined: np.ndarray = units > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values: np.ndarray = np.where(defined, totals / units, 0.0)
+        results: np.ndarray = values @ self._weights
+        results[((~defined).astype(np.float64) @ self._used) > 0] = np.nan
+        return {name: results[:, column] for column, name in enumerate(self._formulas)}
+
+
+def load_formulas(path: str) -> Dict[str, Formula]:
+    """
+    Load formulas from a json file of {name: formula text}, compiling each.
+
+    Args:
+        path (str): json file to load.
+    """
+    with open(path, mode='rt', encoding='utf-8') as f:
+        return {name: compile_formula(source) for name, source in json.load(f).items()}
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from constants import JSON, StudentKeys, SemesterKeys, SubjectKeys
+from models import SubjectType, SubjectCategory, SubjectAchievementLevels
+
+__all__ = (
+    "SUBJECT_NAMES",
+    "generate_transcript",
+    "generate_transcripts",
+    "write_transcripts",
+    "write_ndjson"
+)
+
+# Subject names used by generated transcripts, per category value.
+SUBJECT_NAMES: Dict[str, Tuple[str, ...]] = {
+    SubjectCategory.KOREAN.value: ('국어', '문학', '독서', '언어와 매체', '화법과 작문'),
+    SubjectCategory.MATH.value: ('수학', '수학Ⅰ', '수학Ⅱ', '확률과 통계', '미적분', '기하'),
+    SubjectCategory.ENGLISH.value: ('영어', '영어Ⅰ', '영어Ⅱ', '영어 독해와 작문', '영어 회화'),
+    SubjectCategory.SCIENCE.value: ('통합과학', '과학탐구실험', '물리학Ⅰ', '화학Ⅰ', '생명과학Ⅰ', '지구과학Ⅰ', '물리학Ⅱ', '화학Ⅱ'),
+    SubjectCategory.SOCIOLOGY.value: ('통합사회', '한국사', '생활과 윤리', '윤리와 사상', '사회·문화', '한국지리', '세계사'),
+    SubjectCategory.ETC.value: ('기술・가정', '정보', '일본어Ⅰ', '중국어Ⅰ', '한문Ⅰ', '진로와 직업', '음악', '미술', '체육')
+}
+_ABSOLUTE_LEVELS: Tuple[SubjectAchievementLevels, ...] = (
+    SubjectAchievementLevels.A,
+    SubjectAchievementLevels.B,
+    SubjectAchievementLevels.C,
+    SubjectAchievementLevels.D,
+    SubjectAchievementLevels.E
+)
+
+
+def _subject(rng: random.Random, category: SubjectCategory, subject_type: SubjectType, detailed: bool) -> JSON:
+    data: JSON = {
+        SubjectKeys.TYPE: subject_type.value,
+        SubjectKeys.CATEGORY: category.value,
+        SubjectKeys.NAME: rng.choice(SUBJECT_NAMES[category.value]),
+        SubjectKeys.UNITS: rng.choice((1, 2, 3, 4, 4, 4, 5)),
+        SubjectKeys.RANK: None
+    }
+    if subject_type == SubjectType.PASS_NOT_PASS:
+        passed: bool = rng.random() < 0.95
+        data[SubjectKeys.ACHIEVEMENT_LEVEL] = (SubjectAchievementLevels.PASS if passed else SubjectAchievementLevels.NotPass).value
+        return data
+    # Score around the subject average; rank (석차등급) and achievement follow the score.
+    average: float = round(rng.uniform(50, 80), 1)
+    standard_deviation: float = round(rng.uniform(8, 25), 1)
+    score: float = round(min(100.0, max(0.0, rng.gauss(average, standard_deviation))), 1)
+    z: float = (score - average) / standard_deviation
+    if subject_type == SubjectType.RELATIVE:
+        data[SubjectKeys.RANK] = min(9, max(1, int(round(5 - 2 * z + rng.uniform(-0.5, 0.5)))))
+    data[SubjectKeys.ACHIEVEMENT_LEVEL] = _ABSOLUTE_LEVELS[min(4, max(0, int(2 - z)))].value
+    if detailed:
+        data[SubjectKeys.SCORE] = score
+        data[SubjectKeys.AVERAGE] = average
+        data[SubjectKeys.STANDARD_DEVIATION] = standard_deviation
+        data[SubjectKeys.PARTICIPANTS] = rng.randint(40, 400)
+    return data
+
+
+def generate_transcript(rng: random.Random, index: int, grade: Optional[int] = None) -> JSON:
+    """
+    Generate a realistic transcript in the constants.py schema.
+
+    Every semester holds at least one relative (상대평가) subject of each category, plus a random mix of
+    relative, absolute (절대평가) and PnP subjects, detailed (with 원점수/과목평균/표준편차/수강자수) or not.
+
+    Args:
+        rng (random.Random): random generator to draw from.
+        index (int): index of the student, used for the student's name.
+        grade (Optional[int]): grade (학년) of the student. Random (1 ~ 3) if None.
+    """
+    grade = grade or rng.randint(1, 3)
+    semesters: List[JSON] = []
+    for semester_grade in range(1, grade + 1):
+        for semester in (1, 2):
+            subjects: List[JSON] = []
+            for category in SubjectCategory:
+                subjects.append(_subject(rng, category, SubjectType.RELATIVE, rng.random() < 0.7))
+                for _ in range(rng.randint(0, 2)):
+                    subject_type: SubjectType = rng.choices(
+                        (SubjectType.RELATIVE, SubjectType.ABSOLUTE, SubjectType.PASS_NOT_PASS),
+                        weights=(0.7, 0.2, 0.1)
+                    )[0]
+                    subjects.append(_subject(rng, category, subject_type, rng.random() < 0.5))
+            semesters.append({
+                SemesterKeys.GRADE: semester_grade,
+                SemesterKeys.SEMESTER: semester,
+                SemesterKeys.SUBJECT_SCORES: subjects
+            })
+    return {
+        StudentKeys.key: {StudentKeys.NAME: f'학생{index:06d}', StudentKeys.GRADE: grade},
+        SemesterKeys.key: semesters
+    }
+
+
+def generate_transcripts(count: int, seed: int = 0) -> Iterator[JSON]:
+    """
+    Generate transcripts reproducibly. Same (count, seed) always yields the same transcripts.
+
+    Args:
+        count (int): number of transcripts.
+        seed (int): random seed.
+    """
+    rng: random.Random = random.Random(seed)
+    for index in range(count):
+        yield generate_transcript(rng, index)
+
+
+def write_transcripts(directory: str, count: int, seed: int = 0) -> List[str]:
+    """
+    Write generated transcripts as one json file per student, like the data directory.
+
+    Returns:
+        List[str]: paths of written files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths: List[str] = []
+    for index, transcript in enumerate(generate_transcripts(count, seed)):
+        path: str = os.path.join(directory, f'{index:06d}.json')
+        with open(path, mode='wt', encoding='utf-8') as f:
+            json.dump(transcript, f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def write_ndjson(path: str, count: int, seed: int = 0) -> None:
+    """Write generated transcripts as newline-delimited json, one student per line."""
+    with open(path, mode='wt', encoding='utf-8') as f:
+        for transcript in generate_transcripts(count, seed):
+            f.write(json.dumps(transcript, ensure_ascii=False))
+            f.write('\n')
+
+
+if __name__ == "__main__":
+    # python generator.py <directory | file.ndjson> <count> [seed]
+    target: str = sys.argv[1]
+    count: int = int(sys.argv[2])
+    seed: int = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    if target.endswith('.ndjson'):
+        write_ndjson(target, count, seed)
+    else:
+        write_transcripts(target, count, seed)
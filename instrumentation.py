@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+__all__ = (
+    "Histogram",
+    "Metrics",
+    "metrics",
+    "timed",
+    "configure_from_env"
+)
+
+# Upper bounds of histogram buckets, in seconds for timers.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0, 10.0
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, in Prometheus style."""
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)   # last bucket is +Inf
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def toJson(self) -> Dict[str, object]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + (float('inf'),), self.counts)}
+        }
+
+
+class _Timer:
+    """Times a phase, recording its exclusive time : time spent in nested phases is left to them."""
+    __slots__ = ('_histogram', '_stack', '_start')
+
+    def __init__(self, histogram: Histogram, stack: List[float]) -> None:
+        self._histogram: Histogram = histogram
+        self._stack: List[float] = stack
+
+    def __enter__(self) -> _Timer:
+        self._stack.append(0.0)
+        self._start: float = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        elapsed: float = time.perf_counter() - self._start
+        self._histogram.observe(elapsed - self._stack.pop())
+        if self._stack:
+            self._stack[-1] += elapsed
+
+
+class _NullTimer:
+    """Shared no-op timer returned while metrics are disabled."""
+    __slots__ = ()
+
+    def __enter__(self) -> _NullTimer:
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_TIMER: _NullTimer = _NullTimer()
+
+
+class Metrics:
+    """
+    Registry of phase timers, counters and histograms. Disabled by default.
+
+    While disabled, timer() returns a shared no-op context manager and count()/observe() return immediately,
+    so instrumented code only pays an attribute check.
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self._timers: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._stack: List[float] = []     # time spent in nested phases, per running phase
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self._timers.clear()
+        self._counters.clear()
+        self._histograms.clear()
+
+    def timer(self, phase: str):
+        """
+        Context manager timing a phase. Phases may nest; each records only its own (exclusive) time.
+
+        Args:
+            phase (str): phase name. (ex: read_json, parse, aggregate, render)
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        try:
+            return _Timer(self._timers[phase], self._stack)
+        except KeyError:
+            histogram: Histogram = Histogram()
+            self._timers[phase] = histogram
+            return _Timer(histogram, self._stack)
+
+    def count(self, name: str, value: float = 1) -> None:
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Optional[Tuple[float, ...]] = None) -> None:
+        if not self.enabled:
+            return
+        try:
+            histogram: Histogram = self._histograms[name]
+        except KeyError:
+            histogram = Histogram(buckets or DEFAULT_BUCKETS)
+            self._histograms[name] = histogram
+        histogram.observe(value)
+
+    def toJson(self) -> Dict[str, object]:
+        """Per-phase breakdown : exclusive seconds, calls, share of instrumented time, and raw histograms."""
+        total: float = sum(histogram.sum for histogram in self._timers.values())
+        return {
+            'phases': {
+                phase: {
+                    'seconds': histogram.sum,
+                    'calls': histogram.count,
+                    'share': histogram.sum / total if total else 0.0,
+                    'histogram': histogram.toJson()
+                }
+                for phase, histogram in self._timers.items()
+            },
+            'counters': dict(self._counters),
+            'histograms': {name: histogram.toJson() for name, histogram in self._histograms.items()}
+        }
+
+    def toPrometheus(self, prefix: str = 'grade_calculator') -> str:
+        """Metrics in Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def histogram_lines(name: str, histogram: Histogram, labels: str) -> None:
+            cumulative: int = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le: str = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{labels}le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels.rstrip(",")}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{labels.rstrip(",")}}} {histogram.count}')
+
+        if self._timers:
+            lines.append(f'# TYPE {prefix}_phase_seconds histogram')
+            for phase, histogram in self._timers.items():
+                histogram_lines(f'{prefix}_phase_seconds', histogram, f'phase="{phase}",')
+        for name, value in self._counters.items():
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        for name, histogram in self._histograms.items():
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            histogram_lines(f'{prefix}_{name}', histogram, '')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str, format: str = 'json') -> None:
+        """
+        Write metrics to file.
+
+        Args:
+            path (str): file to write.
+            format (str): 'json' or 'prometheus'.
+        """
+        with open(path, mode='wt', encoding='utf-8') as f:
+            if format == 'prometheus':
+                f.write(self.toPrometheus())
+            else:
+                json.dump(self.toJson(), f, ensure_ascii=False, indent=2)
+
+
+metrics: Metrics = Metrics()
+
+
+def timed(phase: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing every call of a function as a phase of the global metrics.
+
+    Args:
+        phase (str): phase name.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with metrics.timer(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure_from_env() -> Optional[Tuple[str, str]]:
+    """
+    Enable metrics if GRADE_METRICS is set to 'json' or 'prometheus'.
+    Metrics are dumped to GRADE_METRICS_PATH (default: metrics.json / metrics.prom) when the process exits.
+
+    Returns:
+        Optional[Tuple[str, str]]: (format, path) if metrics were enabled.
+    """
+    format: str = os.environ.get('GRADE_METRICS', '').lower()
+    if format not in ('json', 'prometheus'):
+        return None
+    path: str = os.environ.get('GRADE_METRICS_PATH', 'metrics.json' if format == 'json' else 'metrics.prom')
+    metrics.enable()
+    atexit.register(metrics.dump, path, format)
+    return format, path
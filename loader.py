@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from calc import SingleGradeCalculator
+from constants import JSON
+from instrumentation import timed
+from parse_cache import Identity, ParseCache
+
+__all__ = (
+    "read_json",
+    "list_data_files",
+    "LoadResult",
+    "load_file",
+    "load_files",
+    "read_file",
+    "read_files"
+)
+
+
+@timed('read_json')
+def read_json(path: str) -> JSON:
+    if not os.path.isfile(path):
+        raise ValueError(f'{path} is not a file!')
+    elif os.path.splitext(path)[1] != '.json':
+        raise ValueError(f'{path} is not a json file!')
+    with open(path, mode='rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_data_files(directory: str) -> List[str]:
+    """
+    List json files in directory, sorted by file name so that load order is deterministic.
+
+    Args:
+        directory (str): directory to list.
+    """
+    return [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if os.path.splitext(filename)[1] == '.json'
+    ]
+
+
+class LoadResult:
+    """Result of loading a single transcript file. Holds either calculator or error."""
+
+    def __init__(
+            self,
+            path: str,
+            calculator: Optional[SingleGradeCalculator],
+            error: Optional[str] = None,
+            identity: Optional[Identity] = None
+    ) -> None:
+        self._path: str = path
+        self._calculator: Optional[SingleGradeCalculator] = calculator
+        self._error: Optional[str] = error
+        self._identity: Optional[Identity] = identity
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def calculator(self) -> Optional[SingleGradeCalculator]:
+        return self._calculator
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._error
+
+    @property
+    def identity(self) -> Optional[Identity]:
+        """Identity of the bytes the calculator was parsed from, if loaded for a ParseCache."""
+        return self._identity
+
+    @property
+    def ok(self) -> bool:
+        return self._error is None
+
+    def __repr__(self) -> str:
+        return f"LoadResult<path={self.path},ok={self.ok}>"
+
+
+def load_file(path: str) -> LoadResult:
+    """
+    Read and parse a single transcript file. Errors are captured in the result instead of raised.
+
+    Args:
+        path (str): path of json file to load.
+    """
+    try:
+        return LoadResult(path, SingleGradeCalculator(read_json(path)))
+    except Exception as e:
+        return LoadResult(path, None, f'{type(e).__name__}: {e}')
+
+
+def _load_identified_file(path: str) -> LoadResult:
+    """load_file for a ParseCache : file is read once, and parsed from the bytes its identity describes."""
+    try:
+        if os.path.splitext(path)[1] != '.json':
+            raise ValueError(f'{path} is not a json file!')
+        data, identity = ParseCache.read(path)
+        return LoadResult(path, SingleGradeCalculator(json.loads(data)), identity=identity)
+    except Exception as e:
+        return LoadResult(path, None, f'{type(e).__name__}: {e}')
+
+
+def read_file(path: str) -> Tuple[str, Optional[JSON], Optional[str]]:
+    """
+    Read a single json file without parsing it into models. Errors are captured instead of raised.
+
+    Args:
+        path (str): path of json file to read.
+
+    Returns:
+        Tuple[str, Optional[JSON], Optional[str]]: path, json data, and error message if reading failed.
+    """
+    try:
+        return path, read_json(path), None
+    except Exception as e:
+        return path, None, f'{type(e).__name__}: {e}'
+
+
+def _map_files(func, paths: Tuple[str, ...], workers: int, chunksize: int) -> Iterator:
+    if workers == 1 or len(paths) <= 1:
+        yield from map(func, paths)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        yield from executor.map(func, paths, chunksize=max(1, chunksize))
+
+
+def _load_files(paths: Tuple[str, ...], workers: int, chunksize: int, identified: bool = False) -> Iterator[LoadResult]:
+    return _map_files(_load_identified_file if identified else load_file, paths, workers, chunksize)
+
+
+def read_files(
+        paths: Iterable[str],
+        workers: Optional[int] = None,
+        chunksize: int = 64
+) -> Iterator[Tuple[str, Optional[JSON], Optional[str]]]:
+    """
+    Read json files with a process pool, without parsing them into models. Results keep the order of paths.
+
+    Args:
+        paths (Iterable[str]): paths of json files to read.
+        workers (Optional[int]): number of worker processes. Defaults to os.cpu_count(). 1 reads in this process.
+        chunksize (int): number of files sent to a worker at once.
+    """
+    return _map_files(read_file, tuple(paths), workers or os.cpu_count() or 1, chunksize)
+
+
+def load_files(
+        paths: Iterable[str],
+        workers: Optional[int] = None,
+        chunksize: int = 64,
+        cache: Optional[ParseCache] = None
+) -> Iterator[LoadResult]:
+    """
+    Load transcript files with a process pool. Results are yielded in the same order as paths.
+
+    Args:
+        paths (Iterable[str]): paths of json files to load.
+        workers (Optional[int]): number of worker processes. Defaults to os.cpu_count(). 1 loads in this process.
+        chunksize (int): number of files sent to a worker at once.
+        cache (Optional[ParseCache]): parse cache to look up before loading, and to store newly loaded files.
+            Only this process touches the cache; workers parse cache misses only.
+    """
+    paths: Tuple[str, ...] = tuple(paths)
+    workers = workers or os.cpu_count() or 1
+    if cache is None:
+        yield from _load_files(paths, workers, chunksize)
+        return
+    hits: Dict[int, LoadResult] = {}
+    for index, path in enumerate(paths):
+        parsed = cache.get(path)
+        if parsed is not None:
+            hits[index] = LoadResult(path, SingleGradeCalculator.fromModels(*parsed))
+    misses: Iterator[LoadResult] = _load_files(
+        tuple(path for index, path in enumerate(paths) if index not in hits),
+        workers,
+        chunksize,
+        identified=True
+    )
+    for index in range(len(paths)):
+        if index in hits:
+            yield hits[index]
+            continue
+        result: LoadResult = next(misses)
+        if result.ok:
+            cache.put(result.path, (result.calculator.student, result.calculator.semesters), result.identity)
+        yield result
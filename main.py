@@ -1,18 +1,37 @@
-from typing import Union, Any
+from typing import Union, Any, Optional, Dict, Iterable
 import os
+import sys
 import json
 
 from models import *
 from calc import *
+from loader import *
+from parse_cache import ParseCache
+from batch import BatchGradeCalculator
+from formula import FormulaSet, load_formulas
+from instrumentation import configure_from_env, timed
 
-
-def read_json(path: str) -> JSON:
-    if not os.path.isfile(path):
-        raise ValueError(f'{path} is not a file!')
-    elif os.path.splitext(path)[1] != '.json':
-        raise ValueError(f'{path} is not a json file!')
-    with open(path, mode='rt', encoding='utf-8') as f:
-        return json.load(f)
+# Category combinations of viewer menu, by menu number. "1" (전체) is every combination below.
+MENU_COMBINATIONS: Dict[str, Dict[str, Tuple[SubjectCategory, ...]]] = {
+    "2": {'전과목': tuple(SubjectCategory)},
+    "3": {category.value: (category,) for category in SubjectCategory},
+    "4": {'국수영사과': (
+        SubjectCategory.KOREAN,
+        SubjectCategory.MATH,
+        SubjectCategory.ENGLISH,
+        SubjectCategory.SOCIOLOGY,
+        SubjectCategory.SCIENCE
+    )},
+    "5": {'국수영과': (SubjectCategory.KOREAN, SubjectCategory.MATH, SubjectCategory.ENGLISH, SubjectCategory.SCIENCE)},
+    "6": {'국수영사': (SubjectCategory.KOREAN, SubjectCategory.MATH, SubjectCategory.ENGLISH, SubjectCategory.SOCIOLOGY)},
+    "7": {'국수영': (SubjectCategory.KOREAN, SubjectCategory.MATH, SubjectCategory.ENGLISH)},
+    "8": {'국영사': (SubjectCategory.KOREAN, SubjectCategory.ENGLISH, SubjectCategory.SOCIOLOGY)},
+    "9": {'수영과': (SubjectCategory.MATH, SubjectCategory.ENGLISH, SubjectCategory.SCIENCE)},
+    "10": {'수과': (SubjectCategory.MATH, SubjectCategory.SCIENCE)}
+}
+# Menu number of user formulas, loaded from FORMULAS_FILE in working directory. (see formula.Formula)
+FORMULA_MENU: str = "11"
+FORMULAS_FILE: str = "formulas.json"
 
 
 # Phase
@@ -30,7 +49,11 @@ def intro():
     )
 
 
-def read_data() -> Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]:
+def read_data(
+        workers: Optional[int] = None,
+        chunksize: int = 64,
+        cache: Optional[ParseCache] = None
+) -> Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]:
     print("="*10)
     print(
         """
@@ -42,7 +65,13 @@ def read_data() -> Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]:
     data_path: str = os.path.join(os.getcwd(), "data")
     answer: str = input("> ")
     if answer == "1":
-        data = map(lambda file: read_json(os.path.join(data_path, file)), os.listdir(data_path))
+        loaded: List[SingleGradeCalculator] = []
+        for result in load_files(list_data_files(data_path), workers=workers, chunksize=chunksize, cache=cache):
+            if result.ok:
+                loaded.append(result.calculator)
+            else:
+                print(f'> {result.path} 을 읽지 못했습니다 : {result.error}')
+        calcs = tuple(loaded)
 
     elif answer == "2":
         print(
@@ -53,21 +82,65 @@ def read_data() -> Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]:
         )
         filenames: List[str, ...] = input('> ').split(',')
         data = map(lambda file: read_json(os.path.join(data_path, file)), filenames)
+        calcs = tuple(map(lambda datum: SingleGradeCalculator(datum), data))
     else:
         raise ValueError(f'{answer} 은 지원되지 않는 선택지입니다!')
-    calcs = tuple(map(lambda datum: SingleGradeCalculator(datum), data))
     if len(calcs) == 1:
         return calcs[0]
     return calcs
 
 
-def viewer(calc: Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]):
-    if isinstance(calc, tuple):
-        # Multiple calcs.
-        raise ValueError('WIP - Not implemented.')
+def menu_combinations(choice: str) -> Dict[str, Tuple[SubjectCategory, ...]]:
+    """
+    Category combinations selected by viewer menu choice.
+
+    Args:
+        choice (str): menu number.
+    """
+    if choice == "1":
+        combinations: Dict[str, Tuple[SubjectCategory, ...]] = {}
+        for menu in MENU_COMBINATIONS.values():
+            combinations.update(menu)
+        return combinations
+    try:
+        return MENU_COMBINATIONS[choice]
+    except KeyError:
+        raise ValueError(f'{choice} 은 지원되지 않는 선택지입니다!')
+
+
+def _table(students: Iterable[Student], columns: Dict[str, Any]) -> str:
+    lines: List[str] = [' | '.join(('이름', '학년') + tuple(columns))]
+    for index, student in enumerate(students):
+        lines.append(' | '.join(
+            [student.name, str(student.grade)] +
+            ['-' if rank != rank else f'{rank:.4f}' for rank in (columns[column][index] for column in columns)]
+        ))
+    return '\n'.join(lines) + '\n'
+
 
+@timed('render')
+def batch_viewer(calcs: Tuple[SingleGradeCalculator], choice: str):
+    """
+    Print selected combinations of every student as a single table.
+    Every combination is computed for all students at once by BatchGradeCalculator.
+
+    Args:
+        calcs (Tuple[SingleGradeCalculator]): calculators of students.
+        choice (str): menu number.
+    """
+    batch: BatchGradeCalculator = BatchGradeCalculator.fromCalculators(calcs)
+    if choice == FORMULA_MENU:
+        path: str = os.path.join(os.getcwd(), FORMULAS_FILE)
+        if not os.path.isfile(path):
+            raise ValueError(f'{path} 에 사용자 정의 공식이 없습니다!')
+        sys.stdout.write(_table(batch.students, FormulaSet(load_formulas(path)).evaluate(batch)))
+        return
+    sys.stdout.write(_table(batch.students, batch.ranks(menu_combinations(choice))))
+
+
+def viewer(calc: Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]):
     print(
-        """
+        f"""
         [ 내신 산출 도구 ] [ 계산 방식 ]
         1. 전체
         2. 전과목
@@ -79,16 +152,25 @@ def viewer(calc: Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]]):
         8. 국영사
         9. 수영과
         10. 수과
+        11. 사용자 정의 공식 ({FORMULAS_FILE})
         """
     )
     choice = input("> ")
-    calc.category_grades()
+    if isinstance(calc, tuple):
+        # Multiple calcs.
+        batch_viewer(calc, choice)
+    elif choice == "1":
+        calc.category_grades()
+    else:
+        batch_viewer((calc,), choice)
 
 
 def main():
     """내신 총점을 다양하게 산출합니다."""
+    configure_from_env()
     intro()
-    calculators: Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]] = read_data()
+    with ParseCache(os.path.join(os.getcwd(), ".cache")) as cache:
+        calculators: Union[SingleGradeCalculator, Tuple[SingleGradeCalculator]] = read_data(cache=cache)
     print("="*10)
     viewer(calculators)
     
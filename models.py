@@ -5,9 +5,11 @@ import logging
 from sys import stdout
 from abstracts import JsonObject, ParsableEnum, ComparableEnum
 from enum import Enum
+from functools import lru_cache
 from typing import Union, NoReturn, Any, List, Tuple
-from extend_builtins import Filter
+from extend_builtins import Stream
 from constants import *
+from instrumentation import timed
 
 __all__ = (
     "SubjectType",
@@ -59,7 +61,7 @@ class SubjectType(ParsableEnum, StringComparableEnum):
         Args:
             value (str): value to parse into SubjectType object.
         """
-        return Filter(lambda enum: enum.value == value, cls._member_map_.values()).find_first()
+        return Stream(cls._member_map_.values()).filter(lambda enum: enum.value == value).find_first()
 
 
 class SubjectCategory(ParsableEnum, StringComparableEnum):
@@ -78,7 +80,7 @@ class SubjectCategory(ParsableEnum, StringComparableEnum):
         Args:
             value (str): value to parse into SubjectCategory object.
         """
-        return Filter(lambda enum: enum.value == value, cls._member_map_.values()).find_first()
+        return Stream(cls._member_map_.values()).filter(lambda enum: enum.value == value).find_first()
 
 
 class SubjectAchievementLevels(ParsableEnum, StringComparableEnum):
@@ -98,13 +100,33 @@ class SubjectAchievementLevels(ParsableEnum, StringComparableEnum):
         Parse raw string into SubjectAchievementLevels instance.
 
         Args:
-            value (str): value to parse into SubjectAchievementLevels object.
+            value (str): value to parse into SubjectAchievementLevels object. Either member name or value.
         """
-        return cls.__members__[value]
+        try:
+            return cls.__members__[value]
+        except KeyError:
+            return cls(value)
+
+
+@lru_cache(maxsize=None)
+def semester_info(grade: int, semester: int) -> str:
+    """Shared '{학년}학년 {학기}학기' string, so subjects of the same semester don't hold copies."""
+    return f'{grade}학년 {semester}학기'
 
 
 class Subject(JsonObject):
     """Abstract Base Class for common subjects (Relative, Absolute, PnP)"""
+    __slots__ = (
+        '_subject_type',
+        '_category',
+        '_name',
+        '_units',
+        '_rank',
+        '_achievement',
+        '_grade',
+        '_semester',
+        '_semester_info'
+    )
 
     @classmethod
     def fromJson(cls, data: JSON, grade: int, semester: int) -> Subject:
@@ -160,6 +182,7 @@ class Subject(JsonObject):
         # Information injected during json parse.
         self._grade: int = grade    # 학년
         self._semester: int = semester  # 학기
+        self._semester_info: str = semester_info(grade, semester)
 
     def toJson(self) -> JSON:
         return {
@@ -227,10 +250,20 @@ class Subject(JsonObject):
         return self._achievement
 
     # Information injected during json parse.
+    @property
+    def grade(self) -> int:
+        """Grade (학년) of the semester this subject belongs to."""
+        return self._grade
+
+    @property
+    def semester(self) -> int:
+        """Semester (학기) this subject belongs to."""
+        return self._semester
+
     @property
     def semesterInfo(self) -> str:
-        """Subject's grade (학년)."""
-        return f'{self._grade}학년 {self._semester}학기'
+        """Subject's grade (학년) and semester (학기)."""
+        return self._semester_info
 
     def pretty(self) -> str:
         return f"""
@@ -247,6 +280,7 @@ class Subject(JsonObject):
 
 class DetailedSubject(Subject):
     """Abstract Base Class for detailed subjects (Relative, Absolute)"""
+    __slots__ = ('_score', '_average', '_standard_deviation', '_participants')
 
     @classmethod
     def fromJson(cls, data: JSON, grade: int, semester: int) -> DetailedSubject:
@@ -368,6 +402,7 @@ class DetailedSubject(Subject):
 
 class Student(JsonObject):
     """JsonObject containing student's information"""
+    __slots__ = ('_name', '_grade')
 
     @classmethod
     def fromJson(cls, data: JSON) -> Student:
@@ -394,7 +429,10 @@ class Student(JsonObject):
 
 class Semester(JsonObject):
     """Represents `semester` object in config"""
+    __slots__ = ('_grade', '_semester', '_subject_list')
+
     @classmethod
+    @timed('Semester.fromJson')
     def fromJson(cls, data: JSON) -> Semester:
         grade: int = data[SemesterKeys.GRADE]
         semester: int = data[SemesterKeys.SEMESTER]
@@ -417,15 +455,22 @@ class Semester(JsonObject):
         self._semester: int = semester
         self._subject_list: List[Union[SubjectKeys, DetailedSubject]] = subjects
 
+    @property
+    def grade(self) -> int:
+        """Semester's grade (학년)."""
+        return self._grade
+
+    @property
+    def semester(self) -> int:
+        """Semester's semester (학기)."""
+        return self._semester
+
     @property
     def subjects(self) -> Tuple[Union[SubjectKeys, DetailedSubject]]:
         return tuple(self._subject_list)
 
     def filter_category(self, category: SubjectCategory) -> Tuple[Subject, ...]:
-        return tuple(filter(
-            lambda s: s.category == category,
-            self._subject_list
-        ))
+        return Stream(self._subject_list).filter(lambda s: s.category == category).toTuple()
 
     @property
     def korean_subjects(self) -> Tuple[Subject, ...]:
@@ -452,12 +497,7 @@ class Semester(JsonObject):
         return self.filter_category(SubjectCategory.ETC)
 
     def toJson(self) -> JSON:
-        subject_scores: JSON = {}
-        for subjectJson in map(lambda s: s.toJson(), self._subject_list):
-            subject_scores.update(subjectJson)
-        logger.debug(
-            json.dumps(subject_scores)
-        )
+        subject_scores: List[JSON] = [subject.toJson() for subject in self._subject_list]
         return {
             SemesterKeys.GRADE: self._grade,
             SemesterKeys.SEMESTER: self._semester,
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from calc import SingleGradeCalculator
+from instrumentation import timed
+from models import Semester, Student
+
+__all__ = (
+    "ParseCache",
+)
+
+Parsed = Tuple[Student, List[Semester]]
+Identity = Tuple[int, int, str]     # (mtime, size, content hash) of the bytes a transcript was parsed from
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed transcripts, placed under read_json / SingleGradeCalculator.parse_data.
+
+    Entries are keyed by absolute path and validated with (mtime, size, content hash):
+      - same mtime and size : entry is trusted without reading the file.
+      - different mtime or size, same content hash : file was only touched. Entry is refreshed and used.
+      - different content hash : entry is stale. File is parsed again and entry is replaced.
+    Total size of cached entries is capped by max_bytes, evicting least recently used entries first.
+    An index written with another VERSION is discarded with its entries.
+    """
+    INDEX_FILE: str = 'index.json'
+    VERSION: int = 2    # Bump when pickled model classes change (ex: __slots__), so older entries are not loaded.
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        """
+        Open cache directory, creating it if needed.
+
+        Args:
+            directory (str): directory to store cache entries in.
+            max_bytes (int): maximum total size of cache entries.
+        """
+        self._directory: str = directory
+        self._max_bytes: int = max_bytes
+        # Entries by absolute path, least recently used first.
+        self._index: OrderedDict[str, Dict[str, object]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, self.INDEX_FILE), mode='rt', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if isinstance(index, dict) and index.get('version') == self.VERSION:
+            self._index.update(index['entries'])
+        else:
+            self._remove_orphans()
+        self._bytes: int = sum(entry['bytes'] for entry in self._index.values())
+
+    def __enter__(self) -> ParseCache:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.save()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def size(self) -> int:
+        """Total size of cache entries in bytes."""
+        return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Content hash of file contents."""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    @staticmethod
+    @timed('read_json')
+    def read(path: str) -> Tuple[bytes, Identity]:
+        """
+        Read contents of file with its identity. Stat is taken from the open file before reading, and the hash from
+        the bytes read, so the identity never describes newer contents than the ones returned.
+
+        Args:
+            path (str): path of json file.
+        """
+        with open(path, mode='rb') as f:
+            stat: os.stat_result = os.fstat(f.fileno())
+            data: bytes = f.read()
+        return data, (stat.st_mtime_ns, stat.st_size, ParseCache.digest(data))
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._directory, hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest() + '.pickle')
+
+    def get(self, path: str) -> Optional[Parsed]:
+        """
+        Get parsed transcript of file from cache. Returns None if there is no valid entry.
+
+        Args:
+            path (str): path of json file.
+        """
+        parsed: Optional[Parsed] = self._get(os.path.abspath(path))
+        if parsed is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return parsed
+
+    def _get(self, key: str) -> Optional[Parsed]:
+        entry: Optional[Dict[str, object]] = self._index.get(key)
+        if entry is None:
+            return None
+        try:
+            stat: os.stat_result = os.stat(key)
+            if entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                _, (mtime, size, digest) = self.read(key)
+                if entry['digest'] != digest:
+                    self._remove(key)
+                    return None
+                entry['mtime'], entry['size'] = mtime, size
+            with open(entry['file'], mode='rb') as f:
+                parsed: Parsed = pickle.load(f)
+        except Exception:
+            # Missing files, and entries that no longer unpickle into current models
+            # (AttributeError, TypeError, ImportError, ...) are all misses.
+            self._remove(key)
+            return None
+        self._index.move_to_end(key)
+        return parsed
+
+    def put(self, path: str, parsed: Parsed, identity: Identity) -> None:
+        """
+        Store parsed transcript of file, evicting least recently used entries if the cache grows over max_bytes.
+
+        Args:
+            path (str): path of json file.
+            parsed (Parsed): parsed student and semesters of the file.
+            identity (Identity): identity of the bytes parsed, as returned by read with them.
+        """
+        key: str = os.path.abspath(path)
+        mtime, size, digest = identity
+        payload: bytes = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self._max_bytes:
+            return
+        self._remove(key)
+        entry_path: str = self._entry_path(key)
+        with open(entry_path, mode='wb') as f:
+            f.write(payload)
+        self._index[key] = {
+            'mtime': mtime,
+            'size': size,
+            'digest': digest,
+            'file': entry_path,
+            'bytes': len(payload)
+        }
+        self._bytes += len(payload)
+        self._evict()
+
+    def load(self, path: str) -> SingleGradeCalculator:
+        """
+        Load calculator of json file, from cache if possible.
+
+        Args:
+            path (str): path of json file.
+        """
+        parsed: Optional[Parsed] = self.get(path)
+        if parsed is None:
+            data, identity = self.read(path)
+            parsed = SingleGradeCalculator.parse_data(json.loads(data))
+            self.put(path, parsed, identity)
+        return SingleGradeCalculator.fromModels(*parsed)
+
+    def _remove(self, key: str) -> None:
+        entry: Optional[Dict[str, object]] = self._index.pop(key, None)
+        if entry is not None:
+            self._delete(entry)
+
+    def _delete(self, entry: Dict[str, object]) -> None:
+        self._bytes -= entry['bytes']
+        try:
+            os.remove(entry['file'])
+        except OSError:
+            pass
+
+    def _remove_orphans(self) -> None:
+        """Delete entry files of a discarded index."""
+        for filename in os.listdir(self._directory):
+            if os.path.splitext(filename)[1] == '.pickle':
+                try:
+                    os.remove(os.path.join(self._directory, filename))
+                except OSError:
+                    pass
+
+    def _evict(self) -> None:
+        while self._bytes > self._max_bytes and self._index:
+            self._delete(self._index.popitem(last=False)[1])
+            self.evictions += 1
+
+    def save(self) -> None:
+        """Write cache index to disk."""
+        index_path: str = os.path.join(self._directory, self.INDEX_FILE)
+        with open(index_path + '.tmp', mode='wt', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'entries': self._index}, f, ensure_ascii=False)
+        os.replace(index_path + '.tmp', index_path)
+
+    def clear(self) -> None:
+        """Remove every cache entry."""
+        for key in tuple(self._index):
+            self._remove(key)
+        self.save()
@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch import SEMESTERS_PER_GRADE, semester_code
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator, category_key, category_keys
+from models import DetailedSubject, Student, Subject, SubjectCategory, SubjectType, semester_info
+
+__all__ = (
+    "GRADE_CUTOFFS",
+    "rank_probabilities",
+    "StudentModel",
+    "Distribution",
+    "Projection",
+    "model_student",
+    "project",
+    "project_cohort"
+)
+
+# Cumulative top percent of 1 ~ 8등급 (9등급 is the rest).
+GRADE_CUTOFFS: Tuple[float, ...] = (4, 11, 23, 40, 60, 77, 89, 96)
+GRADES: int = 3
+PERCENTILES: Tuple[int, ...] = (5, 25, 50, 75, 95)
+AT_MOST: Tuple[float, ...] = tuple(np.arange(1.5, 9.5, 0.5).tolist())
+MIN_SIGMA: float = 0.3      # floor of a student's spread, so a few consistent subjects don't yield certainty
+
+_NORMAL: NormalDist = NormalDist()
+# z-score at each cutoff, descending : z above _Z_CUTOFFS[g - 1] is g등급 or better.
+_Z_CUTOFFS: Tuple[float, ...] = tuple(_NORMAL.inv_cdf(1 - cutoff / 100) for cutoff in GRADE_CUTOFFS)
+# z-score at the middle of each 등급's band, used for relative subjects without statistics.
+_Z_MIDPOINTS: Tuple[float, ...] = tuple(
+    _NORMAL.inv_cdf(1 - (lower + upper) / 200) for lower, upper in zip((0,) + GRADE_CUTOFFS, GRADE_CUTOFFS + (100,))
+)
+# Aggregate index keys modelled, in code order : every category, then unrecognised categories. (None)
+_KEYS: Tuple[Optional[str], ...] = tuple(category.value for category in SubjectCategory) + (None,)
+
+
+def rank_probabilities(mu: float, sigma: float) -> np.ndarray:
+    """
+    Probability of each 석차등급 (1 ~ 9) for a subject whose z-score is distributed as Normal(mu, sigma).
+
+    Args:
+        mu (float): mean z-score.
+        sigma (float): standard deviation of z-score.
+    """
+    distribution: NormalDist = NormalDist(mu, sigma)
+    above: List[float] = [1 - distribution.cdf(z) for z in _Z_CUTOFFS]  # P(z > cutoff) : g등급 or better
+    probabilities: np.ndarray = np.diff([0.0] + above + [1.0])
+    probabilities = np.clip(probabilities, 0.0, None)
+    return probabilities / probabilities.sum()
+
+
+def _z_score(subject: Subject) -> float:
+    if isinstance(subject, DetailedSubject) and subject.standard_deviation:
+        return (subject.score - subject.average) / subject.standard_deviation
+    return _Z_MIDPOINTS[subject.rank - 1]
+
+
+class StudentModel:
+    """
+    Inputs of a student's projection : current sums, ability per category, and future subjects.
+    Per category tuples follow _KEYS, so they end with subjects of unrecognised category.
+    Plain tuples only, so models are cheap to send to worker processes.
+    """
+    __slots__ = ('totals', 'units', 'mu', 'sigma', 'future_units', 'future_semesters')
+
+    def __init__(
+            self,
+            totals: Tuple[int, ...],
+            units: Tuple[int, ...],
+            mu: Tuple[float, ...],
+            sigma: Tuple[float, ...],
+            future_units: Tuple[Tuple[int, ...], ...],
+            future_semesters: Tuple[str, ...]
+    ) -> None:
+        self.totals: Tuple[int, ...] = totals                           # current rank×units, per category
+        self.units: Tuple[int, ...] = units                             # current units, per category
+        self.mu: Tuple[float, ...] = mu                                 # mean z-score, per category
+        self.sigma: Tuple[float, ...] = sigma                           # spread of z-score, per category
+        self.future_units: Tuple[Tuple[int, ...], ...] = future_units   # units of each future subject, per category
+        self.future_semesters: Tuple[str, ...] = future_semesters       # semester infos projected
+
+    def __repr__(self) -> str:
+        return f"StudentModel<future_semesters={self.future_semesters}>"
+
+
+def _weighted(values: List[Tuple[float, int]]) -> Tuple[float, float]:
+    weights: np.ndarray = np.array([units for _, units in values], dtype=np.float64)
+    z: np.ndarray = np.array([value for value, _ in values])
+    mu: float = float(np.average(z, weights=weights))
+    return mu, float(np.sqrt(np.average((z - mu) ** 2, weights=weights)))
+
+
+def model_student(calculator: SingleGradeCalculator) -> StudentModel:
+    """
+    Model a student from the transcript.
+
+    Ability of a category is the units-weighted mean and spread of the student's z-scores there :
+    (score - average) / standard_deviation of DetailedSubjects, or the middle of the 석차등급 band otherwise.
+    Categories with a single subject use the spread over every category.
+    Future semesters are the ones after the latest semester up to 3학년 2학기, each taking the relative subjects
+    (category and units) of the latest semester.
+    Subjects of unrecognised category are modelled as one more category, which only combinations of every
+    category take in. (see calc.covers_transcript)
+
+    Args:
+        calculator (SingleGradeCalculator): calculator of the student.
+    """
+    totals: List[int] = []
+    units: List[int] = []
+    scores: Dict[Optional[str], List[Tuple[float, int]]] = {key: [] for key in _KEYS}
+    for key in _KEYS:
+        category_index = calculator.index[key]
+        totals.append(sum(aggregate.total for aggregate in category_index.values()))
+        units.append(sum(aggregate.units for aggregate in category_index.values()))
+        for aggregate in category_index.values():
+            for subject in aggregate.subjects:
+                if subject.type == SubjectType.RELATIVE:
+                    scores[key].append((_z_score(subject), subject.units))
+    every: List[Tuple[float, int]] = [score for category_scores in scores.values() for score in category_scores]
+    overall_mu, overall_sigma = _weighted(every) if every else (0.0, 1.0)
+    mu: List[float] = []
+    sigma: List[float] = []
+    for key in _KEYS:
+        category_scores: List[Tuple[float, int]] = scores[key]
+        category_mu, category_sigma = _weighted(category_scores) if category_scores else (overall_mu, overall_sigma)
+        if len(category_scores) < 2:
+            category_sigma = overall_sigma
+        mu.append(category_mu)
+        sigma.append(max(category_sigma, MIN_SIGMA))
+
+    codes: List[int] = [semester_code(semester.grade, semester.semester) for semester in calculator.semesters]
+    future_codes: List[int] = list(range(max(codes) + 1, GRADES * SEMESTERS_PER_GRADE)) if codes else []
+    template: Dict[Optional[str], List[int]] = {key: [] for key in _KEYS}
+    if future_codes:
+        latest = calculator.semesters[codes.index(max(codes))]
+        for subject in latest.subjects:
+            if subject.type == SubjectType.RELATIVE:
+                template[category_key(subject.category)].append(subject.units)
+    return StudentModel(
+        tuple(totals),
+        tuple(units),
+        tuple(mu),
+        tuple(sigma),
+        tuple(tuple(template[key]) * len(future_codes) for key in _KEYS),
+        tuple(semester_info(code // SEMESTERS_PER_GRADE + 1, code % SEMESTERS_PER_GRADE + 1) for code in future_codes)
+    )
+
+
+def _total_distribution(future_units: Sequence[int], probabilities: np.ndarray) -> np.ndarray:
+    """
+    Exact distribution of Σ rank×units over future subjects of a category, indexed by total.
+    Subjects are independent given the student's ability, so it is the convolution of per-subject distributions.
+    """
+    distribution: np.ndarray = np.ones(1)
+    for units in future_units:
+        convolved: np.ndarray = np.zeros(distribution.size + 9 * units)
+        for rank, probability in enumerate(probabilities, start=1):
+            convolved[rank * units:rank * units + distribution.size] += probability * distribution
+        distribution = convolved
+    return distribution
+
+
+def _alias_table(probabilities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Walker alias table of a discrete distribution, so each draw costs O(1) instead of a binary search."""
+    size: int = probabilities.size
+    scaled: np.ndarray = probabilities * (size / probabilities.sum())
+    threshold: np.ndarray = np.ones(size)
+    alias: np.ndarray = np.arange(size)
+    small: List[int] = np.flatnonzero(scaled < 1).tolist()
+    large: List[int] = np.flatnonzero(scaled >= 1).tolist()
+    while small and large:
+        less: int = small.pop()
+        more: int = large[-1]
+        threshold[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        if scaled[more] < 1:
+            small.append(large.pop())
+    return threshold, alias
+
+
+def _draw(rng: np.random.Generator, probabilities: np.ndarray, draws: int) -> np.ndarray:
+    """Draw indices of a discrete distribution with the alias method. One uniform per draw picks column and coin."""
+    threshold, alias = _alias_table(probabilities)
+    uniform: np.ndarray = rng.random(draws) * probabilities.size
+    column: np.ndarray = uniform.astype(np.int64)
+    return np.where(uniform - column < threshold[column], column, alias[column])
+
+
+class Distribution:
+    """Summary of projected final weighted ranks of a combination."""
+    __slots__ = ('mean', 'std', 'percentiles', 'at_most', 'draws')
+
+    def __init__(self, counts: np.ndarray, values: np.ndarray) -> None:
+        """
+        Args:
+            counts (np.ndarray): number of draws of each value.
+            values (np.ndarray): ascending final weighted ranks the counts refer to.
+        """
+        draws: int = int(counts.sum())
+        weights: np.ndarray = counts / draws
+        self.mean: float = float(weights @ values)
+        self.std: float = float(np.sqrt(max(weights @ (values - self.mean) ** 2, 0.0)))
+        cumulative: np.ndarray = np.cumsum(counts)
+        self.percentiles: Dict[int, float] = {
+            percentile: float(values[np.searchsorted(cumulative, percentile / 100 * draws)])
+            for percentile in PERCENTILES
+        }
+        # P(final rank <= threshold)
+        self.at_most: Dict[float, float] = {
+            threshold: float(cumulative[index - 1] / draws) if index else 0.0
+            for threshold, index in zip(AT_MOST, np.searchsorted(values, AT_MOST, side='right').tolist())
+        }
+        self.draws: int = draws
+
+    def probability(self, at_most: float) -> float:
+        """Probability that final rank is at most given value. Value must be one of AT_MOST."""
+        return self.at_most[at_most]
+
+    def toJson(self) -> Dict[str, object]:
+        return {
+            'mean': self.mean,
+            'std': self.std,
+            'percentiles': {str(key): value for key, value in self.percentiles.items()},
+            'at_most': {str(key): value for key, value in self.at_most.items()},
+            'draws': self.draws
+        }
+
+    def __repr__(self) -> str:
+        return f"Distribution<mean={self.mean:.4f},std={self.std:.4f},p5={self.percentiles[5]:.4f},p95={self.percentiles[95]:.4f}>"
+
+
+class Projection:
+    """Projected final ranks of a student, per combination. None where a combination has no relative subjects."""
+    __slots__ = ('student', 'future_semesters', 'combinations')
+
+    def __init__(self, student: Student, future_semesters: Tuple[str, ...], combinations: Dict[str, Optional[Distribution]]) -> None:
+        self.student: Student = student
+        self.future_semesters: Tuple[str, ...] = future_semesters
+        self.combinations: Dict[str, Optional[Distribution]] = combinations
+
+    def toJson(self) -> Dict[str, object]:
+        return {
+            'student': self.student.toJson(),
+            'future_semesters': list(self.future_semesters),
+            'combinations': {
+                name: None if distribution is None else distribution.toJson()
+                for name, distribution in self.combinations.items()
+            }
+        }
+
+    def __repr__(self) -> str:
+        return f"Projection<student={self.student.name},future_semesters={len(self.future_semesters)}>"
+
+
+def _simulate(
+        model: StudentModel,
+        combinations: Dict[str, Tuple[SubjectCategory, ...]],
+        draws: int,
+        seed: Sequence[int]
+) -> Dict[str, Optional[Distribution]]:
+    rng: np.random.Generator = np.random.default_rng(np.random.SeedSequence(seed))
+    # Draws of future Σ rank×units (integers) and fixed future units, per category.
+    samples: List[Optional[np.ndarray]] = []
+    future_units: List[int] = []
+    for code in range(len(_KEYS)):
+        units: Tuple[int, ...] = model.future_units[code]
+        future_units.append(sum(units))
+        if not units:
+            samples.append(None)
+            continue
+        distribution: np.ndarray = _total_distribution(units, rank_probabilities(model.mu[code], model.sigma[code]))
+        samples.append(_draw(rng, distribution, draws))
+    results: Dict[str, Optional[Distribution]] = {}
+    for name, categories in combinations.items():
+        codes: List[int] = [_KEYS.index(key) for key in category_keys(categories)]
+        units: int = sum(model.units[code] + future_units[code] for code in codes)
+        if not units:
+            results[name] = None
+            continue
+        future: np.ndarray = np.zeros(draws, dtype=np.int64)
+        for code in codes:
+            if samples[code] is not None:
+                future += samples[code]
+        # Totals are integers, so every statistic comes from their histogram instead of sorting draws.
+        counts: np.ndarray = np.bincount(future)
+        present: np.ndarray = np.flatnonzero(counts)
+        total: int = sum(model.totals[code] for code in codes)
+        results[name] = Distribution(counts[present], (total + present) / units)
+    return results
+
+
+def _simulate_chunk(
+        args: Tuple[List[StudentModel], Dict[str, Tuple[SubjectCategory, ...]], int, int, int]
+) -> List[Dict[str, Optional[Distribution]]]:
+    models, combinations, draws, seed, start = args
+    return [_simulate(model, combinations, draws, (seed, start + offset)) for offset, model in enumerate(models)]
+
+
+def project(
+        calculator: SingleGradeCalculator,
+        draws: int = 100_000,
+        seed: int = 0,
+        combinations: Optional[Dict[str, Tuple[SubjectCategory, ...]]] = None,
+        index: int = 0
+) -> Projection:
+    """
+    Project final weighted ranks of a student with Monte Carlo simulation of future semesters.
+
+    Args:
+        calculator (SingleGradeCalculator): calculator of the student.
+        draws (int): number of simulated futures.
+        seed (int): random seed.
+        combinations (Optional[Dict[str, Tuple[SubjectCategory, ...]]]): combinations to project. CATEGORY_COMBINATIONS if None.
+        index (int): index of the student in its cohort. Same (seed, index) always draws the same futures.
+    """
+    model: StudentModel = model_student(calculator)
+    return Projection(
+        calculator.student,
+        model.future_semesters,
+        _simulate(model, dict(CATEGORY_COMBINATIONS if combinations is None else combinations), draws, (seed, index))
+    )
+
+
+def project_cohort(
+        calculators: Iterable[SingleGradeCalculator],
+        draws: int = 100_000,
+        seed: int = 0,
+        combinations: Optional[Dict[str, Tuple[SubjectCategory, ...]]] = None,
+        workers: Optional[int] = None,
+        chunksize: int = 16
+) -> List[Projection]:
+    """
+    Project every student of a cohort, with a process pool. Results are the same whatever the number of workers,
+    as each student draws from its own (seed, index) stream.
+
+    Args:
+        calculators (Iterable[SingleGradeCalculator]): calculators of students.
+        draws (int): number of simulated futures per student.
+        seed (int): random seed.
+        combinations (Optional[Dict[str, Tuple[SubjectCategory, ...]]]): combinations to project. CATEGORY_COMBINATIONS if None.
+        workers (Optional[int]): number of worker processes. Defaults to os.cpu_count(). 1 runs in this process.
+        chunksize (int): number of students sent to a worker at once.
+    """
+    calculators = list(calculators)
+    combinations = dict(CATEGORY_COMBINATIONS if combinations is None else combinations)
+    models: List[StudentModel] = [model_student(calculator) for calculator in calculators]
+    chunks: List[Tuple[List[StudentModel], Dict[str, Tuple[SubjectCategory, ...]], int, int, int]] = [
+        (models[start:start + chunksize], combinations, draws, seed, start)
+        for start in range(0, len(models), chunksize)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        results = map(_simulate_chunk, chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_simulate_chunk, chunks))
+    distributions: List[Dict[str, Optional[Distribution]]] = [result for chunk in results for result in chunk]
+    return [
+        Projection(calculator.student, model.future_semesters, result)
+        for calculator, model, result in zip(calculators, models, distributions)
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    from loader import list_data_files, load_files
+
+    parser = argparse.ArgumentParser(description='내신 산출 도구 - 최종 내신 예측')
+    parser.add_argument('directory', help='directory of transcript json files')
+    parser.add_argument('--draws', type=int, default=100_000, help='simulated futures per student')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='worker processes (default: cpu count)')
+    args = parser.parse_args()
+
+    loaded: List[SingleGradeCalculator] = [
+        result.calculator for result in load_files(list_data_files(args.directory), workers=args.workers) if result.ok
+    ]
+    sys.stdout.write(''.join(
+        json.dumps(projection.toJson(), ensure_ascii=False) + '\n'
+        for projection in project_cohort(loaded, args.draws, args.seed, workers=args.workers)
+    ))
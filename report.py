@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import csv
+import io
+import sys
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from instrumentation import timed
+from models import Subject, DetailedSubject, SubjectCategory
+
+if TYPE_CHECKING:
+    from calc import SingleGradeCalculator
+
+__all__ = (
+    "REPORT_FORMATS",
+    "ReportRenderer"
+)
+
+REPORT_FORMATS: Tuple[str, ...] = ('text', 'markdown', 'csv')
+
+# Line templates of each report format.
+_TEXT_COMBINATION: Callable[..., str] = '> {} 총점 : {}\n'.format
+_TEXT_CATEGORY: Callable[..., str] = '==========\n[ {} 영역 ]\n'.format
+_TEXT_SEMESTER: Callable[..., str] = '{}:\n'.format
+_TEXT_CATEGORY_TOTAL: Callable[..., str] = '> {} 영역 내신 총점 : {}\n'.format
+_MARKDOWN_STUDENT: Callable[..., str] = '## {} ({}학년)\n\n| 조합 | 총점 |\n| --- | ---: |\n'.format
+_MARKDOWN_ROW: Callable[..., str] = '| {} | {} |\n'.format
+_MARKDOWN_CATEGORY: Callable[..., str] = (
+    '\n### {} 영역\n\n'
+    '| 학기 | 과목명 | 과목 유형 | 단위수 | 석차등급 | 원점수 | 과목평균 | 표준편차 | 수강자 수 | 성취도 |\n'
+    '| --- | --- | --- | ---: | ---: | ---: | ---: | ---: | ---: | --- |\n'
+).format
+_MARKDOWN_SUBJECT: Callable[..., str] = '| {} | {} | {} | {} | {} | {} | {} | {} | {} | {} |\n'.format
+_MARKDOWN_CATEGORY_TOTAL: Callable[..., str] = '\n> {} 영역 내신 총점 : {}\n'.format
+
+
+def _rank(calculator: SingleGradeCalculator, categories: Iterable[SubjectCategory]) -> Optional[float]:
+    try:
+        return calculator.rank(categories)
+    except ZeroDivisionError:
+        return None
+
+
+def _figure(value: object) -> object:
+    return '-' if value is None else value
+
+
+class ReportRenderer:
+    """
+    Renders category_grades reports of calculators into one buffer, written with a single call.
+
+    Formats:
+        text: same layout as SingleGradeCalculator.category_grades.
+        markdown: combination table, then a subject table per category.
+        csv: one row per student, with every combination and category total.
+    Undefined totals (no relative subjects) are rendered as '-' in text / markdown, and empty in csv.
+    """
+
+    def __init__(self, combinations: Dict[str, Tuple[SubjectCategory, ...]], format: str = 'text') -> None:
+        """
+        Args:
+            combinations (Dict[str, Tuple[SubjectCategory, ...]]): combinations to report, by name, in report order.
+            format (str): 'text', 'markdown' or 'csv'.
+        """
+        if format not in REPORT_FORMATS:
+            raise ValueError(f'unknown report format : {format}')
+        self._combinations: Dict[str, Tuple[SubjectCategory, ...]] = combinations
+        self._format: str = format
+
+    @property
+    def format(self) -> str:
+        return self._format
+
+    # Fragments
+
+    def _text(self, calculator: SingleGradeCalculator, fragments: List[str]) -> None:
+        append = fragments.append
+        for combination, categories in self._combinations.items():
+            append(_TEXT_COMBINATION(combination, _figure(_rank(calculator, categories))))
+        index = calculator.index
+        for category in SubjectCategory:
+            name: str = category.value
+            append(_TEXT_CATEGORY(name))
+            for semesterInfo, aggregate in index[name].items():
+                append(_TEXT_SEMESTER(semesterInfo))
+                for subject in aggregate.subjects:
+                    append(subject.pretty())
+                    append('\n')
+            append(_TEXT_CATEGORY_TOTAL(name, _figure(_rank(calculator, (category,)))))
+
+    @staticmethod
+    def _markdown_subject(semesterInfo: str, subject: Subject) -> str:
+        if isinstance(subject, DetailedSubject):
+            score, average, standard_deviation, participants = (
+                subject.score, subject.average, subject.standard_deviation, subject.participants
+            )
+        else:
+            score = average = standard_deviation = participants = '-'
+        return _MARKDOWN_SUBJECT(
+            semesterInfo, subject.name, subject.type.value, subject.units, _figure(subject.rank),
+            score, average, standard_deviation, participants, subject.achievement.value
+        )
+
+    def _markdown(self, calculator: SingleGradeCalculator, fragments: List[str]) -> None:
+        append = fragments.append
+        append(_MARKDOWN_STUDENT(calculator.student.name, calculator.student.grade))
+        for combination, categories in self._combinations.items():
+            append(_MARKDOWN_ROW(combination, _figure(_rank(calculator, categories))))
+        index = calculator.index
+        for category in SubjectCategory:
+            name: str = category.value
+            append(_MARKDOWN_CATEGORY(name))
+            for semesterInfo, aggregate in index[name].items():
+                for subject in aggregate.subjects:
+                    append(self._markdown_subject(semesterInfo, subject))
+            append(_MARKDOWN_CATEGORY_TOTAL(name, _figure(_rank(calculator, (category,)))))
+        append('\n')
+
+    def _csv_header(self) -> List[str]:
+        return ['이름', '학년'] + list(self._combinations) + [f'{category.value} 영역' for category in SubjectCategory]
+
+    def _csv_row(self, calculator: SingleGradeCalculator) -> List[object]:
+        ranks: List[Optional[float]] = [_rank(calculator, categories) for categories in self._combinations.values()]
+        ranks.extend(_rank(calculator, (category,)) for category in SubjectCategory)
+        return [calculator.student.name, calculator.student.grade] + ['' if rank is None else rank for rank in ranks]
+
+    # Rendering
+
+    @timed('render')
+    def render_many(self, calculators: Iterable[SingleGradeCalculator]) -> str:
+        """
+        Render report of every calculator into one string.
+
+        Args:
+            calculators (Iterable[SingleGradeCalculator]): calculators to report, in report order.
+        """
+        if self._format == 'csv':
+            buffer: io.StringIO = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerow(self._csv_header())
+            writer.writerows(self._csv_row(calculator) for calculator in calculators)
+            return buffer.getvalue()
+        fragments: List[str] = []
+        render = self._text if self._format == 'text' else self._markdown
+        for calculator in calculators:
+            render(calculator, fragments)
+        return ''.join(fragments)
+
+    def render(self, calculator: SingleGradeCalculator) -> str:
+        """Render report of a calculator."""
+        return self.render_many((calculator,))
+
+    def write(self, calculators: Iterable[SingleGradeCalculator], file: Optional[TextIO] = None) -> int:
+        """
+        Render reports and write them to file with a single call.
+
+        Args:
+            calculators (Iterable[SingleGradeCalculator]): calculators to report.
+            file (Optional[TextIO]): file-like target. sys.stdout if None.
+
+        Returns:
+            int: number of characters written.
+        """
+        return (sys.stdout if file is None else file).write(self.render_many(calculators))
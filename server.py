@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from batch import BatchGradeCalculator
+from calc import CATEGORY_COMBINATIONS
+from constants import JSON
+from models import SubjectCategory
+
+__all__ = (
+    "GradeService",
+)
+
+_STATUS: Dict[int, str] = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large'
+}
+_RESULT_COMBINATIONS: Dict[str, Tuple[SubjectCategory, ...]] = dict(CATEGORY_COMBINATIONS)
+_RESULT_COMBINATIONS.update({category.value: (category,) for category in SubjectCategory})
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class GradeService:
+    """
+    Local HTTP service computing category_grades figures of transcripts.
+
+    POST /grades with a transcript (constants.py schema) returns every combination and category rank as json.
+    GET /stats returns request count and p50 / p99 latency in milliseconds.
+
+    Connections are kept alive (HTTP/1.1), and transcripts of concurrent requests are collected for
+    batch_window seconds (or until max_batch) and computed together by one BatchGradeCalculator.
+    """
+
+    def __init__(self, batch_window: float = 0.002, max_batch: int = 256, max_body: int = 4 * 1024 * 1024, latency_window: int = 10000) -> None:
+        """
+        Args:
+            batch_window (float): seconds to wait for more requests before computing a batch.
+            max_batch (int): maximum number of transcripts computed at once.
+            max_body (int): maximum request body size in bytes.
+            latency_window (int): number of recent requests kept for latency percentiles.
+        """
+        self._batch_window: float = batch_window
+        self._max_batch: int = max_batch
+        self._max_body: int = max_body
+        self._queue: Optional[asyncio.Queue] = None
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self.requests: int = 0
+        self.batches: int = 0
+
+    # Computation
+
+    @staticmethod
+    def _results(data: List[JSON]) -> List[JSON]:
+        batch: BatchGradeCalculator = BatchGradeCalculator.fromJson(data)
+        ranks = batch.ranks(_RESULT_COMBINATIONS)
+        results: List[JSON] = []
+        for index, student in enumerate(batch.students):
+            result: JSON = student.toJson()
+            for combination in _RESULT_COMBINATIONS:
+                rank: float = float(ranks[combination][index])
+                result[combination] = None if math.isnan(rank) else rank
+            results.append(result)
+        return results
+
+    def _compute(self, jobs: List[Tuple[JSON, asyncio.Future]]) -> None:
+        self.batches += 1
+        try:
+            results: List[JSON] = self._results([data for data, _ in jobs])
+        except Exception:
+            # A broken transcript must not fail the whole batch : retry one by one.
+            for data, future in jobs:
+                try:
+                    future.set_result(self._results([data])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(jobs, results):
+            future.set_result(result)
+
+    async def _batcher(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            jobs: List[Tuple[JSON, asyncio.Future]] = [await self._queue.get()]
+            deadline: float = loop.time() + self._batch_window
+            while len(jobs) < self._max_batch:
+                timeout: float = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._compute(jobs)
+
+    async def grades(self, data: JSON) -> JSON:
+        """
+        Compute figures of a transcript, batched with other concurrent calls.
+
+        Args:
+            data (JSON): transcript to compute.
+        """
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((data, future))
+        return await future
+
+    def stats(self) -> JSON:
+        latencies: List[float] = list(self._latencies)
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'p50_ms': _percentile(latencies, 50),
+            'p99_ms': _percentile(latencies, 99)
+        }
+
+    # HTTP
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: JSON, keep_alive: bool) -> None:
+        payload: bytes = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f'HTTP/1.1 {status} {_STATUS[status]}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            f'\r\n'.encode('ascii') + payload
+        )
+        await writer.drain()
+
+    async def _handle(self, method: str, path: str, body: bytes) -> Tuple[int, JSON]:
+        if path == '/stats':
+            return 200, self.stats()
+        elif path != '/grades':
+            return 404, {'error': f'{path} not found'}
+        elif method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            data: JSON = json.loads(body)
+        except ValueError as e:
+            return 400, {'error': f'invalid json : {e}'}
+        try:
+            return 200, await self.grades(data)
+        except Exception as e:
+            return 400, {'error': f'{type(e).__name__}: {e}'}
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line: bytes = await reader.readline()
+                if not request_line:
+                    break
+                start: float = time.perf_counter()
+                method, path, version = request_line.decode('latin-1').split()
+                headers: Dict[str, str] = {}
+                while True:
+                    line: bytes = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive: bool = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                length: int = int(headers.get('content-length', 0))
+                if length > self._max_body:
+                    await self._respond(writer, 413, {'error': 'request body too large'}, False)
+                    break
+                body: bytes = await reader.readexactly(length) if length else b''
+                status, result = await self._handle(method, path, body)
+                await self._respond(writer, status, result, keep_alive)
+                if path == '/grades':
+                    self.requests += 1
+                    self._latencies.append((time.perf_counter() - start) * 1000)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000) -> None:
+        """Serve until cancelled."""
+        self._queue = asyncio.Queue()
+        batcher: asyncio.Task = asyncio.create_task(self._batcher())
+        server: asyncio.AbstractServer = await asyncio.start_server(self._connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='내신 산출 도구 - 로컬 HTTP 서비스')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--batch-window', type=float, default=0.002, help='seconds to collect concurrent requests')
+    parser.add_argument('--max-batch', type=int, default=256)
+    args = parser.parse_args()
+    try:
+        asyncio.run(GradeService(args.batch_window, args.max_batch).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator, category_key, category_keys
+from constants import JSON, SubjectKeys
+from models import Subject, Semester, SubjectCategory, SubjectType
+from transcript_parser import parse_subject
+
+__all__ = (
+    "Simulation",
+)
+
+# Index of each category in per-category sums, by aggregate index key. (None : unrecognised category, last)
+_CATEGORY_INDEX: Dict[Optional[str], int] = {category.value: index for index, category in enumerate(SubjectCategory)}
+_CATEGORY_INDEX[None] = len(_CATEGORY_INDEX)
+
+
+def _contribution(subject: Subject) -> Tuple[int, int]:
+    """(rank×units, units) a subject adds to weighted ranks. Only relative subjects count, as in get_rank."""
+    if subject.type == SubjectType.RELATIVE:
+        return subject.rank * subject.units, subject.units
+    return 0, 0
+
+
+class Simulation:
+    """
+    What-if simulation over a student's transcript.
+
+    Keeps rank×units and units sums per category and per category combination. Adding, removing or changing
+    a subject updates only the category of the subject and the combinations containing it, in O(1),
+    without touching the calculator. Every change is journaled, so scenarios can be rolled back.
+    """
+
+    def __init__(
+            self,
+            calculator: SingleGradeCalculator,
+            combinations: Optional[Dict[str, Tuple[SubjectCategory, ...]]] = None
+    ) -> None:
+        """
+        Args:
+            calculator (SingleGradeCalculator): calculator of the student to simulate.
+            combinations (Optional[Dict[str, Tuple[SubjectCategory, ...]]]): combinations to maintain. CATEGORY_COMBINATIONS if None.
+        """
+        self._calculator: SingleGradeCalculator = calculator
+        self._combinations: Dict[str, Tuple[SubjectCategory, ...]] = dict(
+            CATEGORY_COMBINATIONS if combinations is None else combinations
+        )
+        # Combinations containing each category, by aggregate index key. (see calc.category_keys)
+        keys: List[List[Optional[str]]] = [category_keys(categories) for categories in self._combinations.values()]
+        self._members: Dict[Optional[str], Tuple[int, ...]] = {
+            key: tuple(index for index, combination_keys in enumerate(keys) if key in combination_keys)
+            for key in _CATEGORY_INDEX
+        }
+        self._category_totals: List[int] = [0] * len(_CATEGORY_INDEX)
+        self._category_units: List[int] = [0] * len(_CATEGORY_INDEX)
+        self._combination_totals: List[int] = [0] * len(self._combinations)
+        self._combination_units: List[int] = [0] * len(self._combinations)
+        for key, code in _CATEGORY_INDEX.items():
+            # Looked up per category, so a lazy index (see LazyIndex) builds each one instead of looking empty.
+            for aggregate in calculator.index[key].values():
+                self._category_totals[code] += aggregate.total
+                self._category_units[code] += aggregate.units
+        for index, combination_keys in enumerate(keys):
+            for key in combination_keys:
+                self._combination_totals[index] += self._category_totals[_CATEGORY_INDEX[key]]
+                self._combination_units[index] += self._category_units[_CATEGORY_INDEX[key]]
+        # Current subjects. Removed subjects leave None, so positions of the others never move.
+        self._subjects: List[Optional[Subject]] = list(calculator.subjects)
+        self._positions: Dict[int, int] = {id(subject): position for position, subject in enumerate(self._subjects)}
+        self._journal: List[Tuple[int, Optional[Subject], Optional[Subject]]] = []    # (position, old, new)
+
+    # Sums
+
+    def _apply(self, subject: Subject, sign: int) -> None:
+        total, units = _contribution(subject)
+        if not units:
+            return
+        total *= sign
+        units *= sign
+        category: Optional[str] = category_key(subject.category)
+        code: int = _CATEGORY_INDEX[category]
+        self._category_totals[code] += total
+        self._category_units[code] += units
+        for index in self._members[category]:
+            self._combination_totals[index] += total
+            self._combination_units[index] += units
+
+    def _swap(self, position: int, old: Optional[Subject], new: Optional[Subject]) -> None:
+        if old is not None:
+            self._apply(old, -1)
+            del self._positions[id(old)]
+        if new is not None:
+            self._apply(new, 1)
+            self._positions[id(new)] = position
+        self._subjects[position] = new
+
+    def _position(self, subject: Subject) -> int:
+        try:
+            return self._positions[id(subject)]
+        except KeyError:
+            raise ValueError(f'{subject!r} is not a subject of this simulation')
+
+    # Changes
+
+    def add(self, subject: Subject) -> Subject:
+        """
+        Add a hypothetical subject. (ex: a subject of next semester)
+
+        Args:
+            subject (Subject): subject to add.
+        """
+        self._subjects.append(None)
+        position: int = len(self._subjects) - 1
+        self._swap(position, None, subject)
+        self._journal.append((position, None, subject))
+        return subject
+
+    def remove(self, subject: Subject) -> None:
+        """
+        Remove a subject.
+
+        Args:
+            subject (Subject): current subject of the simulation.
+        """
+        position: int = self._position(subject)
+        self._swap(position, subject, None)
+        self._journal.append((position, subject, None))
+
+    def replace(self, subject: Subject, new: Subject) -> Subject:
+        """
+        Replace a subject by another one, keeping its position.
+
+        Args:
+            subject (Subject): current subject of the simulation.
+            new (Subject): subject to put instead.
+        """
+        position: int = self._position(subject)
+        self._swap(position, subject, new)
+        self._journal.append((position, subject, new))
+        return new
+
+    def update(self, subject: Subject, **changes) -> Subject:
+        """
+        Replace a subject by a copy with some attributes changed.
+
+        Args:
+            subject (Subject): current subject of the simulation.
+            changes: new values, by SubjectKeys name. (ex: rank=2, units=4, type=SubjectType.RELATIVE)
+        """
+        data: JSON = subject.toJson()
+        for key, value in changes.items():
+            data[getattr(SubjectKeys, key.upper())] = getattr(value, 'value', value)
+        return self.replace(subject, parse_subject(data, subject.grade, subject.semester))
+
+    def set_rank(self, subject: Subject, rank: int) -> Subject:
+        """Change rank (석차등급) of a subject."""
+        return self.update(subject, rank=rank)
+
+    # Scenarios
+
+    def checkpoint(self) -> int:
+        """Mark current state. Pass it to rollback to undo later changes."""
+        return len(self._journal)
+
+    def rollback(self, checkpoint: int = 0) -> None:
+        """
+        Undo changes made after checkpoint. Every change if checkpoint is 0.
+
+        Args:
+            checkpoint (int): value returned by checkpoint().
+        """
+        while len(self._journal) > checkpoint:
+            position, old, new = self._journal.pop()
+            self._swap(position, new, old)
+            if old is None and position == len(self._subjects) - 1:
+                self._subjects.pop()
+
+    @contextmanager
+    def scenario(self) -> Iterator[Simulation]:
+        """Context manager undoing every change made inside it."""
+        checkpoint: int = self.checkpoint()
+        try:
+            yield self
+        finally:
+            self.rollback(checkpoint)
+
+    def evaluate(self, scenarios: Iterable[Sequence[Tuple[Subject, int]]]) -> List[Dict[str, Optional[float]]]:
+        """
+        Combination ranks of many scenarios, each a sequence of (subject, rank) changes to current subjects.
+        Scenarios are evaluated from rank deltas on copies of the combination sums, without building subjects,
+        and leave the simulation unchanged.
+
+        Args:
+            scenarios (Iterable[Sequence[Tuple[Subject, int]]]): scenarios to evaluate.
+        """
+        results: List[Dict[str, Optional[float]]] = []
+        names: List[str] = list(self._combinations)
+        units: List[int] = self._combination_units
+        for changes in scenarios:
+            totals: List[int] = list(self._combination_totals)
+            ranks: Dict[int, int] = {}  # rank of subjects changed in this scenario, by id
+            for subject, rank in changes:
+                self._position(subject)
+                if not _contribution(subject)[1]:
+                    continue
+                delta: int = (rank - ranks.get(id(subject), subject.rank)) * subject.units
+                ranks[id(subject)] = rank
+                for index in self._members[category_key(subject.category)]:
+                    totals[index] += delta
+            results.append({name: self._divide(total, unit) for name, total, unit in zip(names, totals, units)})
+        return results
+
+    # Results
+
+    @staticmethod
+    def _divide(total: int, units: int) -> Optional[float]:
+        return total / units if units else None
+
+    def combination_ranks(self) -> Dict[str, Optional[float]]:
+        """Weighted rank of every maintained combination. None if combination has no relative subjects."""
+        return {
+            combination: self._divide(total, units)
+            for combination, total, units in zip(self._combinations, self._combination_totals, self._combination_units)
+        }
+
+    def category_ranks(self) -> Dict[str, Optional[float]]:
+        """Weighted rank of each single category. None if category has no relative subjects."""
+        return {
+            category.value: self._divide(self._category_totals[code], self._category_units[code])
+            for code, category in enumerate(SubjectCategory)
+        }
+
+    def rank(self, combination: str) -> Optional[float]:
+        """Weighted rank of a maintained combination, by name."""
+        index: int = list(self._combinations).index(combination)
+        return self._divide(self._combination_totals[index], self._combination_units[index])
+
+    @property
+    def subjects(self) -> List[Subject]:
+        """Current subjects, in transcript order; added subjects last."""
+        return [subject for subject in self._subjects if subject is not None]
+
+    def find(self, name: str, semesterInfo: Optional[str] = None) -> Subject:
+        """
+        Find a current subject by name, and semester info (ex: '2학년 1학기') if name is not unique.
+
+        Args:
+            name (str): subject name.
+            semesterInfo (Optional[str]): semester of the subject.
+        """
+        matches: List[Subject] = [
+            subject for subject in self.subjects
+            if subject.name == name and (semesterInfo is None or subject.semesterInfo == semesterInfo)
+        ]
+        if len(matches) != 1:
+            raise ValueError(f'{len(matches)} subjects match {name} {semesterInfo or ""}'.rstrip())
+        return matches[0]
+
+    def toCalculator(self) -> SingleGradeCalculator:
+        """Build a calculator of the current scenario."""
+        semesters: Dict[Tuple[int, int], List[Subject]] = {
+            (semester.grade, semester.semester): [] for semester in self._calculator.semesters
+        }
+        for subject in self.subjects:
+            semesters.setdefault((subject.grade, subject.semester), []).append(subject)
+        return SingleGradeCalculator.fromModels(
+            self._calculator.student,
+            [Semester(grade, semester, subjects) for (grade, semester), subjects in semesters.items()]
+        )
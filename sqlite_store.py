@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from batch import CATEGORY_CODES, RELATIVE_CODE, TYPE_CODES
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator, SubjectAggregate, category_keys, covers_transcript
+from instrumentation import timed
+from loader import list_data_files, load_files
+from models import *
+from models import semester_info
+from report import ReportRenderer
+
+__all__ = (
+    "SqliteStore",
+    "StoredCalculator"
+)
+
+# Enum members are stored as integer codes (see batch.CATEGORY_CODES / TYPE_CODES), NULL if unknown.
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    grade INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS semesters (
+    student INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    grade INTEGER NOT NULL,
+    semester INTEGER NOT NULL,
+    PRIMARY KEY (student, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS subjects (
+    student INTEGER NOT NULL,
+    position INTEGER NOT NULL,              -- order of the subject in the transcript
+    semester_position INTEGER NOT NULL,     -- semesters.position of the subject's semester
+    grade INTEGER NOT NULL,
+    semester INTEGER NOT NULL,
+    type INTEGER,
+    category INTEGER,
+    achievement INTEGER,
+    name TEXT NOT NULL,
+    units INTEGER NOT NULL,
+    rank INTEGER,
+    detailed INTEGER NOT NULL,
+    score REAL,
+    average REAL,
+    standard_deviation REAL,
+    participants INTEGER,
+    PRIMARY KEY (student, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS subjects_lookup ON subjects (student, category, type, grade, semester);
+"""
+_TYPES: Tuple[SubjectType, ...] = tuple(SubjectType)
+_CATEGORIES: Tuple[SubjectCategory, ...] = tuple(SubjectCategory)
+_ACHIEVEMENTS: Tuple[SubjectAchievementLevels, ...] = tuple(SubjectAchievementLevels)
+_ACHIEVEMENT_CODES: Dict[str, int] = {achievement.value: code for code, achievement in enumerate(_ACHIEVEMENTS)}
+
+
+def _code(codes: Dict[str, int], member: Optional[Enum]) -> Optional[int]:
+    return None if member is None else codes.get(member.value)
+
+
+class StoredCalculator(SingleGradeCalculator):
+    """
+    Calculator of a student kept in a SqliteStore.
+
+    Ranks are answered by the store with indexed aggregate queries. Semesters, subjects and the aggregate index
+    are hydrated from the store only when first needed (ex: listing subjects in category_grades).
+    """
+
+    def __init__(self, store: SqliteStore, student_id: int, student: Student) -> None:
+        """
+        Args:
+            store (SqliteStore): store holding the student.
+            student_id (int): id of the student in the store.
+            student (Student): the student.
+        """
+        self._store: SqliteStore = store
+        self._student_id: int = student_id
+        self._student: Student = student
+        self._models: Optional[Tuple[List[Semester], Dict[Optional[str], Dict[str, SubjectAggregate]]]] = None
+
+    def _hydrate(self) -> Tuple[List[Semester], Dict[Optional[str], Dict[str, SubjectAggregate]]]:
+        if self._models is None:
+            semesters: List[Semester] = self._store.semesters(self._student_id)
+            self._models = (semesters, self.build_index(semesters))
+        return self._models
+
+    @property
+    def _semesters(self) -> List[Semester]:
+        return self._hydrate()[0]
+
+    @property
+    def _index(self) -> Dict[Optional[str], Dict[str, SubjectAggregate]]:
+        return self._hydrate()[1]
+
+    @property
+    def student_id(self) -> int:
+        return self._student_id
+
+    @property
+    def hydrated(self) -> bool:
+        """Whether models of the student have been read from the store."""
+        return self._models is not None
+
+    def rank(self, categories: Iterable[SubjectCategory], semesters: Optional[Iterable[str]] = None) -> float:
+        """Weighted rank of given categories, computed by the store. (see SqliteStore.rank)"""
+        return self._store.rank(self._student_id, categories, semesters)
+
+
+class SqliteStore:
+    """
+    Transcript store backed by a local SQLite database.
+
+    Transcripts are bulk loaded with batched executemany inside a transaction, and subjects are indexed by
+    (student, category, type, grade, semester), so weighted ranks of category_grades are single aggregate
+    queries over the index. Models are hydrated only on access, so a cohort does not need to fit in memory.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (or create) a store.
+
+        Args:
+            path (str): database file. ':memory:' for an in-memory store.
+        """
+        self._connection: sqlite3.Connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> SqliteStore:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+
+    # Loading
+
+    @timed('sqlite_load')
+    def add(self, calculators: Iterable[SingleGradeCalculator], batch_size: int = 256) -> List[int]:
+        """
+        Bulk load transcripts in a single transaction. Rows are buffered and written with executemany
+        every batch_size students.
+
+        Args:
+            calculators (Iterable[SingleGradeCalculator]): transcripts to store.
+            batch_size (int): students buffered per executemany.
+
+        Returns:
+            List[int]: store ids of the added students, in order.
+        """
+        student_rows: List[Tuple] = []
+        semester_rows: List[Tuple] = []
+        subject_rows: List[Tuple] = []
+        ids: List[int] = []
+
+        def flush() -> None:
+            self._connection.executemany('INSERT INTO students VALUES (?, ?, ?)', student_rows)
+            self._connection.executemany('INSERT INTO semesters VALUES (?, ?, ?, ?)', semester_rows)
+            self._connection.executemany(
+                'INSERT INTO subjects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', subject_rows
+            )
+            student_rows.clear()
+            semester_rows.clear()
+            subject_rows.clear()
+
+        with self._connection:
+            student_id: int = self._connection.execute('SELECT COALESCE(MAX(id) + 1, 0) FROM students').fetchone()[0]
+            for calculator in calculators:
+                student: Student = calculator.student
+                student_rows.append((student_id, student.name, student.grade))
+                position: int = 0
+                for semester_position, semester in enumerate(calculator.semesters):
+                    semester_rows.append((student_id, semester_position, semester.grade, semester.semester))
+                    for subject in semester.subjects:
+                        detailed: bool = isinstance(subject, DetailedSubject)
+                        subject_rows.append((
+                            student_id,
+                            position,
+                            semester_position,
+                            semester.grade,
+                            semester.semester,
+                            _code(TYPE_CODES, subject.type),
+                            _code(CATEGORY_CODES, subject.category),
+                            _code(_ACHIEVEMENT_CODES, subject.achievement),
+                            subject.name,
+                            subject.units,
+                            subject.rank,
+                            detailed,
+                            subject.score if detailed else None,
+                            subject.average if detailed else None,
+                            subject.standard_deviation if detailed else None,
+                            subject.participants if detailed else None
+                        ))
+                        position += 1
+                ids.append(student_id)
+                student_id += 1
+                if len(student_rows) >= batch_size:
+                    flush()
+            flush()
+        # Refresh planner statistics, so that aggregate queries pick the subjects_lookup index.
+        self._connection.execute('ANALYZE subjects')
+        return ids
+
+    def load(self, directory: str, workers: Optional[int] = None) -> List[int]:
+        """
+        Load every transcript file of a directory. Unreadable files are reported to stderr and skipped.
+
+        Args:
+            directory (str): directory of transcript json files.
+            workers (Optional[int]): number of worker processes to parse files with.
+        """
+        def calculators() -> Iterator[SingleGradeCalculator]:
+            for result in load_files(list_data_files(directory), workers=workers):
+                if result.ok:
+                    yield result.calculator
+                else:
+                    print(f'> {result.path} 을 읽지 못했습니다 : {result.error}', file=sys.stderr)
+
+        return self.add(calculators())
+
+    # Hydration
+
+    def student_ids(self) -> List[int]:
+        return [row[0] for row in self._connection.execute('SELECT id FROM students ORDER BY id')]
+
+    def student(self, student_id: int) -> Student:
+        row: Optional[Tuple[str, int]] = self._connection.execute(
+            'SELECT name, grade FROM students WHERE id = ?', (student_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(student_id)
+        return Student(*row)
+
+    @staticmethod
+    def _subject(row: Tuple, grade: int, semester: int) -> Subject:
+        subject_type, category, achievement, name, units, rank, detailed, score, average, standard_deviation, participants = row
+        subject_type: Optional[SubjectType] = None if subject_type is None else _TYPES[subject_type]
+        category: Optional[SubjectCategory] = None if category is None else _CATEGORIES[category]
+        achievement: Optional[SubjectAchievementLevels] = None if achievement is None else _ACHIEVEMENTS[achievement]
+        if not detailed:
+            return Subject(subject_type, category, name, units, rank, achievement, grade, semester)
+        return DetailedSubject(
+            subject_type,
+            category,
+            name,
+            units,
+            rank,
+            achievement,
+            score,
+            average,
+            standard_deviation,
+            participants,
+            grade,
+            semester
+        )
+
+    def semesters(self, student_id: int) -> List[Semester]:
+        """Hydrate semesters of a student, in transcript order."""
+        semesters: List[Semester] = []
+        subjects: Dict[int, List[Subject]] = {}
+        for position, grade, semester in self._connection.execute(
+                'SELECT position, grade, semester FROM semesters WHERE student = ? ORDER BY position', (student_id,)
+        ):
+            subjects[position] = []
+            semesters.append(Semester(grade, semester, subjects[position]))
+        for semester_position, grade, semester, *row in self._connection.execute(
+                'SELECT semester_position, grade, semester, type, category, achievement, name, units, rank, detailed, '
+                'score, average, standard_deviation, participants FROM subjects WHERE student = ? ORDER BY position',
+                (student_id,)
+        ):
+            subjects[semester_position].append(self._subject(row, grade, semester))
+        return semesters
+
+    def calculator(self, student_id: int) -> StoredCalculator:
+        """Calculator of a single student. Only the student row is read until subjects are needed."""
+        return StoredCalculator(self, student_id, self.student(student_id))
+
+    def calculators(self) -> Iterator[StoredCalculator]:
+        for student_id, name, grade in self._connection.execute('SELECT id, name, grade FROM students ORDER BY id'):
+            yield StoredCalculator(self, student_id, Student(name, grade))
+
+    # Aggregates
+
+    @timed('aggregate')
+    def rank(
+            self,
+            student_id: int,
+            categories: Iterable[SubjectCategory],
+            semesters: Optional[Iterable[str]] = None
+    ) -> float:
+        """
+        Weighted rank of given categories, as one aggregate query over the subjects index.
+        Same as SingleGradeCalculator.rank; raises ZeroDivisionError if there are no relative subjects.
+
+        Args:
+            student_id (int): id of the student.
+            categories (Iterable[SubjectCategory]): categories to combine.
+            semesters (Optional[Iterable[str]]): semester infos (ex: '1학년 1학기') to combine. All semesters if None.
+        """
+        categories = tuple(categories)
+        query: str = 'SELECT SUM(rank * units), SUM(units) FROM subjects WHERE student = ? AND type = ?'
+        parameters: List[int] = [student_id, RELATIVE_CODE]
+        # Every category is the whole transcript, unknown (NULL) categories included.
+        if not covers_transcript(categories):
+            codes: List[int] = [CATEGORY_CODES[category.value] for category in categories]
+            query += f' AND category IN ({", ".join(["?"] * len(codes))})'
+            parameters.extend(codes)
+        if semesters is not None:
+            infos = set(semesters)
+            pairs: List[Tuple[int, int]] = [
+                (grade, semester) for grade, semester in self._connection.execute(
+                    'SELECT grade, semester FROM semesters WHERE student = ?', (student_id,)
+                ) if semester_info(grade, semester) in infos
+            ]
+            query += f' AND (grade, semester) IN (VALUES {", ".join(["(?, ?)"] * len(pairs)) or "(NULL, NULL)"})'
+            parameters.extend(value for pair in pairs for value in pair)
+        total, units = self._connection.execute(query, parameters).fetchone()
+        if not units:
+            raise ZeroDivisionError('no relative subjects in given categories')
+        return total / units
+
+    def category_sums(self, student_id: Optional[int] = None) -> Dict[int, Dict[Optional[str], Tuple[int, int]]]:
+        """
+        (rank×units, units) sums of relative subjects per category value (None if unknown), by student id, in one query.
+
+        Args:
+            student_id (Optional[int]): a single student. Every student if None.
+        """
+        query: str = 'SELECT student, category, SUM(rank * units), SUM(units) FROM subjects WHERE '
+        parameters: Tuple[int, ...] = (RELATIVE_CODE,)
+        if student_id is not None:
+            query += 'student = ? AND '
+            parameters = (student_id, RELATIVE_CODE)
+        query += 'type = ? GROUP BY student, category'
+        sums: Dict[int, Dict[Optional[str], Tuple[int, int]]] = {}
+        for student, category, total, units in self._connection.execute(query, parameters):
+            sums.setdefault(student, {})[None if category is None else _CATEGORIES[category].value] = (total, units)
+        return sums
+
+    @staticmethod
+    def _combine(sums: Dict[Optional[str], Tuple[int, int]], categories: Sequence[SubjectCategory]) -> Optional[float]:
+        total: int = 0
+        units: int = 0
+        for key in category_keys(categories):
+            category_total, category_units = sums.get(key, (0, 0))
+            total += category_total
+            units += category_units
+        return total / units if units else None
+
+    def combination_ranks(
+            self,
+            student_id: int,
+            combinations: Optional[Dict[str, Tuple[SubjectCategory, ...]]] = None
+    ) -> Dict[str, Optional[float]]:
+        """
+        Weighted rank of every combination. None if combination has no relative subjects.
+
+        Args:
+            student_id (int): id of the student.
+            combinations (Optional[Dict[str, Tuple[SubjectCategory, ...]]]): combinations by name. CATEGORY_COMBINATIONS if None.
+        """
+        sums: Dict[Optional[str], Tuple[int, int]] = self.category_sums(student_id).get(student_id, {})
+        return {
+            name: self._combine(sums, categories)
+            for name, categories in (CATEGORY_COMBINATIONS if combinations is None else combinations).items()
+        }
+
+    def category_ranks(self, student_id: int) -> Dict[str, Optional[float]]:
+        """Weighted rank of each single category (영역 내신 총점). None if category has no relative subjects."""
+        sums: Dict[Optional[str], Tuple[int, int]] = self.category_sums(student_id).get(student_id, {})
+        return {category.value: self._combine(sums, (category,)) for category in SubjectCategory}
+
+    @timed('aggregate')
+    def ranks(self, combinations: Optional[Dict[str, Tuple[SubjectCategory, ...]]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        Weighted rank of every combination for every student, in student id order, from a single grouped query.
+
+        Args:
+            combinations (Optional[Dict[str, Tuple[SubjectCategory, ...]]]): combinations by name. CATEGORY_COMBINATIONS if None.
+        """
+        combinations = CATEGORY_COMBINATIONS if combinations is None else combinations
+        sums: Dict[int, Dict[Optional[str], Tuple[int, int]]] = self.category_sums()
+        student_ids: List[int] = self.student_ids()
+        return {
+            name: [self._combine(sums.get(student_id, {}), categories) for student_id in student_ids]
+            for name, categories in combinations.items()
+        }
+
+    def category_grades(self, student_id: int, file: Optional[TextIO] = None) -> None:
+        """
+        Print category_grades report of a student. Totals come from the store; subjects are hydrated for listing.
+
+        Args:
+            student_id (int): id of the student.
+            file (Optional[TextIO]): file-like target. sys.stdout if None.
+        """
+        ReportRenderer(CATEGORY_COMBINATIONS).write((self.calculator(student_id),), file)
+
+
+if __name__ == "__main__":
+    # python sqlite_store.py <data directory> <database file>
+    with SqliteStore(sys.argv[2]) as store:
+        added: List[int] = store.load(sys.argv[1])
+        print(f'> {len(added)} 명의 성적을 {sys.argv[2]} ({os.path.getsize(sys.argv[2]):,} bytes) 에 저장했습니다.')
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import sys
+from typing import Iterator, TextIO, Tuple
+
+from calc import SingleGradeCalculator
+from constants import JSON
+
+__all__ = (
+    "iter_records",
+    "stream_results",
+    "process_record"
+)
+
+
+def iter_records(stream: TextIO) -> Iterator[Tuple[int, str]]:
+    """
+    Iterate over non-empty lines of newline-delimited json stream, one student per line.
+    Lines are read lazily, so only a single record is held in memory at once.
+
+    Args:
+        stream (TextIO): stream to read records from.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if line:
+            yield line_number, line
+
+
+def process_record(line_number: int, line: str) -> JSON:
+    """
+    Parse a single record and compute its results.
+
+    Args:
+        line_number (int): line number of the record in the stream.
+        line (str): raw json text of the record.
+    """
+    calculator: SingleGradeCalculator = SingleGradeCalculator(json.loads(line))
+    result: JSON = {'line': line_number}
+    result.update(calculator.student.toJson())
+    result.update(calculator.combination_ranks())
+    result.update(calculator.category_ranks())
+    return result
+
+
+def stream_results(stream: TextIO, output: TextIO, flush_every: int = 1) -> Tuple[int, int]:
+    """
+    Compute results of every record in stream and write them to output as newline-delimited json.
+    Records are emitted as soon as they are computed; a broken record is reported as an error line
+    and does not stop the stream.
+
+    Args:
+        stream (TextIO): newline-delimited json stream to read.
+        output (TextIO): stream to write results.
+        flush_every (int): flush output after this many records.
+
+    Returns:
+        Tuple[int, int]: number of processed records and number of failed records.
+    """
+    processed: int = 0
+    failed: int = 0
+    for line_number, line in iter_records(stream):
+        try:
+            result: JSON = process_record(line_number, line)
+        except Exception as e:
+            result = {'line': line_number, 'error': f'{type(e).__name__}: {e}'}
+            failed += 1
+        output.write(json.dumps(result, ensure_ascii=False))
+        output.write('\n')
+        processed += 1
+        if processed % flush_every == 0:
+            output.flush()
+    output.flush()
+    return processed, failed
+
+
+if __name__ == "__main__":
+    # python streaming.py [file.ndjson | -]
+    if len(sys.argv) > 1 and sys.argv[1] != '-':
+        with open(sys.argv[1], mode='rt', encoding='utf-8') as f:
+            stream_results(f, sys.stdout)
+    else:
+        stream_results(sys.stdin, sys.stdout)
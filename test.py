@@ -1,7 +1,45 @@
+import asyncio
+import csv
+import gc
+import io
+import itertools
+import json
+import math
+import os
+import socket
+import struct
+import time
+import warnings
 from datetime import datetime
-from typing import NoReturn, Optional, List
+from typing import NoReturn, Optional, List, Tuple
 
-from extend_builtins import PyOptional
+import numpy as np
+import pytest
+
+from admissions import AdmissionsScorer, UniversityFormula
+from batch import BatchGradeCalculator, SubjectStatistics, semester_code
+from benchmark import compare
+from binary_store import TranscriptStore, pack
+from calc import CATEGORY_COMBINATIONS, SingleGradeCalculator, covers_transcript
+from cli import write_results
+from cohort import COHORT_COMBINATIONS, Cohort
+from constants import SemesterKeys, StudentKeys, SubjectKeys
+from extend_builtins import NoneValueException, NoSuchElementException, PyOptional, Stream
+from formula import FormulaError, FormulaSet, combination_formula, compile_formula
+from generator import generate_transcripts
+from instrumentation import Metrics, metrics
+from loader import LoadResult, load_files
+from main import batch_viewer, menu_combinations
+from models import Semester, Student, SubjectCategory, SubjectType, semester_info
+from parse_cache import ParseCache
+from projection import StudentModel, model_student, project, project_cohort, rank_probabilities
+from report import ReportRenderer
+from server import GradeService
+from simulation import Simulation
+from sqlite_store import SqliteStore
+from streaming import stream_results
+from transcript_parser import parse_transcript
+from watch import Watcher
 
 
 def thrower() -> NoReturn:
@@ -41,7 +79,686 @@ def getMemberFromOptionalOrder(order: Optional[Order]) -> Member:
     return PyOptional[Order].ofNullable(order).orElseThrow(thrower).who
 
 
-member = Member(id=1030407, name='James')
-order = Order(when=datetime.now(), who=member, cost=5000)
-print(getMemberFromOptionalOrder(order))
-print(getMemberFromOptionalOrder(None))
+# Behaviour checks. Run with : python -m pytest -q test.py
+
+def transcripts(count: int = 20, seed: int = 7) -> List[dict]:
+    return list(generate_transcripts(count, seed))
+
+
+def test_simulation_lazy_matches_eager() -> None:
+    for data in transcripts():
+        eager: Simulation = Simulation(SingleGradeCalculator(data))
+        lazy: Simulation = Simulation(SingleGradeCalculator(data, lazy=True))
+        assert lazy.combination_ranks() == eager.combination_ranks()
+        assert lazy.category_ranks() == eager.category_ranks()
+        assert None not in eager.combination_ranks().values()
+
+
+def _relative_row(data: dict) -> dict:
+    return next(
+        row for semester in data[SemesterKeys.key] for row in semester[SemesterKeys.SUBJECT_SCORES]
+        if row[SubjectKeys.TYPE] == SubjectType.RELATIVE.value
+    )
+
+
+def _uncategorized(count: int = 5) -> List[dict]:
+    """Transcripts whose first relative subject has a category the models don't recognise."""
+    data: List[dict] = transcripts(count, seed=11)
+    for datum in data:
+        _relative_row(datum)[SubjectKeys.CATEGORY] = '미술'
+    return data
+
+
+def _combination_rank(calculator: SingleGradeCalculator, categories: Tuple[SubjectCategory, ...]) -> float:
+    """Baseline figure : get_rank over every subject for '종합 내신', over subjects of the categories otherwise."""
+    if covers_transcript(categories):
+        return SingleGradeCalculator.get_rank(calculator.subjects)
+    return SingleGradeCalculator.get_rank(subject for subject in calculator.subjects if subject.category in categories)
+
+
+def test_batch_matches_models() -> None:
+    data: List[dict] = transcripts() + _uncategorized()
+    batch: BatchGradeCalculator = BatchGradeCalculator.fromJson(data)
+    ranks = batch.ranks(CATEGORY_COMBINATIONS)
+    for index, datum in enumerate(data):
+        calculator: SingleGradeCalculator = SingleGradeCalculator(datum)
+        for combination, categories in CATEGORY_COMBINATIONS.items():
+            expected: float = _combination_rank(calculator, categories)
+            assert ranks[combination][index] == expected
+            assert batch.get_rank(categories)[index] == expected
+    from_models = BatchGradeCalculator.fromCalculators(map(SingleGradeCalculator, data)).ranks(CATEGORY_COMBINATIONS)
+    for combination, column in ranks.items():
+        assert from_models[combination].tolist() == column.tolist()
+
+
+def test_batch_rejects_rows_models_reject() -> None:
+    no_rank, bad_achievement = transcripts(2)
+    _relative_row(no_rank)[SubjectKeys.RANK] = None
+    _relative_row(bad_achievement)[SubjectKeys.ACHIEVEMENT_LEVEL] = 'Z'
+    for datum in (no_rank, bad_achievement):
+        with pytest.raises(Exception):
+            SingleGradeCalculator(datum)
+        with pytest.raises(ValueError):
+            BatchGradeCalculator.fromJson([datum])
+
+
+def _write_transcripts(directory, data: List[dict]) -> List[str]:
+    paths: List[str] = []
+    for index, datum in enumerate(data):
+        path = directory / f'{index}.json'
+        path.write_text(json.dumps(datum, ensure_ascii=False), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def test_cli_same_results_with_and_without_cache(tmp_path) -> None:
+    data: List[dict] = transcripts(4)
+    _relative_row(data[1])[SubjectKeys.RANK] = None
+    paths: List[str] = _write_transcripts(tmp_path, data)
+    outputs: List[str] = []
+    for cache in (None, ParseCache(str(tmp_path / 'cache'))):
+        output: io.StringIO = io.StringIO()
+        assert write_results(paths, CATEGORY_COMBINATIONS, output, workers=1, cache=cache) == (3, 1)
+        outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1]
+
+
+def test_parse_cache_keeps_identity_of_parsed_bytes(tmp_path) -> None:
+    old, new = transcripts(2)
+    path: str = _write_transcripts(tmp_path, [old])[0]
+    cache: ParseCache = ParseCache(str(tmp_path / 'cache'))
+    data, identity = ParseCache.read(path)
+    # File is rewritten between the read and put : the old result must not be trusted for the new file.
+    with open(path, mode='wt', encoding='utf-8') as f:
+        json.dump(new, f, ensure_ascii=False)
+    os.utime(path, ns=(identity[0] + 10 ** 9, identity[0] + 10 ** 9))
+    cache.put(path, SingleGradeCalculator.parse_data(json.loads(data)), identity)
+    assert cache.get(path) is None
+    assert cache.load(path).student.name == new[StudentKeys.key][StudentKeys.NAME]
+    assert cache.get(path)[0].name == new[StudentKeys.key][StudentKeys.NAME]
+
+
+def test_parse_cache_drops_other_versions_and_broken_entries(tmp_path) -> None:
+    paths: List[str] = _write_transcripts(tmp_path, transcripts(2))
+    directory: str = str(tmp_path / 'cache')
+    with ParseCache(directory) as cache:
+        for path in paths:
+            cache.load(path)
+    with ParseCache(directory) as cache:
+        assert len(cache) == 2 and cache.get(paths[0]) is not None
+        # Pickle of a model class that no longer exists raises AttributeError on load.
+        with open(cache._index[os.path.abspath(paths[1])]['file'], mode='wb') as f:
+            f.write(b'cmodels\nNoSuchSubject\n.')
+        assert cache.get(paths[1]) is None and len(cache) == 1
+    index_path: str = os.path.join(directory, ParseCache.INDEX_FILE)
+    with open(index_path, mode='rt', encoding='utf-8') as f:
+        index = json.load(f)
+    index['version'] = ParseCache.VERSION - 1
+    with open(index_path, mode='wt', encoding='utf-8') as f:
+        json.dump(index, f)
+    cache = ParseCache(directory)
+    assert len(cache) == 0 and cache.size == 0
+    assert not [name for name in os.listdir(directory) if name.endswith('.pickle')]
+
+
+def test_parse_cache_evicts_least_recently_used(tmp_path) -> None:
+    paths: List[str] = _write_transcripts(tmp_path, transcripts(4))
+    directory: str = str(tmp_path / 'cache')
+    with ParseCache(directory) as cache:
+        for path in paths[:3]:
+            cache.load(path)
+        size: int = cache.size
+    cache = ParseCache(directory, max_bytes=size)
+    assert cache.get(paths[0]) is not None
+    cache.load(paths[3])
+    assert cache.evictions >= 1
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[0]) is not None
+    assert cache.size <= size
+
+
+def test_report_renderer_formats() -> None:
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in transcripts(3)]
+    text: str = ReportRenderer(CATEGORY_COMBINATIONS).render(calculators[0])
+    for subject in calculators[0].subjects:
+        assert subject.pretty() in text
+    for combination, rank in calculators[0].combination_ranks().items():
+        assert f'> {combination} 총점 : {rank}\n' in text
+    rows: List[List[str]] = list(csv.reader(io.StringIO(ReportRenderer(CATEGORY_COMBINATIONS, 'csv').render_many(calculators))))
+    assert len(rows) == 1 + len(calculators)
+    for row, calculator in zip(rows[1:], calculators):
+        assert [float(value) for value in row[2:2 + len(CATEGORY_COMBINATIONS)]] == list(calculator.combination_ranks().values())
+    markdown: str = ReportRenderer(CATEGORY_COMBINATIONS, 'markdown').render(calculators[0])
+    assert markdown.startswith(f'## {calculators[0].student.name}')
+
+
+def test_optional_delegates_and_empty_is_attribute_error() -> None:
+    member: Member = Member(id=1, name='James')
+    present: PyOptional[Member] = PyOptional[Member].of(member)
+    assert present.name == 'James' and str(present.get()) == str(member)
+    assert PyOptional.ofNullable([3, 1, 2]).index(1) == 1
+    assert present.map(lambda item: item.name).orElse(None) == 'James'
+    assert present.filter(lambda item: item.name == 'Tom').isNone
+    assert present.flat_map(lambda item: PyOptional.of(item.id)).get() == (1,)
+    empty: PyOptional = PyOptional.empty()
+    assert empty is PyOptional.ofNullable(None)
+    assert not hasattr(empty, 'name')
+    assert getattr(empty, 'name', 'default') == 'default'
+    with pytest.raises(NoneValueException):
+        empty.name
+    with pytest.raises(NoSuchElementException):
+        empty.get()
+    with pytest.raises(TypeError):
+        PyOptional.of(None)
+    assert empty.map(str).isNone and empty.orElseGet(lambda: 5) == 5
+
+
+def test_cli_csv_quotes_formula_names(tmp_path) -> None:
+    paths: List[str] = _write_transcripts(tmp_path, transcripts(2))
+    names: List[str] = ['국어, 수학', '"영어"']
+    output: io.StringIO = io.StringIO()
+    formulas: FormulaSet = FormulaSet({name: compile_formula('avg(국어)') for name in names})
+    write_results(paths, {}, output, workers=1, formulas=formulas)
+    rows: List[List[str]] = list(csv.reader(io.StringIO(output.getvalue())))
+    assert rows[0] == ['file', '이름', '학년'] + names
+    assert all(len(row) == len(rows[0]) for row in rows)
+
+
+def _standings(cohort: Cohort, student_ids: List[int]) -> List[list]:
+    return [
+        [None if standing is None else (standing.rank, standing.position, standing.total) for standing in (
+            cohort.standing(student_id, combination) for combination in COHORT_COMBINATIONS
+        )]
+        for student_id in student_ids
+    ]
+
+
+def test_cohort_replace_and_remove_match_fresh_cohort() -> None:
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in transcripts(12)]
+    replacement: SingleGradeCalculator = SingleGradeCalculator(transcripts(1, seed=99)[0])
+    cohort: Cohort = Cohort(calculators)
+    before: List[list] = _standings(cohort, list(range(12)))
+    moved = cohort.replace(3, replacement)
+    moved |= cohort.remove(7)
+    assert len(cohort) == 11
+    with pytest.raises(KeyError):
+        cohort.calculator(7)
+    kept: List[int] = [student_id for student_id in range(12) if student_id != 7]
+    fresh: Cohort = Cohort([replacement if student_id == 3 else calculators[student_id] for student_id in kept])
+    after: List[list] = _standings(cohort, kept)
+    assert after == _standings(fresh, list(range(11)))
+    # Every student whose standing changed was reported as moved.
+    changed = {student_id for student_id, old, new in zip(kept, (before[i] for i in kept), after) if old != new}
+    assert changed - {3} <= moved
+
+
+def test_watcher_update_matches_fresh_load(tmp_path) -> None:
+    paths: List[str] = _write_transcripts(tmp_path, transcripts(6))
+    output: io.StringIO = io.StringIO()
+    watcher: Watcher = Watcher(str(tmp_path), output)
+    assert watcher.load(workers=1) == 6
+    os.remove(paths[0])
+    with open(paths[1], mode='wt', encoding='utf-8') as f:
+        json.dump(transcripts(1, seed=42)[0], f, ensure_ascii=False)
+    added = tmp_path / 'added.json'
+    added.write_text(json.dumps(transcripts(1, seed=43)[0], ensure_ascii=False), encoding='utf-8')
+    assert watcher.update({paths[0], paths[1], str(added)}) > 0
+    fresh: Watcher = Watcher(str(tmp_path), io.StringIO())
+    fresh.load(workers=1)
+    assert watcher._rows == fresh._rows
+    rows: List[List[str]] = list(csv.reader(io.StringIO(output.getvalue())))
+    assert rows[0][:3] == ['file', '이름', '학년'] and [paths[0]] in rows
+    # A half written file keeps its last good row.
+    with open(paths[2], mode='wt', encoding='utf-8') as f:
+        f.write('{"student": ')
+    assert watcher.update({paths[2]}) == 0
+    assert watcher._rows == fresh._rows
+
+
+def test_formulas_match_calculator_ranks() -> None:
+    data: List[dict] = transcripts()
+    batch: BatchGradeCalculator = BatchGradeCalculator.fromJson(data)
+    values = FormulaSet({
+        **{combination: combination_formula(categories) for combination, categories in CATEGORY_COMBINATIONS.items()},
+        '사회 값': 'avg(사회(역사/도덕포함))',
+        '1학년 1학기': 'avg(학년=1, 학기=1)'
+    }).evaluate(batch)
+    for index, datum in enumerate(data):
+        calculator: SingleGradeCalculator = SingleGradeCalculator(datum)
+        for combination, rank in calculator.combination_ranks().items():
+            assert math.isclose(values[combination][index], rank)
+        assert math.isclose(values['사회 값'][index], calculator.rank((SubjectCategory.SOCIOLOGY,)))
+        assert math.isclose(values['1학년 1학기'][index], calculator.rank(SubjectCategory, ('1학년 1학기',)))
+    assert compile_formula('best(3, 국어)') is compile_formula('best(3, 국어)')
+
+
+@pytest.mark.parametrize('source', ['avg(학기=3)', 'avg(학년=4)', 'avg(없는과목)', 'avg(국어', '2 * 국어', 'best(0, 국어)'])
+def test_formula_rejects_invalid_source(source: str) -> None:
+    with pytest.raises(FormulaError):
+        compile_formula(source)
+
+
+def test_batch_category_and_semester_ranks() -> None:
+    data: List[dict] = transcripts()
+    batch: BatchGradeCalculator = BatchGradeCalculator.fromJson(data)
+    category_ranks = batch.category_ranks()
+    first_semester = batch.get_rank(SubjectCategory, (semester_code(1, 1),))
+    for index, datum in enumerate(data):
+        calculator: SingleGradeCalculator = SingleGradeCalculator(datum)
+        for category, rank in calculator.category_ranks().items():
+            assert math.isnan(category_ranks[category][index]) if rank is None else math.isclose(category_ranks[category][index], rank)
+        assert math.isclose(first_semester[index], calculator.rank(SubjectCategory, ('1학년 1학기',)))
+
+
+def test_load_files_keeps_order_and_captures_errors(tmp_path) -> None:
+    paths: List[str] = _write_transcripts(tmp_path, transcripts(6))
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{', encoding='utf-8')
+    paths.insert(2, str(broken))
+    serial: List[LoadResult] = list(load_files(paths, workers=1))
+    pooled: List[LoadResult] = list(load_files(paths, workers=2, chunksize=2))
+    assert [result.path for result in pooled] == paths
+    assert [result.ok for result in pooled] == [path != str(broken) for path in paths]
+    for one, other in zip(serial, pooled):
+        if one.ok:
+            assert one.calculator.combination_ranks() == other.calculator.combination_ranks()
+
+
+def test_stream_results_reports_broken_records() -> None:
+    data: List[dict] = transcripts(3)
+    lines: List[str] = [json.dumps(datum, ensure_ascii=False) for datum in data]
+    lines.insert(1, '{"student": ')
+    output: io.StringIO = io.StringIO()
+    assert stream_results(io.StringIO('\n'.join(lines) + '\n\n'), output) == (4, 1)
+    results: List[dict] = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [result['line'] for result in results] == [1, 2, 3, 4]
+    assert 'error' in results[1]
+    for result, datum in zip(results[:1] + results[2:], data):
+        assert result['종합 내신'] == SingleGradeCalculator(datum).combination_ranks()['종합 내신']
+
+
+def test_index_rank_matches_get_rank_over_subjects() -> None:
+    for datum in transcripts() + _uncategorized():
+        calculator: SingleGradeCalculator = SingleGradeCalculator(datum)
+        lazy: SingleGradeCalculator = SingleGradeCalculator(datum, lazy=True)
+        for categories in CATEGORY_COMBINATIONS.values():
+            subjects = calculator.combination_subjects(categories)
+            # Combinations of every category ('종합 내신') are the whole transcript, unrecognised categories included.
+            expected: float = SingleGradeCalculator.get_rank(calculator.subjects if covers_transcript(categories) else subjects)
+            assert calculator.rank(categories) == lazy.rank(categories) == expected
+            assert sorted(map(id, subjects)) == sorted(
+                id(subject) for subject in calculator.subjects if subject.category in categories
+            )
+        overall: float = SingleGradeCalculator.get_rank(calculator.subjects)
+        assert calculator.combination_ranks()['종합 내신'] == overall
+        assert ReportRenderer(CATEGORY_COMBINATIONS).render(calculator).startswith(f'> 종합 내신 총점 : {overall}\n')
+        semester: str = '1학년 1학기'
+        assert math.isclose(
+            calculator.rank(SubjectCategory, (semester,)),
+            SingleGradeCalculator.get_rank(subject for subject in calculator.subjects if subject.semesterInfo == semester)
+        )
+
+
+def test_single_pass_parser_matches_model_parser() -> None:
+    for datum in transcripts():
+        student, semesters = parse_transcript(datum)
+        assert student.toJson() == Student.fromJson(datum[StudentKeys.key]).toJson()
+        assert [semester.toJson() for semester in semesters] == [
+            Semester.fromJson(semester).toJson() for semester in datum[SemesterKeys.key]
+        ]
+        assert [type(subject) for semester in semesters for subject in semester.subjects] == [
+            type(subject) for semester in datum[SemesterKeys.key] for subject in Semester.fromJson(semester).subjects
+        ]
+
+
+def test_models_use_slots_and_share_semester_info() -> None:
+    for datum in transcripts(3):
+        calculator: SingleGradeCalculator = SingleGradeCalculator(datum)
+        assert calculator.toJson() == datum
+        for semester in calculator.semesters:
+            assert not hasattr(semester, '__dict__')
+            for subject in semester.subjects:
+                assert not hasattr(subject, '__dict__')
+                assert subject.semesterInfo is semester_info(subject.grade, subject.semester)
+
+
+def test_binary_store_round_trip(tmp_path) -> None:
+    data: List[dict] = transcripts()
+    path: str = str(tmp_path / 'store.hgcb')
+    assert pack(path, map(SingleGradeCalculator, data)) == len(data)
+    with TranscriptStore(path) as store:
+        assert len(store) == len(data)
+        assert [store.toJson(index) for index in range(len(store))] == data
+        expected = BatchGradeCalculator.fromJson(data).ranks(CATEGORY_COMBINATIONS)
+        for combination, column in store.toBatch().ranks(CATEGORY_COMBINATIONS).items():
+            assert column.tolist() == expected[combination].tolist()
+
+
+def test_binary_store_closes_file_when_opening_fails(tmp_path) -> None:
+    path = tmp_path / 'store.hgcb'
+    pack(str(path), map(SingleGradeCalculator, transcripts(3)))
+    valid: bytes = path.read_bytes()
+    broken = {
+        'empty.hgcb': b'',
+        'magic.hgcb': b'XXXX' + valid[4:],
+        'version.hgcb': valid[:4] + (99).to_bytes(4, 'little') + valid[8:],
+        'truncated.hgcb': valid[:20]
+    }
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        for name, content in broken.items():
+            (tmp_path / name).write_bytes(content)
+            with pytest.raises((ValueError, struct.error)):
+                TranscriptStore(str(tmp_path / name))
+        gc.collect()
+    # A file left open is only closed by the garbage collector, which warns about it.
+    assert not [warning for warning in caught if issubclass(warning.category, ResourceWarning)]
+    with TranscriptStore(str(path)) as store:
+        assert len(store) == 3
+
+
+def test_cohort_queries_match_sorting() -> None:
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in transcripts(15)]
+    cohort: Cohort = Cohort(calculators)
+    ranks: List[float] = [calculator.rank(SubjectCategory) for calculator in calculators]
+    ordered: List[float] = sorted(ranks)
+    assert [rank for _, rank in cohort.top('종합 내신', 5)] == ordered[:5]
+    for student_id, rank in enumerate(ranks):
+        standing = cohort.standing(student_id, '종합 내신')
+        assert standing.position == ordered.index(rank) + 1 and standing.total == len(ranks)
+    assert cohort.locate(0.5, '종합 내신').position == 1
+    categories = (SubjectCategory.MATH, SubjectCategory.SCIENCE)
+    assert [rank for _, rank in cohort.top_by(categories, 3)] == sorted(
+        calculator.rank(categories) for calculator in calculators
+    )[:3]
+
+
+def test_batch_viewer_prints_one_row_per_student(capsys) -> None:
+    calculators: Tuple[SingleGradeCalculator, ...] = tuple(SingleGradeCalculator(datum) for datum in transcripts(4))
+    batch_viewer(calculators, '4')
+    lines: List[str] = capsys.readouterr().out.splitlines()
+    combinations = menu_combinations('4')
+    assert lines[0] == ' | '.join(('이름', '학년') + tuple(combinations))
+    for line, calculator in zip(lines[1:], calculators):
+        cells: List[str] = line.split(' | ')
+        assert cells[0] == calculator.student.name
+        assert [float(cell) for cell in cells[2:]] == [
+            round(calculator.rank(categories), 4) for categories in combinations.values()
+        ]
+    assert len(lines) == 1 + len(calculators)
+
+
+def test_grade_service_batches_concurrent_requests() -> None:
+    data: List[dict] = transcripts(5)
+    data[2] = {'student': {}}
+
+    async def post(port: int, datum: dict) -> Tuple[int, dict]:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        body: bytes = json.dumps(datum, ensure_ascii=False).encode('utf-8')
+        writer.write(b'POST /grades HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+        response: bytes = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(payload)
+
+    async def run() -> List[Tuple[int, dict]]:
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port: int = probe.getsockname()[1]
+        server: asyncio.Task = asyncio.create_task(service.serve('127.0.0.1', port))
+        await asyncio.sleep(0.1)
+        try:
+            return await asyncio.gather(*(post(port, datum) for datum in data))
+        finally:
+            server.cancel()
+
+    service: GradeService = GradeService(batch_window=0.05)
+    responses: List[Tuple[int, dict]] = asyncio.run(run())
+    assert [status for status, _ in responses] == [200, 200, 400, 200, 200]
+    for (_, result), datum in zip(responses, data):
+        if 'error' not in result:
+            assert result['종합 내신'] == pytest.approx(SingleGradeCalculator(datum).combination_ranks()['종합 내신'])
+    assert service.requests == 5 and service.batches < 5
+
+
+def test_generator_is_reproducible_and_benchmark_flags_regressions() -> None:
+    assert transcripts(5, seed=3) == transcripts(5, seed=3) != transcripts(5, seed=4)
+    for datum in transcripts(5, seed=3):
+        SingleGradeCalculator(datum).combination_ranks()
+    baseline = {'100': {'parse': {'seconds': 1.0, 'throughput': 1000.0, 'peak_bytes': 1000}}}
+    assert compare({'100': {'parse': {'seconds': 1.0, 'throughput': 900.0, 'peak_bytes': 1100}}}, baseline) == []
+    regressions: List[str] = compare({'100': {'parse': {'seconds': 2.0, 'throughput': 500.0, 'peak_bytes': 2000}}}, baseline)
+    assert len(regressions) == 2 and all(regression.startswith('[100] parse') for regression in regressions)
+
+
+def test_metrics_record_exclusive_phase_times_and_counters() -> None:
+    registry: Metrics = Metrics()
+    with registry.timer('outer'):
+        pass
+    assert registry.toJson()['phases'] == {}
+    registry.enable()
+    with registry.timer('outer'):
+        with registry.timer('inner'):
+            time.sleep(0.02)
+    phases = registry.toJson()['phases']
+    assert phases['inner']['seconds'] >= 0.02 > phases['outer']['seconds']
+    assert phases['outer']['calls'] == phases['inner']['calls'] == 1
+    metrics.reset()
+    metrics.enable()
+    try:
+        for datum in transcripts(3):
+            SingleGradeCalculator(datum)
+        counters = metrics.toJson()['counters']
+        assert counters['students'] == 3
+        assert '# TYPE grade_calculator_students_total counter' in metrics.toPrometheus()
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+
+def test_lazy_calculator_matches_eager() -> None:
+    for datum in transcripts():
+        eager: SingleGradeCalculator = SingleGradeCalculator(datum)
+        lazy: SingleGradeCalculator = SingleGradeCalculator(datum, lazy=True)
+        assert lazy.math_subjects and sum(semester.materialized for semester in lazy.semesters) == len(lazy.math_subjects)
+        assert lazy.combination_ranks() == eager.combination_ranks()
+        assert lazy.category_ranks() == eager.category_ranks()
+        assert ReportRenderer(CATEGORY_COMBINATIONS).render(lazy) == ReportRenderer(CATEGORY_COMBINATIONS).render(eager)
+        assert lazy.toJson() == datum
+
+
+def test_simulation_changes_match_recomputed_calculator() -> None:
+    calculator: SingleGradeCalculator = SingleGradeCalculator(transcripts(1)[0])
+    simulation: Simulation = Simulation(calculator)
+    original = simulation.combination_ranks()
+    relative = [subject for subject in simulation.subjects if subject.type == SubjectType.RELATIVE][:3]
+    scenario = [(subject, 1) for subject in relative]
+    evaluated = simulation.evaluate([scenario])[0]
+    assert simulation.combination_ranks() == original
+    with simulation.scenario():
+        for subject, rank in scenario:
+            simulation.set_rank(subject, rank)
+        simulation.remove(simulation.subjects[-1])
+        simulation.add(relative[0])
+        changed: SingleGradeCalculator = simulation.toCalculator()
+        assert simulation.combination_ranks() == pytest.approx(changed.combination_ranks())
+    assert simulation.combination_ranks() == original
+    for subject, rank in scenario:
+        simulation.set_rank(subject, rank)
+    assert simulation.combination_ranks() == pytest.approx(evaluated)
+    simulation.rollback()
+    assert simulation.combination_ranks() == original and len(simulation.subjects) == len(calculator.subjects)
+
+
+def test_projection_is_reproducible_per_student() -> None:
+    assert rank_probabilities(0.0, 1.0).sum() == pytest.approx(1.0)
+    assert rank_probabilities(2.0, 0.3).argmax() == 0 and rank_probabilities(-2.0, 0.3).argmax() == 8
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in transcripts(4)]
+    cohort = project_cohort(calculators, draws=2000, seed=5, workers=1, chunksize=3)
+    pooled = project_cohort(calculators, draws=2000, seed=5, workers=2, chunksize=1)
+    for index, calculator in enumerate(calculators):
+        single = project(calculator, draws=2000, seed=5, index=index)
+        assert single.toJson() == cohort[index].toJson() == pooled[index].toJson()
+        distribution = single.combinations['종합 내신']
+        assert 1 <= distribution.percentiles[5] <= distribution.mean <= distribution.percentiles[95] <= 9
+        if not single.future_semesters:
+            assert distribution.mean == pytest.approx(calculator.rank(SubjectCategory))
+
+
+def test_subject_statistics_match_per_subject_math() -> None:
+    data: List[dict] = transcripts(6)
+    statistics: SubjectStatistics = SubjectStatistics.fromJson(data)
+    parsed = SubjectStatistics.fromCalculators(SingleGradeCalculator(datum) for datum in data)
+    assert len(statistics) == len(parsed) == 6
+    assert statistics.z_scores.tolist() == pytest.approx(parsed.z_scores.tolist(), nan_ok=True)
+    row: int = 0
+    for student_id, datum in enumerate(data):
+        assert statistics.rows(student_id).start == row
+        for semester in datum[SemesterKeys.key]:
+            for subject in semester[SemesterKeys.SUBJECT_SCORES]:
+                z: float = statistics.z_scores[row]
+                if SubjectKeys.SCORE not in subject:
+                    assert math.isnan(z) and math.isnan(statistics.positions[row])
+                elif subject[SubjectKeys.STANDARD_DEVIATION]:
+                    expected: float = (subject[SubjectKeys.SCORE] - subject[SubjectKeys.AVERAGE]) / subject[SubjectKeys.STANDARD_DEVIATION]
+                    assert z == pytest.approx(expected)
+                    assert statistics.percentiles[row] == pytest.approx(50 * (1 + math.erf(expected / math.sqrt(2))), abs=1e-4)
+                    assert 1 <= statistics.positions[row] <= max(subject[SubjectKeys.PARTICIPANTS], 1)
+                row += 1
+        assert statistics.rows(student_id).stop == row
+    flat = SubjectStatistics([Student('a', 1)], [0, 0], [0, 0], [0, 0], [(80, 80, 0, 10), (90, 80, 0, 10)])
+    assert flat.z_scores[0] == 0 and math.isnan(flat.z_scores[1])
+
+
+def _formula_score(calculator: SingleGradeCalculator, formula: UniversityFormula) -> float:
+    score: float = 0.0
+    for group, weight in zip(formula.groups, formula.weights):
+        subjects = [
+            subject for subject in calculator.subjects
+            if subject.type == SubjectType.RELATIVE and subject.category in group
+        ]
+        if not subjects:
+            return math.nan
+        units: int = sum(subject.units for subject in subjects)
+        score += weight * sum(subject.units * formula.points[subject.rank - 1] for subject in subjects) / units
+    return score
+
+
+def test_admissions_scores_match_per_student_formula() -> None:
+    points: List[float] = [100, 96, 90, 80, 60, 40, 20, 10, 0]
+    formulas: List[UniversityFormula] = [
+        UniversityFormula.fromJson('가대학', {'weights': {'국어': 0.3, '수학|과학': 0.4, '영어': 0.3}, 'points': points}),
+        UniversityFormula.fromJson('나대학', {'weights': {'사회': 1}, 'points': points[::-1]}),
+        UniversityFormula.fromJson('다대학', {'weights': {'기타': 1}, 'points': points})
+    ]
+    assert UniversityFormula.fromJson('가대학', formulas[0].toJson()).toJson() == formulas[0].toJson()
+    with pytest.raises(ValueError):
+        UniversityFormula.fromJson('라대학', {'weights': {'국사': 1}, 'points': points})
+    with pytest.raises(ValueError):
+        UniversityFormula('라대학', [(SubjectCategory.KOREAN,)], [1], points[:5])
+    data: List[dict] = transcripts()
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in data]
+    scorer: AdmissionsScorer = AdmissionsScorer(formulas)
+    batch: BatchGradeCalculator = BatchGradeCalculator.fromJson(data)
+    scores = scorer.scores(batch)
+    for student_id, calculator in enumerate(calculators):
+        for index, formula in enumerate(formulas):
+            assert scores[student_id, index] == pytest.approx(_formula_score(calculator, formula), nan_ok=True)
+    for index, ranking in enumerate(scorer.rankings(batch).values()):
+        assert len(ranking) == int((~np.isnan(scores[:, index])).sum())
+        assert list(ranking.scores) == sorted(ranking.scores, reverse=True)
+        for score, rank in zip(ranking.scores, ranking.positions):
+            assert rank == 1 + sum(other > score for other in ranking.scores)
+
+
+def test_sqlite_store_aggregates_match_calculators(tmp_path) -> None:
+    data: List[dict] = transcripts(5)
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in data]
+    _write_transcripts(tmp_path, data)
+    with SqliteStore(str(tmp_path / 'store.db')) as store:
+        assert store.load(str(tmp_path), workers=1) == store.student_ids() and len(store) == 5
+        ranks = store.ranks()
+        for index, (student_id, calculator) in enumerate(zip(store.student_ids(), calculators)):
+            assert store.combination_ranks(student_id) == pytest.approx(calculator.combination_ranks())
+            assert store.category_ranks(student_id) == pytest.approx(calculator.category_ranks())
+            assert {name: values[index] for name, values in ranks.items()} == pytest.approx(calculator.combination_ranks())
+            assert store.rank(student_id, SubjectCategory, ['1학년 1학기']) == pytest.approx(
+                calculator.rank(SubjectCategory, ['1학년 1학기'])
+            )
+            stored = store.calculator(student_id)
+            assert stored.student.name == calculator.student.name and not stored.hydrated
+            assert stored.rank(SubjectCategory) == pytest.approx(calculator.rank(SubjectCategory))
+            assert [subject.pretty() for subject in stored.subjects] == [subject.pretty() for subject in calculator.subjects]
+            assert stored.hydrated
+        with pytest.raises(KeyError):
+            store.student(max(store.student_ids()) + 1)
+    with SqliteStore(':memory:') as store:
+        assert store.add(calculators) == store.student_ids()
+        assert store.ranks() == pytest.approx(ranks)
+
+
+def test_stream_is_lazy_and_single_pass() -> None:
+    pulled: List[int] = []
+
+    def source(count: int):
+        for value in range(count):
+            pulled.append(value)
+            yield value
+
+    assert Stream(source(100)).map(lambda x: x * 3).filter(lambda x: x % 2).take(2).toList() == [3, 9]
+    assert pulled == [0, 1, 2, 3]
+    assert Stream(itertools.count()).filter(lambda x: x > 5).find_first() == 6
+    assert Stream(itertools.count()).any_match(lambda x: x == 10)
+    assert not Stream(range(10)).all_match(lambda x: x < 5)
+    assert Stream([[1, 2], [], [3]]).flat_map(list).reduce(lambda a, b: a + b) == 6
+    assert Stream([]).reduce(lambda a, b: a + b, 0) == 0
+    with pytest.raises(TypeError):
+        Stream([]).reduce(lambda a, b: a + b)
+    assert Stream(range(7)).group_by(lambda x: x % 3) == {0: [0, 3, 6], 1: [1, 4], 2: [2, 5]}
+    stream: Stream = Stream(range(5))
+    assert stream.count() == 5 and stream.toTuple() == ()
+    calculator: SingleGradeCalculator = SingleGradeCalculator(transcripts(1)[0])
+    assert calculator.stream().toTuple() == tuple(calculator.subjects)
+    assert calculator.stream().filter(lambda subject: subject.category == SubjectCategory.KOREAN).count() == len(
+        calculator.filter_category(SubjectCategory.KOREAN)
+    )
+
+
+def test_engines_count_unrecognised_categories_in_overall_rank(tmp_path) -> None:
+    data: List[dict] = _uncategorized()
+    calculators: List[SingleGradeCalculator] = [SingleGradeCalculator(datum) for datum in data]
+    expected = {
+        combination: [_combination_rank(calculator, categories) for calculator in calculators]
+        for combination, categories in CATEGORY_COMBINATIONS.items()
+    }
+    batch: BatchGradeCalculator = BatchGradeCalculator.fromJson(data)
+    values = FormulaSet({
+        **{combination: combination_formula(categories) for combination, categories in CATEGORY_COMBINATIONS.items()},
+        'avg()': 'avg()',
+        'best(1000)': 'best(1000)'
+    }).evaluate(batch)
+    for combination, column in expected.items():
+        assert values[combination].tolist() == column
+    assert values['avg()'].tolist() == values['best(1000)'].tolist() == expected['종합 내신']
+    path: str = str(tmp_path / 'store.hgcb')
+    pack(path, calculators)
+    with TranscriptStore(path) as store:
+        assert {name: column.tolist() for name, column in store.toBatch().ranks(CATEGORY_COMBINATIONS).items()} == expected
+    with SqliteStore(':memory:') as store:
+        student_ids: List[int] = store.add(calculators)
+        assert store.ranks() == expected
+        assert [store.rank(student_id, SubjectCategory) for student_id in student_ids] == expected['종합 내신']
+    for index, calculator in enumerate(calculators):
+        simulation: Simulation = Simulation(calculator)
+        assert simulation.combination_ranks() == {combination: column[index] for combination, column in expected.items()}
+        simulation.remove(next(subject for subject in calculator.subjects if subject.category is None))
+        assert simulation.combination_ranks() == simulation.toCalculator().combination_ranks()
+        model: StudentModel = model_student(calculator)
+        assert sum(model.totals) / sum(model.units) == expected['종합 내신'][index]
+
+
+if __name__ == "__main__":
+    member = Member(id=1030407, name='James')
+    order = Order(when=datetime.now(), who=member, cost=5000)
+    print(getMemberFromOptionalOrder(order))
+    print(getMemberFromOptionalOrder(None))
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from sys import intern
+from typing import Dict, List, Optional, Tuple
+
+from constants import JSON, StudentKeys, SemesterKeys, SubjectKeys
+from models import (
+    SubjectType,
+    SubjectCategory,
+    SubjectAchievementLevels,
+    Subject,
+    DetailedSubject,
+    Student,
+    Semester
+)
+
+__all__ = (
+    "parse_subject",
+    "parse_semester",
+    "LazySemester",
+    "parse_transcript"
+)
+
+# Precomputed lookup tables. Resolve the same members as ParsableEnum.parse, in O(1).
+_TYPES: Dict[str, SubjectType] = {member.value: member for member in SubjectType._member_map_.values()}
+_CATEGORIES: Dict[str, SubjectCategory] = {member.value: member for member in SubjectCategory._member_map_.values()}
+_ACHIEVEMENTS: Dict[str, SubjectAchievementLevels] = {member.value: member for member in SubjectAchievementLevels}
+_ACHIEVEMENTS.update(SubjectAchievementLevels.__members__)
+
+_MISSING = object()
+
+# Bind keys to locals of the module once instead of resolving class attributes per row.
+_TYPE: str = SubjectKeys.TYPE
+_CATEGORY: str = SubjectKeys.CATEGORY
+_NAME: str = SubjectKeys.NAME
+_UNITS: str = SubjectKeys.UNITS
+_RANK: str = SubjectKeys.RANK
+_ACHIEVEMENT: str = SubjectKeys.ACHIEVEMENT_LEVEL
+_SCORE: str = SubjectKeys.SCORE
+_AVERAGE: str = SubjectKeys.AVERAGE
+_STANDARD_DEVIATION: str = SubjectKeys.STANDARD_DEVIATION
+_PARTICIPANTS: str = SubjectKeys.PARTICIPANTS
+
+
+def parse_subject(data: JSON, grade: int, semester: int) -> Subject:
+    """
+    Parse a subject row into Subject or DetailedSubject in a single pass.
+    Equivalent to Semester.fromJson's per-row dispatch to Subject.fromJson / DetailedSubject.fromJson.
+
+    Args:
+        data (JSON): raw subject row.
+        grade (int): grade (학년) of the semester this subject belongs to.
+        semester (int): semester (학기) this subject belongs to.
+    """
+    score: Optional[float] = data.get(_SCORE, _MISSING)
+    subject_type: Optional[SubjectType] = _TYPES.get(data[_TYPE])
+    category: Optional[SubjectCategory] = _CATEGORIES.get(data[_CATEGORY])
+    name: str = intern(data[_NAME])
+    units: int = data[_UNITS]
+    rank: int = data[_RANK]
+    achievement: SubjectAchievementLevels = _ACHIEVEMENTS[data[_ACHIEVEMENT]]
+    if score is _MISSING:
+        return Subject(subject_type, category, name, units, rank, achievement, grade, semester)
+    return DetailedSubject(
+        subject_type,
+        category,
+        name,
+        units,
+        rank,
+        achievement,
+        score,
+        data[_AVERAGE],
+        data[_STANDARD_DEVIATION],
+        data[_PARTICIPANTS],
+        grade,
+        semester
+    )
+
+
+def parse_semester(data: JSON) -> Semester:
+    """
+    Parse a semester object. Equivalent to Semester.fromJson.
+
+    Args:
+        data (JSON): raw semester object.
+    """
+    grade: int = data[SemesterKeys.GRADE]
+    semester: int = data[SemesterKeys.SEMESTER]
+    return Semester(
+        grade,
+        semester,
+        [parse_subject(subject, grade, semester) for subject in data[SemesterKeys.SUBJECT_SCORES]]
+    )
+
+
+class LazySemester(Semester):
+    """
+    Semester keeping its raw subject rows, and parsing them only when first needed.
+    filter_category parses rows of that category alone; subjects parses the rest.
+    Parsed subjects are memoized per row, so every query shares the same Subject objects.
+    """
+    __slots__ = ('_rows', '_row_subjects', '_row_categories', '_categories')
+
+    @classmethod
+    def fromJson(cls, data: JSON) -> LazySemester:
+        return cls(data[SemesterKeys.GRADE], data[SemesterKeys.SEMESTER], data[SemesterKeys.SUBJECT_SCORES])
+
+    def __init__(self, grade: int, semester: int, rows: List[JSON]) -> None:
+        self._grade: int = grade
+        self._semester: int = semester
+        self._rows: List[JSON] = rows
+        self._row_subjects: List[Optional[Subject]] = [None] * len(rows)
+        self._row_categories: Optional[Dict[str, List[int]]] = None     # category value -> row indices
+        self._categories: Dict[str, Tuple[Subject, ...]] = {}
+
+    def _materialize(self, indices) -> List[Subject]:
+        rows: List[JSON] = self._rows
+        subjects: List[Optional[Subject]] = self._row_subjects
+        for index in indices:
+            if subjects[index] is None:
+                subjects[index] = parse_subject(rows[index], self._grade, self._semester)
+        return [subjects[index] for index in indices]
+
+    def _subjects(self) -> List[Subject]:
+        try:
+            return self._subject_list
+        except AttributeError:
+            self._subject_list = self._materialize(range(len(self._rows)))
+            return self._subject_list
+
+    @property
+    def materialized(self) -> int:
+        """Number of subject rows parsed so far."""
+        return sum(subject is not None for subject in self._row_subjects)
+
+    @property
+    def subjects(self) -> Tuple[Subject, ...]:
+        return tuple(self._subjects())
+
+    def filter_category(self, category: SubjectCategory) -> Tuple[Subject, ...]:
+        try:
+            return self._categories[category.value]
+        except KeyError:
+            pass
+        if self._row_categories is None:
+            # Only the category column is read here; rows are parsed below, for the asked category.
+            self._row_categories = {}
+            for index, row in enumerate(self._rows):
+                self._row_categories.setdefault(row[_CATEGORY], []).append(index)
+        subjects: Tuple[Subject, ...] = tuple(self._materialize(self._row_categories.get(category.value, ())))
+        self._categories[category.value] = subjects
+        return subjects
+
+    def toJson(self) -> JSON:
+        self._subjects()
+        return super().toJson()
+
+
+def parse_transcript(data: JSON, lazy: bool = False) -> Tuple[Student, List[Semester]]:
+    """
+    Parse a whole transcript. Equivalent to SingleGradeCalculator.parse_data.
+
+    Args:
+        data (JSON): raw transcript, with student and semesters objects.
+        lazy (bool): keep subject rows raw in LazySemester, parsing them on first query.
+    """
+    return (
+        Student.fromJson(data[StudentKeys.key]),
+        [
+            LazySemester.fromJson(semester) if lazy else parse_semester(semester)
+            for semester in data[SemesterKeys.key]
+        ]
+    )
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import csv
+import ctypes
+import ctypes.util
+import io
+import json
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Set, TextIO, Tuple
+
+from calc import SingleGradeCalculator
+from cohort import COHORT_COMBINATIONS, Cohort, Standing
+from loader import LoadResult, list_data_files, load_file, load_files
+
+__all__ = (
+    "InotifySource",
+    "PollingSource",
+    "open_source",
+    "Watcher"
+)
+
+# <linux/inotify.h>
+_IN_MODIFY: int = 0x00000002
+_IN_CLOSE_WRITE: int = 0x00000008
+_IN_MOVED_FROM: int = 0x00000040
+_IN_MOVED_TO: int = 0x00000080
+_IN_DELETE: int = 0x00000200
+_IN_Q_OVERFLOW: int = 0x00004000
+_IN_ONLYDIR: int = 0x01000000
+_WATCH_MASK: int = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE | _IN_ONLYDIR
+_EVENT: struct.Struct = struct.Struct('iIII')   # wd, mask, cookie, len; followed by len bytes of name
+
+
+def _is_data_file(path: str) -> bool:
+    return os.path.splitext(path)[1] == '.json'
+
+
+class InotifySource:
+    """
+    Changed json files of a directory, from Linux inotify through ctypes.
+    poll returns None when the kernel queue overflowed, since events were lost and the directory must be rescanned.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Args:
+            directory (str): directory to watch.
+
+        Raises:
+            OSError: if inotify is not available.
+        """
+        self._directory: str = directory
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+        self._fd: int = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK) < 0:
+            errno: int = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f'inotify_add_watch failed on {directory}')
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def poll(self, timeout: Optional[float] = None) -> Optional[Set[str]]:
+        """
+        Wait up to timeout seconds (forever if None) for changes. Returns changed paths, empty on timeout.
+
+        Args:
+            timeout (Optional[float]): seconds to wait.
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        changed: Set[str] = set()
+        while True:
+            try:
+                buffer: bytes = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset: int = 0
+            while offset < len(buffer):
+                _, mask, _, length = _EVENT.unpack_from(buffer, offset)
+                offset += _EVENT.size
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                name: str = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if _is_data_file(name):
+                    changed.add(os.path.join(self._directory, name))
+
+
+class PollingSource:
+    """Changed json files of a directory, found by comparing (mtime, size) of every file each interval."""
+
+    def __init__(self, directory: str, interval: float = 1.0) -> None:
+        """
+        Args:
+            directory (str): directory to watch.
+            interval (float): seconds between scans.
+        """
+        self._directory: str = directory
+        self._interval: float = interval
+        self._stats: Dict[str, Tuple[int, int]] = self._scan()
+
+    def close(self) -> None:
+        pass
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        stats: Dict[str, Tuple[int, int]] = {}
+        for path in list_data_files(self._directory):
+            try:
+                stat: os.stat_result = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def poll(self, timeout: Optional[float] = None) -> Optional[Set[str]]:
+        """
+        Wait up to timeout seconds (forever if None) for changes. Returns changed paths, empty on timeout.
+
+        Args:
+            timeout (Optional[float]): seconds to wait.
+        """
+        deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stats: Dict[str, Tuple[int, int]] = self._scan()
+            changed: Set[str] = {
+                path for path in stats.keys() | self._stats.keys() if stats.get(path) != self._stats.get(path)
+            }
+            self._stats = stats
+            if changed:
+                return changed
+            remaining: float = self._interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return changed
+            time.sleep(min(self._interval, remaining))
+
+
+def open_source(directory: str, polling: bool = False, interval: float = 1.0):
+    """
+    Change source of a directory : inotify if available, stat polling otherwise (or if polling is True).
+
+    Args:
+        directory (str): directory to watch.
+        polling (bool): always use stat polling.
+        interval (float): seconds between scans when polling.
+    """
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifySource(directory)
+        except OSError as e:
+            print(f'> inotify 를 사용할 수 없어 주기적으로 검사합니다 : {e}', file=sys.stderr)
+    return PollingSource(directory, interval)
+
+
+class Watcher:
+    """
+    Watches a directory of transcripts and keeps results of every file up to date.
+
+    Each file keeps its student id in a Cohort and the last row written for it. On change, only the changed files
+    are parsed again, the cohort is updated in place (Cohort.replace / add / remove), and rows are recomputed only
+    for those files and the students whose position they moved. A row is written only if it differs from the last
+    one written for the file. Bursts of events are debounced : changes are applied once the directory has been
+    quiet for debounce seconds.
+
+    Rows hold file, 이름, 학년, then weighted rank and position (석차) of each combination.
+    A removed file is written as a row with only its path (csv), or {"file": path, "removed": true} (jsonl).
+    """
+
+    def __init__(self, directory: str, output: TextIO, format: str = 'csv', combinations: Optional[List[str]] = None) -> None:
+        """
+        Args:
+            directory (str): directory of transcript json files.
+            output (TextIO): stream to write rows.
+            format (str): 'csv' or 'jsonl'.
+            combinations (Optional[List[str]]): combinations to write (keys of COHORT_COMBINATIONS). All if None.
+        """
+        if format not in ('csv', 'jsonl'):
+            raise ValueError(f'unknown output format : {format}')
+        self._directory: str = directory
+        self._output: TextIO = output
+        self._format: str = format
+        self._combinations: List[str] = list(COHORT_COMBINATIONS) if combinations is None else list(combinations)
+        self._cohort: Cohort = Cohort()
+        self._ids: Dict[str, int] = {}          # student id by path
+        self._paths: Dict[int, str] = {}        # path by student id
+        self._rows: Dict[str, list] = {}        # last row written, by path
+        self._header: List[str] = ['file', '이름', '학년']
+        for combination in self._combinations:
+            self._header.extend((combination, f'{combination} 석차'))
+
+    @property
+    def cohort(self) -> Cohort:
+        return self._cohort
+
+    def _row(self, student_id: int) -> list:
+        calculator: SingleGradeCalculator = self._cohort.calculator(student_id)
+        row: list = [self._paths[student_id], calculator.student.name, calculator.student.grade]
+        for combination in self._combinations:
+            standing: Optional[Standing] = self._cohort.standing(student_id, combination)
+            row.extend((None, None) if standing is None else (standing.rank, standing.position))
+        return row
+
+    def _write(self, rows: List[list]) -> None:
+        if not rows:
+            return
+        buffer: io.StringIO = io.StringIO()
+        if self._format == 'csv':
+            csv.writer(buffer, lineterminator='\n').writerows(
+                ['' if value is None else value for value in row] for row in rows
+            )
+        else:
+            for row in rows:
+                record = dict(zip(self._header, row)) if len(row) > 1 else {'file': row[0], 'removed': True}
+                buffer.write(json.dumps(record, ensure_ascii=False))
+                buffer.write('\n')
+        self._output.write(buffer.getvalue())
+        self._output.flush()
+
+    def _report(self, result: LoadResult) -> None:
+        print(f'> {result.path} 을 읽지 못했습니다 : {result.error}', file=sys.stderr)
+
+    def load(self, workers: Optional[int] = None) -> int:
+        """
+        Load every file of the directory and write the header and all rows. Returns number of written rows.
+
+        Args:
+            workers (Optional[int]): worker processes used to load files.
+        """
+        for result in load_files(list_data_files(self._directory), workers=workers):
+            if not result.ok:
+                self._report(result)
+                continue
+            student_id: int = self._cohort.add(result.calculator)
+            self._ids[result.path] = student_id
+            self._paths[student_id] = result.path
+        if self._format == 'csv':
+            csv.writer(self._output, lineterminator='\n').writerow(self._header)
+        rows: List[list] = []
+        for path, student_id in self._ids.items():
+            self._rows[path] = self._row(student_id)
+            rows.append(self._rows[path])
+        self._write(rows)
+        return len(rows)
+
+    def update(self, paths: Optional[Set[str]]) -> int:
+        """
+        Apply changes of files and write affected rows. Returns number of written rows.
+
+        Args:
+            paths (Optional[Set[str]]): changed files. Every known and present file if None. (lost events)
+        """
+        if paths is None:
+            paths = set(self._ids) | set(list_data_files(self._directory))
+        affected: Set[int] = set()
+        removed: List[list] = []
+        for path in sorted(paths):
+            student_id: Optional[int] = self._ids.get(path)
+            if not os.path.isfile(path):
+                if student_id is not None:
+                    affected |= self._cohort.remove(student_id)
+                    affected.discard(student_id)
+                    del self._ids[path], self._paths[student_id], self._rows[path]
+                    removed.append([path])
+                continue
+            result: LoadResult = load_file(path)
+            if not result.ok:
+                # Most likely a half written file; its last good result is kept until the next change.
+                self._report(result)
+                continue
+            if student_id is None:
+                student_id = self._ids[path] = self._cohort.add(result.calculator)
+                self._paths[student_id] = path
+                affected |= self._cohort.behind(student_id)
+            else:
+                affected |= self._cohort.replace(student_id, result.calculator)
+            affected.add(student_id)
+        rows: List[list] = removed
+        for student_id in sorted(affected):
+            path: Optional[str] = self._paths.get(student_id)
+            if path is None:
+                continue
+            row: list = self._row(student_id)
+            if row != self._rows.get(path):
+                self._rows[path] = row
+                rows.append(row)
+        self._write(rows)
+        return len(rows)
+
+    def run(self, polling: bool = False, interval: float = 1.0, debounce: float = 0.2, workers: Optional[int] = None) -> None:
+        """
+        Load the directory, then apply changes until interrupted.
+
+        Args:
+            polling (bool): use stat polling instead of inotify.
+            interval (float): seconds between scans when polling.
+            debounce (float): quiet seconds to wait for after a change before applying it.
+            workers (Optional[int]): worker processes used for the initial load.
+        """
+        source = open_source(self._directory, polling, interval)
+        try:
+            self.load(workers)
+            while True:
+                paths: Optional[Set[str]] = source.poll()
+                while True:
+                    more: Optional[Set[str]] = source.poll(debounce)
+                    if more is not None and not more:
+                        break
+                    paths = None if paths is None or more is None else paths | more
+                self.update(paths)
+        finally:
+            source.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='내신 산출 도구 - 변경 감시 모드')
+    parser.add_argument('directory', help='directory of transcript json files')
+    parser.add_argument('-c', '--combination', action='append', choices=list(COHORT_COMBINATIONS),
+                        help='combination to write. Can be repeated (default: every combination)')
+    parser.add_argument('-f', '--format', choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument('--poll', action='store_true', help='scan files periodically instead of using inotify')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between scans when polling')
+    parser.add_argument('--debounce', type=float, default=0.2, help='quiet seconds to wait for before applying changes')
+    parser.add_argument('--workers', type=int, help='worker processes used for the initial load')
+    args = parser.parse_args()
+
+    try:
+        Watcher(args.directory, sys.stdout, args.format, args.combination).run(args.poll, args.interval, args.debounce, args.workers)
+    except KeyboardInterrupt:
+        pass